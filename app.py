@@ -1,19 +1,31 @@
 import streamlit as st
 import pandas as pd
 import time
+import os
+import uuid
 from streamlit_option_menu import option_menu
-import numpy as np
-import plotly.express as px
+
+# Library berat di-import per halaman saat halaman itu pertama kali dibuka
+# (plotly di halaman grafik; sklearn/imblearn/matplotlib/mlxtend di dalam fungsi
+# model_utils & preprocessing), sehingga halaman Database tampil tanpa memuatnya.
 
 # --- ERROR HANDLING UNTUK MODUL CUSTOM ---
 try:
     import preprocessing as pp
     import model_utils as mu
     import database as db
+    import caching
+    import jobs
+    import reporting
+    import streamlit_adapter
+    import tracing
 except ImportError as e:
     st.error(f"❌ Modul custom tidak ditemukan: {e}. Pastikan file 'preprocessing.py', 'model_utils.py', dan 'database.py' ada di folder yang sama.")
     st.stop()
 
+# Progress & pesan dari modul komputasi ditampilkan lewat Streamlit
+streamlit_adapter.install()
+
 # =============================================================================
 # 1. KONFIGURASI HALAMAN & SESSION STATE
 # =============================================================================
@@ -27,18 +39,34 @@ st.set_page_config(
 # Inisialisasi Session State
 if 'data_loaded' not in st.session_state: st.session_state.data_loaded = False
 if 'data' not in st.session_state: st.session_state.data = None
+if 'data_key' not in st.session_state: st.session_state.data_key = None
 if 'model' not in st.session_state: st.session_state.model = None
-if 'association_rules' not in st.session_state: st.session_state.association_rules = None
+if 'association_rules' not in st.session_state:
+    # Hasil precomputed (mis. dari `python pipeline.py`) dipakai langsung jika ada
+    saved_rules, saved_index = pp.load_rules()
+    st.session_state.association_rules = saved_rules
+    st.session_state.rule_index = saved_index
+    st.session_state.antecedents = saved_rules['antecedents_str'].unique().tolist() if saved_rules is not None else None
 if 'antecedents' not in st.session_state: st.session_state.antecedents = None
+if 'rule_index' not in st.session_state: st.session_state.rule_index = None
 # RFM Analysis Session State
-if 'rfm_data' not in st.session_state: st.session_state.rfm_data = None
+if 'rfm_data' not in st.session_state:
+    st.session_state.rfm_data = pp.load_rfm()
+    st.session_state.rfm_calculated = st.session_state.rfm_data is not None
 if 'rfm_calculated' not in st.session_state: st.session_state.rfm_calculated = False
+# Sequential Patterns State
+if 'sequential_patterns' not in st.session_state: st.session_state.sequential_patterns = pp.load_sequences()
+if 'window_rules' not in st.session_state: st.session_state.window_rules = None  # (rules per jendela, drift, ringkasan)
 # Basket Configuration State
 if 'basket_group_by' not in st.session_state: st.session_state.basket_group_by = 'BASKET_ID'
 if 'basket_product_level' not in st.session_state: st.session_state.basket_product_level = 'COMMODITY_DESC'
 # ANN Additional State
 if 'feature_importance' not in st.session_state: st.session_state.feature_importance = None
 if 'target_product' not in st.session_state: st.session_state.target_product = None
+# Background Jobs State (slot -> id job di jobs.get_runner())
+if 'jobs' not in st.session_state: st.session_state.jobs = {}
+# Identitas sesi ini sebagai subscriber job bersama (pembatalan hanya melepas sesi ini)
+if 'job_subscriber' not in st.session_state: st.session_state.job_subscriber = uuid.uuid4().hex
 
 # Fixed column mappings (from database schema - original names)
 KEY_COL = "household_key"
@@ -47,6 +75,7 @@ DAY_COL = "DAY"
 DEMO_FEATURES = ["AGE_DESC", "MARITAL_STATUS_CODE", "INCOME_DESC", "HOMEOWNER_DESC", 
                 "HH_COMP_DESC", "HOUSEHOLD_SIZE_DESC", "KID_CATEGORY_DESC"]
 CONTACT_COL = "phone_number"  # Customer contact info for campaigns
+WARMUP_TIME_BUDGET = 120  # detik, batas waktu pre-warming cache setelah database dibuat
 
 
 def get_active_demo_features():
@@ -101,8 +130,8 @@ with st.sidebar:
     
     selected_page = option_menu(
         menu_title=None,
-        options=["Database", "Association Rules", "RFM Analysis", "Product Affinity", "ANN Training", "Prediction Results", "Business Insights"],
-        icons=["database", "diagram-3", "people", "heart", "cpu", "graph-up-arrow", "lightbulb"],
+        options=["Database", "Association Rules", "RFM Analysis", "Store Analysis", "Product Affinity", "ANN Training", "Prediction Results", "Business Insights"],
+        icons=["database", "diagram-3", "people", "shop", "heart", "cpu", "graph-up-arrow", "lightbulb"],
         menu_icon="cast",
         default_index=0,
         styles={
@@ -132,11 +161,12 @@ def load_data_from_db(group_by='BASKET_ID', product_level='COMMODITY_DESC', forc
     if not db.database_exists():
         return False, "Database belum dibuat. Silakan buat database di halaman Database."
     
-    # Check if we need to reload (config changed or first load)
+    # Check if we need to reload (config changed, database reloaded or first load)
     config_changed = (st.session_state.basket_group_by != group_by or 
                      st.session_state.basket_product_level != product_level)
+    data_key = db.analysis_fingerprint(group_by, product_level)
     
-    if not st.session_state.data_loaded or config_changed or force_reload:
+    if not st.session_state.data_loaded or config_changed or force_reload or st.session_state.data_key != data_key:
         df, err = db.get_analysis_data(group_by=group_by, product_level=product_level)
         if err:
             return False, f"Gagal memuat data: {err}"
@@ -144,12 +174,232 @@ def load_data_from_db(group_by='BASKET_ID', product_level='COMMODITY_DESC', forc
             return False, "Database kosong. Silakan muat data di halaman Database."
         
         st.session_state.data = df
+        st.session_state.data_key = data_key  # fingerprint data aktif (kunci cache & job)
         st.session_state.data_loaded = True
         st.session_state.basket_group_by = group_by
         st.session_state.basket_product_level = product_level
     
     return True, None
 
+# =============================================================================
+# BACKGROUND JOBS (FP-Growth, RFM, ANN berjalan di luar thread script)
+# =============================================================================
+
+def submit_job(slot, name, func, *args, key=None, **kwargs):
+    """Jalankan analisis sebagai job background; halaman memantau job lewat `slot`."""
+    job = jobs.get_runner().submit(name, func, *args, key=key, subscriber=st.session_state.job_subscriber,
+                                   **kwargs)
+    st.session_state.jobs[slot] = job.id
+    return job
+
+def show_job(slot, on_done):
+    """
+    Tampilkan status job milik `slot`. Selama berjalan, panel progress di-refresh
+    setiap detik dan job bisa dibatalkan. Setelah selesai, pesan dari job
+    ditampilkan dan `on_done(result)` dipanggil sekali untuk menyimpan hasil.
+    """
+    job = jobs.get_runner().get(st.session_state.jobs.get(slot))
+    if job is None:
+        return
+    if not job.done:
+        _job_progress_panel(slot)
+        return
+
+    del st.session_state.jobs[slot]
+    for level, objects in job.messages:
+        getattr(st, level)(*objects)
+    if job.status == jobs.DONE:
+        on_done(job.result)
+    elif job.status == jobs.FAILED:
+        st.error(f"❌ {job.name} gagal: {job.error}")
+    else:
+        st.warning(f"⏹️ {job.name} dibatalkan.")
+    if job.trace is not None and job.trace.wall is not None:
+        with st.expander(f"⏱️ Profil Run: {job.name} ({job.trace.wall:.1f} detik)"):
+            show_trace(job.trace)
+
+def show_plan(plan):
+    """Rencana FP-Growth dari `pp.plan_association_rules`: strategi terpilih, estimasi biaya & alasannya."""
+    if plan['strategy'] is None:
+        st.warning(" ".join(plan['reasons']))
+        return
+    chosen = plan['estimates'][plan['strategy']]
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Strategi", pp.PLAN_STRATEGIES[plan['strategy']].split(' (')[0])
+    col2.metric("Min Support", f"{plan['min_support']:g}",
+                delta=f"diminta {plan['requested_support']:g}" if plan['support_raised'] else None,
+                delta_color="off")
+    col3.metric("Estimasi Itemset", f"{plan['estimated_itemsets']:,}")
+    col4.metric("Estimasi Biaya", f"{chosen['memory_mb']:,.0f} MB · {chosen['seconds']:,.1f} s")
+    st.dataframe(pd.DataFrame([
+        {
+            'Strategi': pp.PLAN_STRATEGIES[name],
+            'Memori (MB)': round(estimate['memory_mb'], 1),
+            'Waktu (detik)': round(estimate['seconds'], 1),
+            'Muat Anggaran': "✅" if estimate['fits'] else "❌",
+            'Dipilih': "👉" if name == plan['strategy'] else "",
+        }
+        for name, estimate in plan['estimates'].items()
+    ]), use_container_width=True, hide_index=True)
+    for reason in plan['reasons']:
+        st.caption(reason)
+    st.caption(
+        f"Estimasi dari pilot FP-Growth pada {plan['pilot']['baskets']:,} sampel keranjang "
+        f"({plan['n_baskets']:,} keranjang, {plan['n_frequent_items']:,} item frequent)."
+    )
+
+def show_trace(run):
+    """Rincian waktu & memori per tahap dari satu run (`tracing.Trace`) + unduhan JSON trace."""
+    breakdown = run.to_frame()
+    stages = breakdown[breakdown['depth'] == 1]
+    if not stages.empty:
+        # Waktu tahap utama (tahap yang sama dijumlahkan, mis. beberapa query SQL)
+        st.bar_chart(stages.groupby('stage', sort=False)['wall_s'].sum(), horizontal=True)
+    view = breakdown.copy()
+    view['stage'] = ["\u2003" * depth + stage for depth, stage in zip(view['depth'], view['stage'])]
+    view = view.drop(columns=['depth']).dropna(axis=1, how='all')
+    st.dataframe(view.rename(columns={
+        'stage': 'Tahap', 'start_s': 'Mulai (s)', 'wall_s': 'Wall (s)', 'self_s': 'Self (s)', 'cpu_s': 'CPU (s)',
+        'rss_mb': 'RSS (MB)', 'rss_delta_mb': 'Δ RSS (MB)', 'peak_rss_mb': 'Peak RSS (MB)',
+        'py_peak_mb': 'Peak Heap Python (MB)', 'error': 'Error', 'attrs': 'Detail'
+    }), use_container_width=True, hide_index=True)
+    st.download_button(
+        "📥 Download JSON Trace", run.to_json(indent=1),
+        file_name=f"trace_{time.strftime('%Y%m%d_%H%M%S', time.localtime(run.started))}.json",
+        mime="application/json", key=f"trace_download_{id(run)}",
+        help="Format Chrome trace: buka di chrome://tracing atau ui.perfetto.dev"
+    )
+
+@st.fragment(run_every=1.0)
+def _job_progress_panel(slot):
+    job = jobs.get_runner().get(st.session_state.jobs.get(slot))
+    if job is None or job.done:
+        st.rerun()  # hasil siap: render ulang seluruh halaman
+    pct, text = job.progress
+    status = text if job.status == jobs.RUNNING else "menunggu giliran..."
+    st.progress(int(pct), text=f"⏳ {job.name}: {status} ({job.elapsed:.0f} detik)")
+    if job.cancel_requested:
+        st.caption("Membatalkan...")
+    elif st.button("⏹️ Batalkan", key=f"cancel_job_{slot}"):
+        jobs.get_runner().cancel(job.id, subscriber=st.session_state.job_subscriber)
+        if not job.cancel_requested:
+            # Job masih dipakai sesi lain: hanya sesi ini yang berhenti memantaunya
+            del st.session_state.jobs[slot]
+            st.rerun()
+
+def cache_warmup_job(time_budget):
+    """Job pre-warming: jalankan query awal dashboard secara paralel agar hasilnya masuk cache."""
+    bar = reporting.progress(0, text="🔥 Memanaskan cache...")
+    return db.warm_cache(
+        time_budget=time_budget,
+        progress_callback=lambda pct, msg: bar.progress(int(pct * 100), text=msg)
+    )
+
+def association_rules_job(data, mode, group_by, product_level, **params):
+    """Job FP-Growth: mining sesuai mode, lalu RuleIndex & artifact. Returns (rules, antecedents, rule_index)."""
+    if mode == 'out_of_core':
+        rules, antecedents = pp.run_association_rules_out_of_core(
+            group_by=group_by, product_level=product_level, **params
+        )
+    elif mode == 'top_k':
+        rules, antecedents = pp.run_association_rules_top_k(data, PRODUCT_LIST_COL, **params)
+    elif mode == 'adaptive':
+        rules, antecedents = pp.run_association_rules_adaptive(data, PRODUCT_LIST_COL, **params)
+    elif mode == 'multilevel':
+        rules, antecedents = pp.run_association_rules_multilevel(group_by=group_by, **params)
+    elif mode == 'planned':
+        rules, antecedents = pp.run_association_rules_planned(
+            data, PRODUCT_LIST_COL, group_by=group_by, product_level=product_level, **params
+        )
+    else:
+        sample_size = params.pop('sample_size')
+        if sample_size < len(data):
+            reporting.info(f"📊 Menggunakan {sample_size:,} sampel dari {len(data):,} transaksi")
+            data = data.sample(n=sample_size, random_state=42)
+        rules, antecedents = pp.run_association_rules(data, PRODUCT_LIST_COL, **params)
+
+    rule_index = None
+    if rules is not None and not rules.empty:
+        jobs.checkpoint()
+        # Indeks lookup rekomendasi, disimpan bersama rules sebagai artifact
+        rule_index = pp.RuleIndex(rules)
+        pp.save_rules(rules, rule_index)
+    return rules, antecedents, rule_index
+
+def sequential_patterns_job(**params):
+    """Job mining pola sekuensial per rumah tangga; hasil disimpan sebagai artifact."""
+    patterns = pp.run_sequential_patterns(**params)
+    if not patterns.empty:
+        pp.save_sequences(patterns)
+    return patterns
+
+def rfm_job(data, data_key):
+    """Job RFM: hitung skor & segmen lalu simpan sebagai artifact."""
+    rfm_result = pp.calculate_rfm(data, KEY_COL, DAY_COL, PRODUCT_LIST_COL, data_key=data_key)
+    pp.save_rfm(rfm_result)
+    return rfm_result
+
+def ann_training_job(df, data_key, target_list, d_feats, resample):
+    """Job training ANN: encoding, resampling, training, evaluasi, feature importance & prediksi."""
+    p_col = PRODUCT_LIST_COL
+    bar = reporting.progress(0, text="🔢 Pre-processing & encoding...")
+    data_target = pp.create_target_variable(df.copy(), p_col, target_list)
+    data_enc = pp.encode_features(data_target, d_feats)
+
+    y_full = data_enc['PX']
+    orig_cols = set(data_target.columns)
+    final_cols = set(data_enc.columns)
+    X_full = data_enc[list(final_cols - orig_cols)].copy()
+    full_keys = data_enc[[KEY_COL, p_col, 'PX']]
+
+    bar.progress(15, text="⚖️ Split & resampling data latih...")
+    # Kunci cache dari fingerprint data + target + fitur (tanpa hashing X/y)
+    split_key = caching.fingerprint(data_key, target_list, d_feats)
+    X_train, y_train, X_test, y_test = mu.split_and_resample(X_full, y_full, method=resample, data_key=split_key)
+
+    bar.progress(30, text="🤖 Training model...")
+    model = mu.train_ann_model(X_train, y_train, data_key=caching.fingerprint(split_key, resample))
+    mu.save_model(model, d_feats, target_list)
+
+    bar.progress(50, text="📏 Evaluasi model...")
+    eval_metrics = mu.generate_evaluation_metrics(model, X_test, y_test)
+
+    # Calculate Feature Importance using permutation importance
+    bar.progress(60, text="🔍 Menghitung permutation importance...")
+    from sklearn.inspection import permutation_importance
+    with tracing.span("permutation_importance", features=X_test.shape[1], repeats=10):
+        perm_importance = permutation_importance(model, X_test, y_test, n_repeats=10, random_state=42, n_jobs=-1)
+    feature_imp_df = pd.DataFrame({
+        'feature': X_full.columns,
+        'importance': perm_importance.importances_mean,
+        'std': perm_importance.importances_std
+    }).sort_values('importance', ascending=False)
+
+    bar.progress(90, text="📈 Prediksi seluruh pelanggan...")
+    with tracing.span("predict", rows=len(X_full)):
+        probs, preds = mu.get_predictions(model, X_full)
+    res_df = full_keys.copy()
+    res_df['Probability'] = probs
+    res_df['Prediction'] = preds
+
+    # Merge demographic data and contact info for buyer persona analysis
+    demo_cols = [KEY_COL] + d_feats
+    if CONTACT_COL in df.columns:
+        demo_cols.append(CONTACT_COL)
+    demo_data = df[demo_cols].drop_duplicates(subset=[KEY_COL])
+    res_df = res_df.merge(demo_data, on=KEY_COL, how='left')
+    bar.progress(100, text="✅ Selesai")
+
+    return {
+        'X_full': X_full,
+        'full_keys': full_keys,
+        'train_distribution': y_train.value_counts(),
+        'model': model,
+        'eval_metrics': eval_metrics,
+        'feature_importance': feature_imp_df,
+        'prediction_results': res_df,
+    }
+
 # --- PAGE 1: ASSOCIATION RULES ---
 if selected_page == "Association Rules":
     st.markdown('<div class="main-header">🔗 Association Rules Mining</div>', unsafe_allow_html=True)
@@ -159,7 +409,9 @@ if selected_page == "Association Rules":
         st.warning("⚠️ Database belum dibuat. Silakan buat database di halaman Database.")
     else:
         # === TABS FOR SETTINGS AND ANALYSIS ===
-        tab_settings, tab_analysis, tab_results = st.tabs(["⚙️ Pengaturan Basket", "🔬 Analisis", "📊 Hasil"])
+        tab_settings, tab_analysis, tab_results, tab_sequences, tab_drift = st.tabs(
+            ["⚙️ Pengaturan Basket", "🔬 Analisis", "📊 Hasil", "🔁 Pola Sekuensial", "📈 Drift Mingguan"]
+        )
         
         # === TAB 1: SETTINGS ===
         with tab_settings:
@@ -280,6 +532,7 @@ ORDER BY t.household_key, t.DAY"""
                     st.session_state.basket_product_level = product_level
                     st.session_state.data_loaded = False
                     st.session_state.association_rules = None
+                    st.session_state.rule_index = None
                     st.rerun()
             
             st.markdown("---")
@@ -290,22 +543,57 @@ ORDER BY t.household_key, t.DAY"""
         with tab_analysis:
             st.markdown("### 🔬 Jalankan Analisis FP-Growth")
             
-            data_ok, err_msg = load_data_from_db(
-                group_by=st.session_state.basket_group_by,
-                product_level=st.session_state.basket_product_level
+            mining_mode = st.radio(
+                "**Mode Mining:**",
+                options=['auto', 'in_memory', 'out_of_core', 'multilevel'],
+                format_func=lambda x: {
+                    'auto': '🧮 Otomatis (planner anggaran memori & waktu)',
+                    'in_memory': '🧠 In-Memory (data analisis + sampling opsional)',
+                    'out_of_core': '💽 Out-of-Core (stream seluruh riwayat dari SQLite)',
+                    'multilevel': '🪜 Multi-Level (semua level hierarki produk sekaligus)'
+                }[x],
+                horizontal=True,
+                help="Otomatis: ukuran matrix dan jumlah itemset diperkirakan sebelum mining, lalu strategi "
+                     "(dense, sparse, sampling, out-of-core atau Min Support lebih tinggi) dipilih sesuai anggaran. "
+                     "Out-of-core tidak memuat keranjang ke memori: support item dihitung di SQLite, "
+                     "lalu keranjang di-stream per chunk ke FP-tree terkompresi. Cocok untuk SUB_COMMODITY_DESC "
+                     "tanpa random sampling. Multi-Level: DEPARTMENT, COMMODITY_DESC dan SUB_COMMODITY_DESC "
+                     "di-mining dalam satu pass, rules yang sudah dijelaskan level di atasnya dipangkas."
             )
+            out_of_core = mining_mode == 'out_of_core'
+            multilevel = mining_mode == 'multilevel'
+            streamed = out_of_core or multilevel  # keranjang di-stream dari SQLite, bukan data analisis
+            auto_mode = mining_mode == 'auto'
+            
+            if streamed:
+                data_ok, err_msg = db.database_exists(), "Database belum dibuat. Silakan buat database di halaman Database."
+            else:
+                data_ok, err_msg = load_data_from_db(
+                    group_by=st.session_state.basket_group_by,
+                    product_level=st.session_state.basket_product_level
+                )
             
             if not data_ok:
                 st.warning(f"⚠️ {err_msg}")
             else:
-                rows, cols = st.session_state.data.shape
-                st.info(
-                    f"📊 **Data Aktif:** {rows:,} baris × {cols} kolom | Kelompok: `{st.session_state.basket_group_by}` | Level: `{st.session_state.basket_product_level}`"
-                )
-                st.caption(f"Ukuran dataset sebelum FP-Growth: `{rows:,} x {cols}` (baris × kolom)")
-                
-                with st.expander("👀 Preview Data (5 baris pertama)"):
-                    st.dataframe(st.session_state.data.head(), use_container_width=True)
+                if multilevel:
+                    st.info(
+                        f"🪜 **Multi-Level:** {' → '.join(db.PRODUCT_HIERARCHY)} dari seluruh transaksi | "
+                        f"Kelompok: `{st.session_state.basket_group_by}` (Level Produk aktif diabaikan)"
+                    )
+                elif out_of_core:
+                    st.info(
+                        f"💽 **Out-of-Core:** seluruh transaksi di-stream dari SQLite | Kelompok: `{st.session_state.basket_group_by}` | Level: `{st.session_state.basket_product_level}`"
+                    )
+                else:
+                    rows, cols = st.session_state.data.shape
+                    st.info(
+                        f"📊 **Data Aktif:** {rows:,} baris × {cols} kolom | Kelompok: `{st.session_state.basket_group_by}` | Level: `{st.session_state.basket_product_level}`"
+                    )
+                    st.caption(f"Ukuran dataset sebelum FP-Growth: `{rows:,} x {cols}` (baris × kolom)")
+                    
+                    with st.expander("👀 Preview Data (5 baris pertama)"):
+                        st.dataframe(st.session_state.data.head(), use_container_width=True)
                 
                 st.markdown("---")
                 
@@ -314,16 +602,100 @@ ORDER BY t.household_key, t.DAY"""
                     col_param, col_info = st.columns([2, 1])
                     
                     with col_param:
-                        total_rows = len(st.session_state.data)
-                        st.caption(f"Total keranjang tersedia: **{total_rows:,}**")
-                        default_sampling = total_rows > 20000
-                        use_sampling = st.checkbox(
-                            "🚀 Aktifkan Random Sampling",
-                            value=default_sampling,
-                            help="Gunakan subset acak untuk mempercepat proses tanpa menghitung seluruh transaksi."
+                        top_k_mode = mining_mode == 'in_memory' and st.checkbox(
+                            "🏆 Mode Top-k (tanpa Min Support)",
+                            help="Ambil k rules dengan lift/confidence tertinggi secara langsung, tanpa menebak "
+                                 "nilai Min Support. Mining turun sampai Minimum Keranjang per Itemset; biayanya "
+                                 "dibatasi panjang itemset, batas jumlah itemset dan batas waktu (selalu aktif)."
                         )
+                        
+                        if out_of_core:
+                            use_sampling = False
+                            st.success("📊 Mode out-of-core selalu memakai seluruh keranjang (tanpa sampling).")
+                        elif multilevel:
+                            use_sampling = False
+                            cross_level = st.checkbox(
+                                "🔀 Sertakan rules lintas level (mis. Sub-commodity → Department)",
+                                help="Itemset campuran level jauh lebih banyak, sehingga mining lebih lama."
+                            )
+                            min_interest = st.slider(
+                                "Rasio Minat Minimum (R-interest)", 1.0, 3.0, 1.1, 0.1, format="%.1f",
+                                help="Rules dipangkas jika confidence-nya < R × ekspektasi dari rules level di "
+                                     "atasnya (mis. rules Sub-commodity yang hanya mengulang rules Commodity). "
+                                     "1.0 = tanpa pemangkasan."
+                            )
+                        elif auto_mode:
+                            use_sampling = False
+                            st.caption(f"Total keranjang tersedia: **{len(st.session_state.data):,}**")
+                            col_mem, col_time = st.columns(2)
+                            memory_budget = col_mem.number_input(
+                                "Anggaran Memori (MB)", min_value=16, max_value=65536,
+                                value=pp.FP_MEMORY_BUDGET_MB, step=64,
+                                help="Perkiraan memori maksimum untuk matrix/FP-tree dan hasil mining."
+                            )
+                            time_budget = col_time.number_input(
+                                "Anggaran Waktu (detik)", min_value=1, max_value=3600,
+                                value=pp.FP_TIME_BUDGET_S, step=10,
+                                help="Perkiraan waktu mining maksimum sebelum strategi lebih hemat dipilih."
+                            )
+                        elif top_k_mode:
+                            use_sampling = False
+                            top_k = st.slider("Jumlah Rules (k)", 10, 500, 50, 10)
+                            top_k_metric = st.radio(
+                                "Urutkan Berdasarkan",
+                                options=['lift', 'confidence'],
+                                format_func=str.capitalize,
+                                horizontal=True
+                            )
+                            top_k_max_len = st.slider(
+                                "Panjang Itemset Maksimum", 2, 6, 4,
+                                help="Jumlah item maksimum per rule (antecedent + consequent). Membatasi waktu mining."
+                            )
+                            top_k_min_count = st.number_input(
+                                "Minimum Keranjang per Itemset", min_value=2, max_value=1000, value=10,
+                                help="Itemset yang muncul di lebih sedikit keranjang dianggap noise."
+                            )
+                        else:
+                            total_rows = len(st.session_state.data)
+                            st.caption(f"Total keranjang tersedia: **{total_rows:,}**")
+                            default_sampling = total_rows > 20000
+                            use_sampling = st.checkbox(
+                                "🚀 Aktifkan Random Sampling",
+                                value=default_sampling,
+                                help="Gunakan subset acak untuk mempercepat proses tanpa menghitung seluruh transaksi."
+                            )
 
+                        sampling_method = 'fixed'
                         if use_sampling:
+                            sampling_method = st.radio(
+                                "Metode Sampling",
+                                options=['fixed', 'adaptive'],
+                                format_func=lambda x: {
+                                    'fixed': 'Rasio tetap',
+                                    'adaptive': 'Adaptif (batas error ε, δ)'
+                                }[x],
+                                horizontal=True,
+                                help="Adaptif: ukuran sampel dihitung dari batas error support yang diminta."
+                            )
+
+                        if use_sampling and sampling_method == 'adaptive':
+                            sample_eps = st.slider(
+                                "Batas Error Support (ε)", 0.001, 0.05, 0.005, 0.001, format="%.3f",
+                                help="Estimasi support setiap itemset berada dalam ±ε dari nilai sebenarnya."
+                            )
+                            sample_delta = st.slider(
+                                "Probabilitas Gagal (δ)", 0.01, 0.2, 0.05, 0.01, format="%.2f",
+                                help="Batas error berlaku dengan probabilitas minimal 1 - δ."
+                            )
+                            verify_sample = st.checkbox(
+                                "🔎 Verifikasi kandidat ke seluruh data",
+                                value=True,
+                                help="Hitung ulang support kandidat secara exact dalam satu pass (support & confidence exact)."
+                            )
+                            sizes = st.session_state.data[PRODUCT_LIST_COL].astype(str).str.count(',') + 1
+                            est_size = min(total_rows, pp.mining.required_sample_size(sample_eps, sample_delta, sizes))
+                            st.info(f"🎯 Estimasi ukuran sampel: ~{est_size:,} keranjang (dari {total_rows:,}).")
+                        elif use_sampling:
                             sample_ratio = st.slider(
                                 "Proporsi Sampel",
                                 min_value=0.05,
@@ -335,16 +707,24 @@ ORDER BY t.household_key, t.DAY"""
                             )
                             sample_size = min(total_rows, max(1000, int(total_rows * sample_ratio)))
                             st.info(f"📉 Analisis akan menggunakan {sample_size:,} keranjang (dari {total_rows:,}).")
-                        else:
+                        elif mining_mode == 'in_memory' and not top_k_mode:
                             sample_size = total_rows
                             st.success("📊 Menggunakan seluruh keranjang tanpa sampling.")
                         
-                        min_support_val = st.slider("Minimum Support", 0.001, 0.1, 0.01, 0.001, format="%.3f",
-                            help="Persentase minimum kemunculan itemset.")
+                        if not top_k_mode:
+                            min_support_val = st.slider("Minimum Support", 0.001, 0.1, 0.01, 0.001, format="%.3f",
+                                help="Persentase minimum kemunculan itemset.")
                         min_confidence = st.slider("Minimum Confidence", 0.1, 1.0, 0.3, 0.05, format="%.2f",
                             help="Minimum kepercayaan aturan.")
                         min_lift = st.slider("Minimum Lift", 1.0, 5.0, 1.1, 0.1, format="%.1f",
                             help="Minimum kekuatan hubungan.")
+                        time_limit = st.number_input(
+                            f"⏱️ Batas Waktu Mining (detik, 0 = {pp.TOP_K_TIME_LIMIT_S} detik)" if top_k_mode
+                            else "⏱️ Batas Waktu Mining (detik, 0 = tanpa batas)", min_value=0, max_value=3600,
+                            value=pp.TOP_K_TIME_LIMIT_S if top_k_mode else 0, step=10,
+                            help="Mining dihentikan saat waktu habis. Itemset yang sudah ditemukan (item paling "
+                                 "sering lebih dulu) tetap dipakai dan hasilnya ditandai PARSIAL."
+                        )
                     
                     with col_info:
                         st.markdown("""
@@ -354,40 +734,71 @@ ORDER BY t.household_key, t.DAY"""
                         - Lift > 1 = korelasi positif
                         """)
                 
+                if auto_mode:
+                    with st.container(border=True):
+                        st.markdown("**🧮 Rencana Eksekusi**")
+                        plan = pp.plan_association_rules(
+                            st.session_state.data, PRODUCT_LIST_COL, min_support_val,
+                            memory_budget_mb=memory_budget, time_budget_s=time_budget,
+                            data_key=st.session_state.data_key
+                        )
+                        show_plan(plan)
+                
                 col_run1, col_run2, col_run3 = st.columns([1, 2, 1])
                 with col_run2:
-                    run_arm = st.button("🚀 Jalankan FP-Growth", use_container_width=True, type="primary")
+                    run_arm = st.button("🚀 Jalankan FP-Growth", use_container_width=True, type="primary",
+                                        disabled=auto_mode and plan['strategy'] is None)
 
                 if run_arm:
-                    with st.spinner("⏳ Menjalankan FP-Growth..."):
-                        try:
-                            df = st.session_state.data
-                            p_col = PRODUCT_LIST_COL
-                            
-                            # Apply sampling if enabled
-                            if use_sampling and sample_size < len(df):
-                                df_sample = df.sample(n=sample_size, random_state=42)
-                                st.info(f"📊 Menggunakan {sample_size:,} sampel dari {len(df):,} transaksi")
-                            else:
-                                df_sample = df
-                            
-                            data_arm = pp.convert_product_list(df_sample.copy(), p_col)
-                            rules, antecedents = pp.run_association_rules(
-                                data_arm, p_col, 
-                                min_support=min_support_val,
-                                min_confidence=min_confidence,
-                                min_lift=min_lift
-                            )
-                            
-                            st.session_state.association_rules = rules
-                            st.session_state.antecedents = antecedents
-                            
-                            if rules is not None and not rules.empty:
-                                st.success(f"✅ Ditemukan **{len(rules)}** pola. Lihat di tab **📊 Hasil**.")
-                            else:
-                                st.warning("⚠️ Tidak ditemukan pola. Coba turunkan parameter.")
-                        except Exception as e:
-                            st.error(f"Error: {e}")
+                    rule_params = {'min_confidence': min_confidence, 'min_lift': min_lift}
+                    if time_limit:
+                        rule_params['time_limit_s'] = time_limit
+                    if out_of_core:
+                        run_mode = 'out_of_core'
+                        rule_params['min_support'] = min_support_val
+                    elif multilevel:
+                        run_mode = 'multilevel'
+                        rule_params.update(min_support=min_support_val, min_interest=min_interest,
+                                           cross_level=cross_level)
+                    elif top_k_mode:
+                        run_mode = 'top_k'
+                        rule_params.update(k=top_k, metric=top_k_metric,
+                                           max_len=top_k_max_len, min_count=top_k_min_count)
+                    elif auto_mode:
+                        run_mode = 'planned'
+                        rule_params['plan'] = plan
+                    elif use_sampling and sampling_method == 'adaptive':
+                        run_mode = 'adaptive'
+                        rule_params.update(epsilon=sample_eps, delta=sample_delta,
+                                           verify=verify_sample, min_support=min_support_val)
+                    else:
+                        run_mode = 'fixed'
+                        rule_params.update(sample_size=sample_size, min_support=min_support_val)
+
+                    group_by = st.session_state.basket_group_by
+                    product_level = st.session_state.basket_product_level
+                    submit_job(
+                        'rules', "FP-Growth", association_rules_job,
+                        None if streamed else st.session_state.data,
+                        run_mode, group_by, product_level,
+                        key=('rules', run_mode, db.analysis_fingerprint(group_by, product_level) if streamed
+                             else st.session_state.data_key,
+                             tuple(sorted((k, v) for k, v in rule_params.items() if k != 'plan')),
+                             (plan['strategy'], plan['min_support'], plan['sample_size']) if auto_mode else None),
+                        **rule_params
+                    )
+
+                def apply_rules_result(result):
+                    rules, antecedents, rule_index = result
+                    st.session_state.association_rules = rules
+                    st.session_state.antecedents = antecedents
+                    st.session_state.rule_index = rule_index
+                    if rules is not None and not rules.empty:
+                        st.success(f"✅ Ditemukan **{len(rules)}** pola. Lihat di tab **📊 Hasil**.")
+                    else:
+                        st.warning("⚠️ Tidak ditemukan pola. Coba turunkan parameter.")
+
+                show_job('rules', apply_rules_result)
         
         # === TAB 3: RESULTS ===
         with tab_results:
@@ -398,8 +809,20 @@ ORDER BY t.household_key, t.DAY"""
             else:
                 rules = st.session_state.association_rules
                 st.success(f"✅ Ditemukan **{len(rules)}** pola kebiasaan pelanggan.")
+                partial = rules.attrs.get('partial')
+                if partial:
+                    st.warning(
+                        f"⏱️ **Hasil PARSIAL:** mining dihentikan setelah {partial['elapsed_s']:g} detik "
+                        f"(batas {partial['time_limit_s']:g} detik). Rules berasal dari {partial['itemsets']:,} "
+                        "frequent itemsets pertama; pola dengan item yang lebih jarang belum tercakup."
+                    )
+                
+                if 'levels' in rules.columns:
+                    level_filter = st.multiselect("🪜 Filter Level Rules:", sorted(rules['levels'].unique()))
+                    if level_filter:
+                        rules = rules[rules['levels'].isin(level_filter)]
                 
-                cols_to_show = ['antecedents_str', 'consequents_str', 'support', 'confidence', 'lift']
+                cols_to_show = ['antecedents_str', 'consequents_str', 'support', 'confidence', 'lift', 'levels']
                 valid_cols = [c for c in cols_to_show if c in rules.columns]
                 display_df = rules[valid_cols].copy()
                 
@@ -408,7 +831,8 @@ ORDER BY t.household_key, t.DAY"""
                     'consequents_str': '...Maka Membeli',
                     'support': 'Popularitas (%)',
                     'confidence': 'Peluang (%)',
-                    'lift': 'Kekuatan (x)'
+                    'lift': 'Kekuatan (x)',
+                    'levels': 'Level'
                 }
                 display_df.rename(columns=rename_map, inplace=True)
                 
@@ -424,6 +848,23 @@ ORDER BY t.household_key, t.DAY"""
                 csv = rules.to_csv(index=False).encode('utf-8')
                 st.download_button("Download CSV", csv, "association_rules.csv", "text/csv")
                 
+                rule_index = st.session_state.rule_index
+                if rule_index is not None:
+                    with st.expander("🛒 Simulasi Rekomendasi Checkout"):
+                        sim_basket = st.multiselect("Isi keranjang pelanggan:", rule_index.items)
+                        sim_metric = st.radio("Urutkan Berdasarkan", ['lift', 'confidence'],
+                                              format_func=str.capitalize, horizontal=True, key="sim_metric")
+                        if sim_basket:
+                            start = time.perf_counter()
+                            recs = rule_index.recommend(sim_basket, k=5, metric=sim_metric)
+                            elapsed_us = (time.perf_counter() - start) * 1e6
+                            if recs:
+                                st.dataframe(pd.DataFrame(recs, columns=['Rekomendasi', sim_metric.capitalize()]),
+                                             use_container_width=True, hide_index=True)
+                            else:
+                                st.info("ℹ️ Tidak ada rule yang cocok dengan isi keranjang ini.")
+                            st.caption(f"⚡ Lookup RuleIndex: {elapsed_us:,.0f} µs ({len(rule_index):,} rules terindeks)")
+                
                 with st.expander("📚 Cara Membaca Tabel"):
                     st.markdown("""
                     * **Jika Membeli...**: Barang pemicu di keranjang
@@ -432,6 +873,173 @@ ORDER BY t.household_key, t.DAY"""
                     * **Peluang**: Kepercayaan prediksi
                     * **Kekuatan**: > 1x = hubungan kuat
                     """)
+        
+        # === TAB 4: SEQUENTIAL PATTERNS ===
+        with tab_sequences:
+            st.markdown("### 🔁 Pola Sekuensial Riwayat Belanja")
+            st.markdown("Temukan urutan pembelian antar kunjungan per rumah tangga, mis. *produk A dibeli, "
+                        "lalu dalam 14 hari berikutnya produk B*. Support dihitung per rumah tangga.")
+            
+            col_s1, col_s2, col_s3 = st.columns(3)
+            with col_s1:
+                seq_level = st.selectbox(
+                    "Level Produk:", db.PRODUCT_HIERARCHY,
+                    index=db.PRODUCT_HIERARCHY.index(st.session_state.basket_product_level)
+                    if st.session_state.basket_product_level in db.PRODUCT_HIERARCHY else 1,
+                    key="seq_level"
+                )
+                seq_support = st.slider("Min Support (% rumah tangga)", 1, 50, 10, key="seq_support",
+                                        help="Proporsi rumah tangga yang riwayatnya memuat pola.") / 100
+            with col_s2:
+                seq_gap = st.number_input(
+                    "Jarak Maksimum Antar Langkah (hari, 0 = tanpa batas)", min_value=0, max_value=365,
+                    value=14, step=1, key="seq_gap",
+                    help="Setiap langkah pola harus dibeli paling lama sekian hari setelah langkah sebelumnya."
+                )
+                seq_max_len = st.slider("Panjang Pola Maksimum (item)", 2, 6, 3, key="seq_max_len")
+            with col_s3:
+                seq_jobs = st.number_input("Jumlah Proses", min_value=1, max_value=os.cpu_count() or 1,
+                                           value=os.cpu_count() or 1, key="seq_jobs",
+                                           help="Ruang pencarian dibagi per item awal ke beberapa proses (multi-core).")
+                seq_time_limit = st.number_input("⏱️ Batas Waktu Mining (detik, 0 = tanpa batas)", min_value=0,
+                                                 max_value=3600, value=0, step=10, key="seq_time_limit")
+            
+            if st.button("🔁 Jalankan Mining Sekuensial", type="primary"):
+                seq_params = dict(product_level=seq_level, min_support=seq_support,
+                                  max_gap_days=seq_gap or None, max_len=seq_max_len, n_jobs=seq_jobs,
+                                  time_limit_s=seq_time_limit or None)
+                submit_job('sequences', "Mining Sekuensial", sequential_patterns_job,
+                           key=('sequences', db.get_dataset_version(), tuple(sorted(seq_params.items()))),
+                           **seq_params)
+            
+            def apply_sequences_result(result):
+                st.session_state.sequential_patterns = result
+                if result is None or result.empty:
+                    st.warning("⚠️ Tidak ditemukan pola sekuensial. Coba turunkan parameter.")
+            
+            show_job('sequences', apply_sequences_result)
+            
+            patterns = st.session_state.sequential_patterns
+            if patterns is not None and not patterns.empty:
+                partial = patterns.attrs.get('partial')
+                if partial:
+                    st.warning(f"⏱️ **Hasil PARSIAL:** mining dihentikan setelah {partial['elapsed_s']:g} detik; "
+                               "pola dengan item awal yang lebih jarang belum tercakup.")
+                col_m1, col_m2, col_m3 = st.columns(3)
+                col_m1.metric("Total Pola", f"{len(patterns):,}")
+                col_m2.metric("Pola Multi-Langkah", f"{(patterns['elements'] > 1).sum():,}")
+                col_m3.metric("Langkah Terpanjang", int(patterns['elements'].max()))
+                
+                only_steps = st.checkbox("Hanya pola multi-langkah (A → B)", value=True, key="seq_only_steps")
+                view = patterns[patterns['elements'] > 1] if only_steps else patterns
+                seq_sort = st.radio("Urutkan Berdasarkan", ['support', 'confidence'], format_func=str.capitalize,
+                                    horizontal=True, key="seq_sort")
+                view = view.sort_values(seq_sort, ascending=False)
+                display_df = view[['pattern', 'households', 'support', 'confidence']].rename(columns={
+                    'pattern': 'Urutan Pembelian', 'households': 'Rumah Tangga',
+                    'support': 'Popularitas (%)', 'confidence': 'Peluang Langkah Terakhir (%)'
+                })
+                display_df['Popularitas (%)'] = (display_df['Popularitas (%)'] * 100).round(2).astype(str) + '%'
+                display_df['Peluang Langkah Terakhir (%)'] = (
+                    (display_df['Peluang Langkah Terakhir (%)'] * 100).round(1).astype(str) + '%'
+                )
+                st.dataframe(display_df.head(1000), use_container_width=True, hide_index=True)
+                st.download_button("Download CSV", view.drop(columns=['sequence']).to_csv(index=False).encode('utf-8'),
+                                   "sequential_patterns.csv", "text/csv", key="seq_download")
+                
+                with st.expander("📚 Cara Membaca Pola"):
+                    st.markdown("""
+                    * **→**: kunjungan berikutnya (dalam batas jarak hari); **+**: dibeli di keranjang yang sama
+                    * **Popularitas**: proporsi rumah tangga yang riwayatnya memuat urutan ini
+                    * **Peluang Langkah Terakhir**: dari rumah tangga yang memuat awalan pola, berapa yang melanjutkan ke langkah terakhir
+                    """)
+            elif 'sequences' not in st.session_state.jobs:
+                st.info("ℹ️ Belum ada hasil. Atur parameter lalu jalankan mining sekuensial.")
+        
+        # === TAB 5: WEEKLY DRIFT (SLIDING WINDOW) ===
+        with tab_drift:
+            st.markdown("### 📈 Drift Rules per Minggu")
+            st.markdown("Rules dihitung untuk setiap jendela `WEEK_NO` yang bergeser. Support dipelihara "
+                        "inkremental (minggu masuk ditambah, minggu keluar dikurangi) sehingga FP-Growth tidak "
+                        "dijalankan ulang per jendela.")
+            
+            col_w1, col_w2, col_w3 = st.columns(3)
+            with col_w1:
+                win_level = st.selectbox(
+                    "Level Produk:", db.PRODUCT_HIERARCHY,
+                    index=db.PRODUCT_HIERARCHY.index(st.session_state.basket_product_level)
+                    if st.session_state.basket_product_level in db.PRODUCT_HIERARCHY else 1,
+                    key="win_level"
+                )
+                win_weeks = st.slider("Lebar Jendela (minggu)", 1, 26, 4, key="win_weeks")
+                win_step = st.slider("Geser per Langkah (minggu)", 1, 4, 1, key="win_step")
+            with col_w2:
+                win_support = st.slider("Min Support (%)", 0.5, 10.0, 2.0, 0.5, key="win_support") / 100
+                win_confidence = st.slider("Min Confidence", 0.05, 1.0, 0.3, 0.05, key="win_confidence")
+                win_lift = st.slider("Min Lift", 1.0, 5.0, 1.1, 0.1, key="win_lift")
+            with col_w3:
+                win_threshold = st.slider("Ambang Drift Lift (±%)", 5, 100, 25, 5, key="win_threshold",
+                                          help="Rules dilaporkan jika lift berubah minimal sebesar ini "
+                                               "dibanding jendela sebelumnya.") / 100
+                win_time_limit = st.number_input("⏱️ Batas Waktu (detik, 0 = tanpa batas)", min_value=0,
+                                                 max_value=3600, value=0, step=10, key="win_time_limit")
+            
+            if st.button("📈 Jalankan Analisis Drift", type="primary"):
+                win_params = dict(product_level=win_level, window_weeks=win_weeks, step_weeks=win_step,
+                                  min_support=win_support, min_confidence=win_confidence, min_lift=win_lift,
+                                  drift_threshold=win_threshold, time_limit_s=win_time_limit or None)
+                submit_job('drift', "Drift Rules Mingguan", pp.run_association_rules_windowed,
+                           key=('drift', db.get_dataset_version(), tuple(sorted(win_params.items()))),
+                           **win_params)
+            
+            def apply_drift_result(result):
+                st.session_state.window_rules = result
+                if result[2].empty:
+                    st.warning("⚠️ Tidak ada jendela yang menghasilkan pola. Coba turunkan parameter.")
+            
+            show_job('drift', apply_drift_result)
+            
+            if st.session_state.window_rules is not None and not st.session_state.window_rules[2].empty:
+                win_rules, drift, windows = st.session_state.window_rules
+                partial = windows.attrs.get('partial')
+                if partial:
+                    st.warning(f"⏱️ **Hasil PARSIAL:** {partial['windows']:,} jendela pertama "
+                               f"(dihentikan setelah {partial['elapsed_s']:g} detik).")
+                col_m1, col_m2, col_m3, col_m4 = st.columns(4)
+                col_m1.metric("Jendela", f"{len(windows):,}")
+                col_m2.metric("Rata-rata Rules/Jendela", f"{windows['rules'].mean():,.0f}")
+                col_m3.metric("Rules Drift", f"{len(drift):,}")
+                col_m4.metric("Waktu/Jendela", f"{windows['seconds'].mean() * 1000:,.0f} ms")
+                
+                st.markdown("**Jumlah rules & rules drift per jendela**")
+                st.line_chart(windows.set_index('week_start')[['rules', 'new_rules', 'dropped_rules', 'drifted']])
+                
+                st.markdown(f"**🚨 Laporan Drift** (|Δ lift| ≥ {int(win_threshold * 100)}%)")
+                if drift.empty:
+                    st.info("ℹ️ Tidak ada rules yang lift-nya berubah melebihi ambang.")
+                else:
+                    drift_view = drift.reindex(drift['lift_change'].abs().sort_values(ascending=False).index)
+                    drift_view = drift_view[['window', 'antecedents_str', 'consequents_str', 'lift_before', 'lift',
+                                             'lift_change']].rename(columns={
+                        'window': 'Jendela', 'antecedents_str': 'Jika Membeli...', 'consequents_str': '...Maka Membeli',
+                        'lift_before': 'Lift Sebelumnya', 'lift': 'Lift', 'lift_change': 'Perubahan'
+                    })
+                    drift_view['Perubahan'] = (drift_view['Perubahan'] * 100).round(1).map(lambda x: f"{x:+}%")
+                    st.dataframe(drift_view.round(2), use_container_width=True, hide_index=True)
+                    st.download_button("Download Laporan Drift (CSV)", drift.to_csv(index=False).encode('utf-8'),
+                                       "rule_drift.csv", "text/csv", key="drift_download")
+                
+                selected_window = st.selectbox("🗓️ Rules per Jendela:", windows['window'].tolist(), key="win_select")
+                shown = win_rules[win_rules['window'] == selected_window].sort_values('lift', ascending=False)
+                st.dataframe(shown[['antecedents_str', 'consequents_str', 'support', 'confidence', 'lift']].rename(columns={
+                    'antecedents_str': 'Jika Membeli...', 'consequents_str': '...Maka Membeli',
+                    'support': 'Support', 'confidence': 'Confidence', 'lift': 'Lift'
+                }).round(3), use_container_width=True, hide_index=True)
+                st.download_button("Download Rules Semua Jendela (CSV)",
+                                   win_rules.drop(columns=['antecedents', 'consequents']).to_csv(index=False).encode('utf-8'),
+                                   "window_rules.csv", "text/csv", key="window_rules_download")
+            elif 'drift' not in st.session_state.jobs:
+                st.info("ℹ️ Belum ada hasil. Atur jendela lalu jalankan analisis drift.")
 
 # --- PAGE 2: RFM ANALYSIS ---
 elif selected_page == "RFM Analysis":
@@ -455,26 +1063,25 @@ elif selected_page == "RFM Analysis":
                 st.caption(f"""RFM akan dihitung menggunakan:
                 - **Customer ID:** `{KEY_COL}`
                 - **Kolom Waktu:** `{DAY_COL}`
-                - **Basket:** `{PRODUCT_LIST_COL}` (jumlah item = Monetary proxy)
+                - **Monetary:** `{pp.MONETARY_COL}` (total SALES_VALUE per transaksi, dijumlahkan di SQL)
+                - **Sensitivitas Diskon:** porsi diskon toko & kupon (RETAIL_DISC, COUPON_DISC, COUPON_MATCH_DISC)
                 """)
             with col2:
                 run_rfm = st.button("🚀 Hitung RFM", use_container_width=True, type="primary")
 
         # Jalankan RFM Calculation
         if run_rfm:
-            with st.spinner("⏳ Menghitung skor RFM untuk setiap pelanggan..."):
-                try:
-                    rfm_result = pp.calculate_rfm(
-                        st.session_state.data,
-                        KEY_COL,
-                        DAY_COL,
-                        PRODUCT_LIST_COL
-                    )
-                    st.session_state.rfm_data = rfm_result
-                    st.session_state.rfm_calculated = True
-                    st.success(f"✅ RFM berhasil dihitung untuk {len(rfm_result)} pelanggan!")
-                except Exception as e:
-                    st.error(f"Gagal menghitung RFM: {e}")
+            submit_job(
+                'rfm', "Perhitungan RFM", rfm_job, st.session_state.data, st.session_state.data_key,
+                key=('rfm', st.session_state.data_key)
+            )
+
+        def apply_rfm_result(rfm_result):
+            st.session_state.rfm_data = rfm_result
+            st.session_state.rfm_calculated = True
+            st.success(f"✅ RFM berhasil dihitung untuk {len(rfm_result)} pelanggan!")
+
+        show_job('rfm', apply_rfm_result)
 
         # Tampilkan Hasil RFM
         if st.session_state.rfm_calculated and st.session_state.rfm_data is not None:
@@ -483,11 +1090,16 @@ elif selected_page == "RFM Analysis":
             
             # --- EXECUTIVE METRICS ---
             st.markdown("### 📊 Ringkasan Pelanggan")
-            m1, m2, m3, m4 = st.columns(4)
+            # Hasil lama (artifact) memakai jumlah item sebagai Monetary, tanpa kolom diskon
+            with_sales = rfm.attrs.get('monetary', 'items') != 'items'
+            with_discounts = 'Discount_Share' in rfm.columns
+            m1, m2, m3, m4, m5 = st.columns(5)
             m1.metric("Total Pelanggan", f"{len(rfm):,}")
             m2.metric("Avg Recency", f"{rfm['Recency'].mean():.0f} hari")
             m3.metric("Avg Frequency", f"{rfm['Frequency'].mean():.0f} transaksi")
-            m4.metric("Avg Monetary", f"{rfm['Monetary'].mean():,.0f} items")
+            m4.metric("Avg Monetary", f"${rfm['Monetary'].mean():,.2f}" if with_sales
+                      else f"{rfm['Monetary'].mean():,.0f} items")
+            m5.metric("Avg Porsi Diskon", f"{rfm['Discount_Share'].mean() * 100:.1f}%" if with_discounts else "-")
 
             # --- SEGMENT DISTRIBUTION ---
             st.markdown("### 🎯 Distribusi Segmen Pelanggan")
@@ -534,7 +1146,7 @@ elif selected_page == "RFM Analysis":
                 display_rfm = display_rfm[display_rfm['Segment'].isin(segment_filter)]
             
             # Tampilkan kolom yang relevan
-            display_cols = [KEY_COL, 'Recency', 'Frequency', 'Monetary', 
+            display_cols = [KEY_COL, 'Recency', 'Frequency', 'Monetary', 'Discount_Share', 'Coupon_Share',
                           'R_Score', 'F_Score', 'M_Score', 'RFM_Score', 'Total_Score', 'Segment']
             display_cols = [c for c in display_cols if c in display_rfm.columns]
             
@@ -585,8 +1197,184 @@ elif selected_page == "RFM Analysis":
                 | 🔥 Can't Lose Them | Pernah terbaik, sekarang hilang | Kritis |
                 """)
 
+# --- PAGE 2B: STORE ANALYSIS (PARTITIONED) ---
+elif selected_page == "Store Analysis":
+    import plotly.express as px
+
+    st.markdown('<div class="main-header">🏬 Analisis per Toko & Segmen</div>', unsafe_allow_html=True)
+    st.markdown('<div class="sub-header">Association rules dan segmentasi RFM dihitung terpisah untuk setiap toko (STORE_ID) atau kelompok demografis, dijalankan paralel, lalu dibandingkan antar partisi. Semua partisi memakai kamus item yang sama sehingga rules dapat dibandingkan langsung.</div>', unsafe_allow_html=True)
+
+    if not db.database_exists():
+        st.warning("⚠️ Database belum dibuat. Silakan buat database di halaman Database.")
+    else:
+        demo_labels = db.get_demographic_options()
+        partition_label = lambda col: "Toko (STORE_ID)" if col == 'STORE_ID' else f"{demo_labels.get(col, col)} ({col})"
+
+        with st.container(border=True):
+            st.markdown("**⚙️ Konfigurasi Analisis Terpartisi**")
+            col_p1, col_p2, col_p3 = st.columns(3)
+            with col_p1:
+                part_by = st.selectbox("Partisi Berdasarkan:", db.PARTITION_COLUMNS, format_func=partition_label,
+                                       key="part_by")
+                part_level = st.selectbox(
+                    "Level Produk:", db.PRODUCT_HIERARCHY,
+                    index=db.PRODUCT_HIERARCHY.index(st.session_state.basket_product_level)
+                    if st.session_state.basket_product_level in db.PRODUCT_HIERARCHY else 1,
+                    key="part_level"
+                )
+                part_analyses = st.multiselect(
+                    "Analisis:", list(pp.PARTITION_ANALYSES), default=list(pp.PARTITION_ANALYSES),
+                    format_func=lambda a: {'rules': "Association Rules", 'rfm': "RFM"}[a], key="part_analyses"
+                )
+            with col_p2:
+                part_support = st.slider("Min Support (%)", 0.5, 10.0, 2.0, 0.5, key="part_support") / 100
+                part_confidence = st.slider("Min Confidence", 0.05, 1.0, 0.3, 0.05, key="part_confidence")
+                part_lift = st.slider("Min Lift", 1.0, 5.0, 1.1, 0.1, key="part_lift")
+                part_max_len = st.slider("Panjang Itemset Maks.", 2, 5, 3, key="part_max_len")
+            with col_p3:
+                part_min_baskets = st.number_input(
+                    "Min. Keranjang per Partisi", min_value=20, max_value=100_000, value=200, step=50,
+                    key="part_min_baskets", help="Partisi yang lebih kecil dilewati: support pada sedikit "
+                                                 "keranjang tidak stabil dan memunculkan terlalu banyak itemset."
+                )
+                part_jobs = st.number_input("Jumlah Proses", min_value=1, max_value=64, value=os.cpu_count() or 1,
+                                            key="part_jobs")
+                part_time_limit = st.number_input("⏱️ Batas Waktu (detik, 0 = tanpa batas)", min_value=0,
+                                                  max_value=7200, value=0, step=30, key="part_time_limit")
+
+            if st.button("🏬 Jalankan Analisis per Partisi", type="primary", disabled=not part_analyses):
+                part_params = dict(partition_by=part_by, product_level=part_level, analyses=tuple(part_analyses),
+                                   min_baskets=int(part_min_baskets), min_support=part_support,
+                                   min_confidence=part_confidence, min_lift=part_lift, max_len=part_max_len,
+                                   n_jobs=int(part_jobs), time_limit_s=part_time_limit or None)
+                submit_job('partitions', "Analisis per Partisi", pp.run_partitioned_analysis,
+                           key=('partitions', db.get_dataset_version(), tuple(sorted(part_params.items()))),
+                           **part_params)
+
+        def apply_partition_result(result):
+            summary = result[0]
+            if summary.empty or summary.attrs.get('run_id') is None:
+                st.warning("⚠️ Tidak ada partisi yang dianalisis. Coba turunkan Min. Keranjang per Partisi.")
+                return
+            st.session_state.part_run = summary.attrs['run_id']  # tampilkan run yang baru selesai
+            st.success(f"✅ {int((summary['status'] != 'too_small').sum()):,} partisi dianalisis dan disimpan.")
+
+        show_job('partitions', apply_partition_result)
+
+        # --- HASIL TERSIMPAN (SQLITE) ---
+        runs, err = db.get_partition_runs()
+        if err:
+            st.error(f"❌ Gagal membaca hasil tersimpan: {err}")
+        elif runs.empty:
+            if 'partitions' not in st.session_state.jobs:
+                st.info("ℹ️ Belum ada hasil. Atur partisi lalu jalankan analisis.")
+        else:
+            run_ids = runs['run_id'].tolist()
+            run_info = runs.set_index('run_id')
+            col_r1, col_r2 = st.columns([4, 1])
+            with col_r1:
+                run_id = st.selectbox(
+                    "📂 Run Tersimpan:", run_ids,
+                    format_func=lambda r: f"{run_info.at[r, 'created_at']} · {partition_label(run_info.at[r, 'partition_by'])}"
+                                          f" · {run_info.at[r, 'product_level']} ({r})",
+                    key="part_run"
+                )
+            with col_r2:
+                st.write("")
+                if st.button("🗑️ Hapus Run", use_container_width=True):
+                    db.delete_partition_run(run_id)
+                    st.session_state.pop('part_run', None)
+                    st.rerun()
+            run = run_info.loc[run_id]
+            if run['dataset_version'] != db.get_dataset_version():
+                st.warning("⚠️ Run ini dihitung dari versi data sebelumnya (database telah dimuat ulang).")
+            if run['partial']:
+                st.warning(f"⏱️ **Hasil PARSIAL:** {run['partial']}")
+            st.caption(f"Parameter: `{run['params']}`")
+
+            summary, _ = db.get_partition_summary(run_id)
+            analyzed = summary[summary['status'].isin(['ok', 'partial'])]
+            col_m1, col_m2, col_m3, col_m4 = st.columns(4)
+            col_m1.metric("Partisi Dianalisis", f"{len(analyzed):,} / {len(summary):,}")
+            col_m2.metric("Total Rules", f"{int(analyzed['rules'].sum()):,}")
+            col_m3.metric("Rata-rata Rules/Partisi", f"{analyzed['rules'].mean():,.0f}" if len(analyzed) else "-")
+            col_m4.metric("Waktu Total", f"{run['seconds']:,.1f} detik")
+
+            tab_summary, tab_rules, tab_rfm = st.tabs(["📋 Ringkasan Partisi", "🔗 Perbandingan Rules",
+                                                       "👥 Perbandingan RFM"])
+
+            with tab_summary:
+                st.bar_chart(analyzed.set_index('partition_key')[['rules']].head(50), color="#2e7bcf")
+                st.dataframe(summary.drop(columns=['run_id']).rename(columns={
+                    'partition_key': 'Partisi', 'baskets': 'Keranjang', 'households': 'Rumah Tangga',
+                    'items': 'Item', 'itemsets': 'Itemset', 'rules': 'Rules', 'seconds': 'Waktu (detik)',
+                    'status': 'Status'
+                }), use_container_width=True, hide_index=True)
+                st.caption("Status: ok = selesai, partial = dihentikan batas waktu, skipped = belum dimulai, "
+                           "too_small = keranjang di bawah batas minimum.")
+
+            with tab_rules:
+                min_partitions = st.slider("Rules yang muncul di minimal N partisi", 1, max(len(analyzed), 1),
+                                           min(2, max(len(analyzed), 1)), key="part_min_partitions")
+                comparison, err = db.get_partition_rule_comparison(run_id, min_partitions)
+                if err:
+                    st.error(f"❌ {err}")
+                elif comparison.empty:
+                    st.info("ℹ️ Tidak ada rules yang muncul di sebanyak itu partisi.")
+                else:
+                    st.markdown("**Rules lintas partisi** (rules yang konsisten di banyak toko vs. yang lokal)")
+                    view = comparison.copy()
+                    view['partition_share'] = (view['partition_share'] * 100).round(1)
+                    st.dataframe(view.rename(columns={
+                        'antecedents': 'Jika Membeli...', 'consequents': '...Maka Membeli',
+                        'partitions': 'Jumlah Partisi', 'partition_share': '% Partisi', 'avg_support': 'Avg Support',
+                        'avg_confidence': 'Avg Confidence', 'avg_lift': 'Avg Lift', 'min_lift': 'Min Lift',
+                        'max_lift': 'Max Lift'
+                    }).round(3), use_container_width=True, hide_index=True)
+                    st.download_button("Download Perbandingan Rules (CSV)", comparison.to_csv(index=False).encode('utf-8'),
+                                       "partition_rule_comparison.csv", "text/csv", key="part_rules_download")
+
+                selected_partition = st.selectbox("🏬 Rules per Partisi:", analyzed['partition_key'].tolist(),
+                                                  key="part_select")
+                if selected_partition is not None:
+                    partition_rules, _ = db.get_partition_rules(run_id, selected_partition)
+                    st.dataframe(partition_rules[['antecedents', 'consequents', 'support', 'confidence', 'lift']].rename(columns={
+                        'antecedents': 'Jika Membeli...', 'consequents': '...Maka Membeli',
+                        'support': 'Support', 'confidence': 'Confidence', 'lift': 'Lift'
+                    }).round(3), use_container_width=True, hide_index=True)
+
+            with tab_rfm:
+                shares, err = db.get_partition_segment_shares(run_id)
+                if err:
+                    st.error(f"❌ {err}")
+                elif shares.empty:
+                    st.info("ℹ️ Run ini tidak memuat analisis RFM.")
+                else:
+                    top_partitions = analyzed['partition_key'].head(30).tolist()
+                    fig_segments = px.bar(
+                        shares[shares['partition_key'].isin(top_partitions)],
+                        x='partition_key', y='pct_of_partition', color='Segment',
+                        category_orders={'partition_key': top_partitions,
+                                         'Segment': list(pp.get_segment_recommendations().keys())},
+                        title="Komposisi Segmen RFM per Partisi (30 partisi terbesar)",
+                        labels={'partition_key': 'Partisi', 'pct_of_partition': '% Rumah Tangga'}
+                    )
+                    fig_segments.update_layout(barmode='stack', height=500, xaxis_type='category')
+                    st.plotly_chart(fig_segments, use_container_width=True)
+
+                    pivot = shares.pivot_table(index='partition_key', columns='Segment', values='pct_of_partition',
+                                               fill_value=0).reindex(analyzed['partition_key'])
+                    st.markdown("**% rumah tangga per segmen**")
+                    st.dataframe(pivot.round(1), use_container_width=True)
+                    st.download_button("Download Segmen per Partisi (CSV)", shares.to_csv(index=False).encode('utf-8'),
+                                       "partition_rfm_segments.csv", "text/csv", key="part_rfm_download")
+                    st.caption("Skor RFM dihitung relatif terhadap pelanggan partisi yang sama (quintile per toko), "
+                               "sehingga satu rumah tangga dapat memiliki segmen berbeda di toko berbeda.")
+
 # --- PAGE 3: PRODUCT AFFINITY ---
 elif selected_page == "Product Affinity":
+    import plotly.express as px
+
     st.markdown('<div class="main-header">Demographic-Based Product Affinity</div>', unsafe_allow_html=True)
     st.markdown('<div class="sub-header">Analisis preferensi produk berbasis segmentasi demografis untuk mengidentifikasi deviasi konsumsi antar kohor pelanggan.</div>', unsafe_allow_html=True)
     
@@ -979,67 +1767,27 @@ elif selected_page == "ANN Training":
             elif not st.session_state.get("selected_demo_features"):
                 st.error("Pilih minimal satu fitur demografis sebelum melatih model.")
             else:
-                with st.spinner("🤖 Sedang melatih model (Pre-processing > Encoding > Training)..."):
-                    try:
-                        df = st.session_state.data
-                        p_col = PRODUCT_LIST_COL
-                        d_feats = get_active_demo_features()
-                        
-                        data_ann = pp.convert_product_list(df.copy(), p_col)
-                        data_target = pp.create_target_variable(data_ann, p_col, target_list)
-                        data_enc = pp.encode_features(data_target, d_feats)
+                d_feats = get_active_demo_features()
+                st.session_state.target_product = ", ".join(target_list)  # Store target product
+                submit_job(
+                    'ann', "Training ANN", ann_training_job,
+                    st.session_state.data, st.session_state.data_key, target_list, d_feats, resample,
+                    key=('ann', st.session_state.data_key, frozenset(target_list), tuple(d_feats), resample)
+                )
 
-                        y_full = data_enc['PX']
-                        orig_cols = set(data_target.columns)
-                        final_cols = set(data_enc.columns)
-                        X_full = data_enc[list(final_cols - orig_cols)].copy() 
+        def apply_ann_result(result):
+            for name in ['X_full', 'full_keys', 'model', 'eval_metrics', 'feature_importance', 'prediction_results']:
+                st.session_state[name] = result[name]
+            with st.expander("Lihat Distribusi Data Training"):
+                st.write("Target Distribution (Train):", result['train_distribution'])
+            st.success("✅ Training Selesai! Lihat hasil detail di menu 'Prediction Results'.")
 
-                        st.session_state.X_full = X_full
-                        st.session_state.full_keys = data_enc[[KEY_COL, p_col, 'PX']]
-                        st.session_state.target_product = ", ".join(target_list)  # Store target product
-
-                        X_train, y_train, X_test, y_test = mu.split_and_resample(X_full, y_full, method=resample)
-                        
-                        with st.expander("Lihat Distribusi Data Training"):
-                            st.write("Target Distribution (Train):", y_train.value_counts())
-                        
-                        model = mu.train_ann_model(X_train, y_train)
-                        st.session_state.model = model
-                        st.session_state.eval_metrics = mu.generate_evaluation_metrics(model, X_test, y_test)
-                        
-                        # Calculate Feature Importance using permutation importance
-                        from sklearn.inspection import permutation_importance
-                        perm_importance = permutation_importance(model, X_test, y_test, n_repeats=10, random_state=42, n_jobs=-1)
-                        
-                        # Store feature importance
-                        feature_imp_df = pd.DataFrame({
-                            'feature': X_full.columns,
-                            'importance': perm_importance.importances_mean,
-                            'std': perm_importance.importances_std
-                        }).sort_values('importance', ascending=False)
-                        st.session_state.feature_importance = feature_imp_df
-                        
-                        probs, preds = mu.get_predictions(model, X_full)
-                        res_df = st.session_state.full_keys.copy()
-                        res_df['Probability'] = probs
-                        res_df['Prediction'] = preds
-                        
-                        # Merge demographic data and contact info for buyer persona analysis
-                        demo_cols = [KEY_COL] + d_feats
-                        if CONTACT_COL in df.columns:
-                            demo_cols.append(CONTACT_COL)
-                        demo_data = df[demo_cols].drop_duplicates(subset=[KEY_COL])
-                        res_df = res_df.merge(demo_data, on=KEY_COL, how='left')
-                        
-                        st.session_state.prediction_results = res_df
-                        
-                        st.success("✅ Training Selesai! Lihat hasil detail di menu 'Prediction Results'.")
-                        
-                    except Exception as e:
-                        st.error(f"Gagal training: {e}")
+        show_job('ann', apply_ann_result)
 
 # --- PAGE 5: RESULTS ---
 elif selected_page == "Prediction Results":
+    import plotly.express as px
+
     st.markdown('<div class="main-header">📈 Actionable Marketing Intelligence</div>', unsafe_allow_html=True)
     st.markdown('<div class="sub-header">Buyer Persona, Feature Importance, dan Target List untuk kampanye produk.</div>', unsafe_allow_html=True)
 
@@ -1339,7 +2087,8 @@ elif selected_page == "Prediction Results":
             for i, feat in enumerate(active_demo_features[:3]):
                 if feat in target_list_df.columns:
                     with demo_breakdown_cols[i]:
-                        breakdown = target_list_df[feat].value_counts().head(5)
+                        breakdown = target_list_df[feat].value_counts()
+                        breakdown = breakdown[breakdown > 0].head(5)  # Categorical: skip unused categories
                         st.markdown(f"**{feat.replace('_', ' ').title()}**")
                         for val, count in breakdown.items():
                             pct = count / len(target_list_df) * 100
@@ -1469,6 +2218,8 @@ TOP DEMOGRAPHICS:
         
 # --- PAGE 6: BUSINESS INSIGHTS ---
 elif selected_page == "Business Insights":
+    import plotly.express as px
+
     st.markdown('<div class="main-header">💡 Comprehensive Business Intelligence Dashboard</div>', unsafe_allow_html=True)
     st.markdown('<div class="sub-header">Agregasi dan sintesis terintegrasi atas seluruh keluaran analitik DSS—Association Rules Mining, RFM Segmentation, Product Affinity Analysis, dan Artificial Neural Network—untuk formulasi keputusan strategis berbasis data.</div>', unsafe_allow_html=True)
     
@@ -2383,6 +3134,9 @@ elif selected_page == "Database":
                 
                 if 'error' not in summary:
                     db.clear_cached_queries()
+                    jobs.get_runner().forget_finished()  # hasil job lama berasal dari data lama
+                    submit_job('warmup', "Pre-warming cache", cache_warmup_job, WARMUP_TIME_BUDGET,
+                               key=('warmup', db.get_dataset_version()))
                     st.success("✅ Database berhasil dibuat!")
                     st.rerun()
                 else:
@@ -2391,11 +3145,25 @@ elif selected_page == "Database":
             if st.button("🔄 Refresh Database", use_container_width=True):
                 db.delete_database()
                 db.clear_cached_queries()
+                jobs.get_runner().forget_finished()
                 st.rerun()
 
+    def show_warmup_report(report):
+        tasks = report['tasks']
+        warmed = sum(task['status'] == 'warmed' for task in tasks)
+        st.success(f"🔥 Cache siap: {warmed}/{len(tasks)} query dihitung lebih awal dalam {report['seconds']:.1f} detik.")
+        if warmed < len(tasks):
+            st.info("ℹ️ Query yang melewati batas waktu (timeout/skipped) akan dihitung saat halaman pertama kali dibuka.")
+        with st.expander("📋 Laporan Pre-warming"):
+            st.dataframe(pd.DataFrame(tasks), use_container_width=True, hide_index=True)
+
+    show_job('warmup', show_warmup_report)
+
     if db_exists:
         # --- TABS FOR DIFFERENT VIEWS ---
-        tab1, tab2, tab3 = st.tabs(["📊 Table Browser", "🔍 SQL Query", "ℹ️ Schema"])
+        tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs(
+            ["📊 Table Browser", "🔍 SQL Query", "ℹ️ Schema", "⚡ Cache", "⏱️ Query Performance", "🧭 Profil Run"]
+        )
         
         # === TAB 1: TABLE BROWSER ===
         with tab1:
@@ -2566,3 +3334,124 @@ ORDER BY revenue DESC""",
             
             rel_df = pd.DataFrame(relationships)
             st.dataframe(rel_df, use_container_width=True, hide_index=True)
+
+        # === TAB 4: CACHE ===
+        with tab4:
+            st.markdown("### ⚡ Cache Hasil Query & Analisis")
+            cache = caching.get_backend()
+            if not hasattr(cache, 'stats'):
+                st.info("ℹ️ Cache dua tingkat tidak aktif pada sesi ini.")
+            else:
+                stats = cache.stats()
+                totals = stats['totals']
+                hits = totals.get('memory_hits', 0) + totals.get('disk_hits', 0)
+                lookups = hits + totals.get('misses', 0)
+                st.caption(
+                    f"Memori (LRU) + disk (`{stats['path']}`). Entri otomatis tidak berlaku saat database "
+                    f"dimuat ulang (versi data: `{stats['version']}`), bukan berdasarkan waktu."
+                )
+
+                c1, c2, c3, c4 = st.columns(4)
+                c1.metric("Hit Rate", f"{hits / lookups:.0%}" if lookups else "-")
+                c2.metric("Hit Memori", f"{totals.get('memory_hits', 0):,}")
+                c3.metric("Hit Disk", f"{totals.get('disk_hits', 0):,}")
+                c4.metric("Miss", f"{totals.get('misses', 0):,}")
+
+                c1, c2, c3 = st.columns(3)
+                c1.metric("Memori", f"{stats['memory_bytes'] / 2**20:.1f} / {stats['max_memory_bytes'] / 2**20:.0f} MB",
+                          help=f"{stats['memory_entries']} entri")
+                c2.metric("Disk", f"{stats['disk_bytes'] / 2**20:.1f} / {stats['max_disk_bytes'] / 2**20:.0f} MB",
+                          help=f"{stats['disk_entries']} entri")
+                c3.metric("Eviction", f"{sum(stats['evictions'].values()):,}",
+                          help=", ".join(f"{k}: {v}" for k, v in stats['evictions'].items()) or None)
+
+                if stats['functions']:
+                    func_df = pd.DataFrame([
+                        {'Fungsi': name, 'Hit Memori': c.get('memory_hits', 0), 'Hit Disk': c.get('disk_hits', 0),
+                         'Miss': c.get('misses', 0), 'Tidak Bisa Di-cache': c.get('uncacheable', 0)}
+                        for name, c in sorted(stats['functions'].items())
+                    ])
+                    st.dataframe(func_df, use_container_width=True, hide_index=True)
+
+                col_clear, col_warm = st.columns(2)
+                if col_clear.button("🧹 Kosongkan Cache", use_container_width=True):
+                    cache.clear()
+                    st.rerun()
+                if col_warm.button("🔥 Pre-warm Cache", use_container_width=True):
+                    submit_job('warmup', "Pre-warming cache", cache_warmup_job, WARMUP_TIME_BUDGET)
+                    st.rerun()
+
+        # === TAB 5: QUERY PERFORMANCE ===
+        with tab5:
+            st.markdown("### ⏱️ Query Performance")
+            st.caption(
+                "Durasi, jumlah baris dan `EXPLAIN QUERY PLAN` setiap query SQL sejak aplikasi dijalankan. "
+                "Hasil yang diambil dari cache tidak menjalankan query sehingga tidak tercatat. "
+                f"Query ≥ {db.SLOW_QUERY_MS} ms disimpan di slow-query log (`{db.QUERY_LOG_PATH.name}`)."
+            )
+
+            stats_df = db.get_query_stats()
+            slow_df, err = db.get_slow_queries()
+            if err:
+                st.error(f"❌ Gagal membaca slow-query log: {err}")
+                slow_df = pd.DataFrame()
+
+            c1, c2, c3, c4 = st.columns(4)
+            c1.metric("Query Tercatat", f"{stats_df['calls'].sum():,}")
+            c2.metric("Total Waktu", f"{stats_df['total_ms'].sum() / 1000:,.1f} s")
+            c3.metric("Slow Query (log)", f"{len(slow_df):,}")
+            c4.metric("Full Scan `transactions`", f"{int(stats_df['full_scan'].sum()):,}",
+                      help="Query yang membaca seluruh tabel transactions tanpa index.")
+
+            if stats_df.empty:
+                st.info("ℹ️ Belum ada query yang tercatat. Buka halaman analisis untuk menjalankan query.")
+            else:
+                st.markdown("#### 🐢 Top Offenders")
+                if stats_df['full_scan'].any():
+                    st.warning("⚠️ Ada query yang melakukan full table scan pada `transactions` "
+                               "(ditandai ⚠️). Pertimbangkan index untuk kolom filter/join-nya.")
+                top_df = stats_df.head(20).copy()
+                top_df.insert(0, 'scan', top_df['full_scan'].map({True: '⚠️', False: ''}))
+                st.dataframe(
+                    top_df.drop(columns=['full_scan', 'plan']).rename(columns={
+                        'scan': 'Full Scan', 'source': 'Fungsi', 'calls': 'Panggilan', 'errors': 'Error',
+                        'total_ms': 'Total (ms)', 'avg_ms': 'Rata-rata (ms)', 'max_ms': 'Maks (ms)',
+                        'avg_rows': 'Rata-rata Baris', 'query': 'Query'
+                    }),
+                    use_container_width=True, hide_index=True
+                )
+                with st.expander("📋 Query Plan"):
+                    for _, row in top_df.iterrows():
+                        st.markdown(f"**{row['scan']} {row['source']}** — {row['total_ms']:,.1f} ms total, "
+                                    f"{row['calls']}× dipanggil")
+                        st.code(row['plan'], language=None)
+
+            if not slow_df.empty:
+                st.markdown("#### 📜 Slow-Query Log")
+                slow_view = slow_df.copy()
+                slow_view['full_scan'] = slow_view['full_scan'].map({True: '⚠️', False: ''})
+                st.dataframe(slow_view, use_container_width=True, hide_index=True)
+
+            if st.button("🧹 Reset Statistik & Log", use_container_width=True):
+                db.clear_query_log()
+                st.rerun()
+
+        # === TAB 6: PROFIL RUN ===
+        with tab6:
+            st.markdown("### 🧭 Profil Run Analisis")
+            st.caption(
+                "Setiap job (FP-Growth, RFM, training ANN, pre-warming) dicatat per tahap: waktu wall & CPU, "
+                "RSS dan tahap SQL. CPU & RSS dihitung untuk seluruh proses, termasuk sesi lain yang berjalan "
+                "bersamaan."
+            )
+            runs = [run for run in tracing.recent_traces() if run.wall is not None]
+            if not runs:
+                st.info("ℹ️ Belum ada run yang tercatat. Jalankan analisis di halaman lain terlebih dahulu.")
+            else:
+                run_idx = st.selectbox(
+                    "Pilih run:", range(len(runs)),
+                    format_func=lambda i: (f"{runs[i].name} — "
+                                           f"{time.strftime('%H:%M:%S', time.localtime(runs[i].started))} "
+                                           f"({runs[i].wall:.1f} detik{', error' if runs[i].error else ''})")
+                )
+                show_trace(runs[run_idx])
@@ -0,0 +1,75 @@
+"""bench_demographic_dtypes.py
+
+Compare object-string demographics against the Categorical columns returned by
+`database.get_analysis_data` (memory + ANN preprocessing time).
+
+Usage (requires datasets/retail.db):
+    python benchmarks/bench_demographic_dtypes.py [--group-by BASKET_ID] [--level COMMODITY_DESC]
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import database as db  # noqa: E402
+import preprocessing as pp  # noqa: E402
+
+DEMO_FEATURES = [col for col in db.DEMOGRAPHIC_COLUMNS if col != 'phone_number']
+
+
+def timed(func, repeat=3):
+    """Return the best wall time (seconds) of `repeat` calls and the last result."""
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def persona_ops(df):
+    """Replicate the persona `value_counts` / `mode` calls made in app.py."""
+    for feat in DEMO_FEATURES:
+        df[feat].value_counts()
+        df[feat].mode()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[2])
+    parser.add_argument('--group-by', default='BASKET_ID')
+    parser.add_argument('--level', default='COMMODITY_DESC')
+    args = parser.parse_args()
+
+    if not db.database_exists():
+        sys.exit("datasets/retail.db not found - build the database first.")
+
+    typed_df, err = db.get_analysis_data(group_by=args.group_by, product_level=args.level)
+    if err:
+        sys.exit(err)
+    object_df = typed_df.copy()
+    for col in db.DEMOGRAPHIC_COLUMNS:
+        object_df[col] = object_df[col].astype(object)
+
+    cols = db.DEMOGRAPHIC_COLUMNS
+    mem_obj = object_df[cols].memory_usage(deep=True).sum() / 1024 / 1024
+    mem_cat = typed_df[cols].memory_usage(deep=True).sum() / 1024 / 1024
+
+    t_enc_obj, _ = timed(lambda: pd.get_dummies(object_df, columns=DEMO_FEATURES, drop_first=True))
+    t_enc_cat, _ = timed(lambda: pp.encode_features(typed_df, DEMO_FEATURES))
+    t_per_obj, _ = timed(lambda: persona_ops(object_df))
+    t_per_cat, _ = timed(lambda: persona_ops(typed_df))
+
+    print(f"rows: {len(typed_df):,}")
+    print(f"{'':28}{'object':>12}{'categorical':>14}")
+    print(f"{'demographic memory (MB)':28}{mem_obj:12.1f}{mem_cat:14.1f}")
+    print(f"{'one-hot encoding (ms)':28}{t_enc_obj * 1000:12.1f}{t_enc_cat * 1000:14.1f}")
+    print(f"{'persona value_counts (ms)':28}{t_per_obj * 1000:12.1f}{t_per_cat * 1000:14.1f}")
+
+
+if __name__ == '__main__':
+    main()
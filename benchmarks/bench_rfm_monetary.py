@@ -0,0 +1,74 @@
+"""bench_rfm_monetary.py
+
+Compare RFM with the item-count Monetary proxy against the SALES_VALUE / discount
+totals that `database.get_analysis_data` sums in SQL (runtime + segment agreement).
+
+Usage (requires datasets/retail.db):
+    python benchmarks/bench_rfm_monetary.py [--group-by BASKET_ID] [--level COMMODITY_DESC]
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import caching  # noqa: E402
+import database as db  # noqa: E402
+import preprocessing as pp  # noqa: E402
+
+KEY_COL = "household_key"
+DAY_COL = "DAY"
+PRODUCT_LIST_COL = "product_list"
+
+
+def timed(func, repeat=3):
+    """Return the best wall time (seconds) of `repeat` calls and the last result."""
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[2])
+    parser.add_argument('--group-by', default='BASKET_ID')
+    parser.add_argument('--level', default='COMMODITY_DESC')
+    args = parser.parse_args()
+
+    if not db.database_exists():
+        sys.exit("datasets/retail.db not found - build the database first.")
+    # No cache: every call recomputes
+    caching.set_backend(caching.CacheBackend())
+
+    df, err = db.get_analysis_data(group_by=args.group_by, product_level=args.level)
+    if err:
+        sys.exit(err)
+
+    def rfm(monetary_col):
+        return pp.calculate_rfm(df, KEY_COL, DAY_COL, PRODUCT_LIST_COL, data_key='bench', monetary_col=monetary_col)
+
+    t_proxy, proxy = timed(lambda: rfm(None))
+    t_sales, sales = timed(lambda: rfm(pp.MONETARY_COL))
+    scores = sales[['R_Score', 'F_Score', 'M_Score']]
+    t_apply, _ = timed(lambda: scores.apply(pp.assign_rfm_segment, axis=1))
+    t_vector, _ = timed(lambda: pp.segment_rfm_scores(scores['R_Score'], scores['F_Score'], scores['M_Score']))
+
+    merged = proxy.merge(sales, on=KEY_COL, suffixes=('_proxy', '_sales'))
+    print(f"rows: {len(df):,}  households: {len(sales):,}")
+    print(f"{'':30}{'item proxy':>12}{'SQL sales':>12}")
+    print(f"{'calculate_rfm (ms)':30}{t_proxy * 1000:12.1f}{t_sales * 1000:12.1f}")
+    print(f"{'':30}{'apply':>12}{'np.select':>12}")
+    print(f"{'segment assignment (ms)':30}{t_apply * 1000:12.1f}{t_vector * 1000:12.1f}")
+    print(f"M_Score agreement: {(merged['M_Score_proxy'] == merged['M_Score_sales']).mean():.1%}  "
+          f"segment agreement: {(merged['Segment_proxy'] == merged['Segment_sales']).mean():.1%}")
+    if 'Discount_Share' in sales.columns:
+        print(f"mean discount share: {sales['Discount_Share'].mean():.1%}  "
+              f"mean coupon share: {sales['Coupon_Share'].mean():.1%}")
+
+
+if __name__ == '__main__':
+    main()
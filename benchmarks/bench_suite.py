@@ -0,0 +1,276 @@
+"""bench_suite.py
+
+End-to-end benchmark at several data scales on synthetic data
+(`synthetic_data.py`): for each scale the CSV files are generated (or
+reused), loaded into a scratch SQLite database and every stage of the
+analysis chain is timed with `tracing` spans:
+
+    ingest -> get_analysis_data -> fpgrowth (in-memory, capped sample)
+           -> fpgrowth_out_of_core -> fpgrowth_multilevel -> fpgrowth_windowed
+           -> partitioned (rules + RFM per STORE_ID) -> rfm -> affinity -> ann
+
+Caching is disabled (pass-through backend) so every run does the full work.
+Results (wall/CPU time, RSS, stage details, environment, git commit) are
+written to benchmarks/results/bench_<timestamp>.json; `--compare` prints the
+ratio to an earlier results file and flags regressions.
+
+Usage:
+    python benchmarks/bench_suite.py [--scales 10k 100k 1m] [--stages ingest rfm ...]
+                                     [--workdir datasets/synthetic] [--compare benchmarks/results/old.json]
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import time
+from importlib import metadata
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import caching  # noqa: E402
+import database as db  # noqa: E402
+import model_utils as mu  # noqa: E402
+import preprocessing as pp  # noqa: E402
+import tracing  # noqa: E402
+from synthetic_data import SCALES, generate  # noqa: E402
+
+ROOT = Path(__file__).resolve().parent.parent
+RESULTS_DIR = ROOT / "benchmarks" / "results"
+STAGES = ['ingest', 'get_analysis_data', 'fpgrowth', 'fpgrowth_out_of_core', 'fpgrowth_multilevel',
+          'fpgrowth_windowed', 'partitioned', 'rfm', 'affinity', 'ann']
+PACKAGES = ['pandas', 'numpy', 'scikit-learn', 'mlxtend', 'imbalanced-learn', 'pyarrow']
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                                text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    packages = {}
+    for name in PACKAGES:
+        try:
+            packages[name] = metadata.version(name)
+        except metadata.PackageNotFoundError:
+            packages[name] = None
+    return {
+        'git_commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'packages': packages,
+    }
+
+
+def prepare_dataset(workdir, scale, seed, regenerate=False):
+    """CSV files for `scale` in workdir/<scale>, generated unless already there with the same seed."""
+    out_dir = Path(workdir) / scale
+    meta_path = out_dir / "dataset.json"
+    if not regenerate and meta_path.exists():
+        meta = json.loads(meta_path.read_text())
+        if meta.get('seed') == seed and meta.get('requested_lines') == SCALES[scale]:
+            return meta
+    meta = generate(out_dir, SCALES[scale], seed=seed)
+    meta['requested_lines'] = SCALES[scale]
+    meta_path.write_text(json.dumps(meta, indent=2))
+    return meta
+
+
+def use_dataset(out_dir):
+    """Point the database module at the scratch dataset (CSV files, retail.db, query log)."""
+    db.ARCHIVED_PATH = Path(out_dir)
+    db.DB_PATH = Path(out_dir) / "retail.db"
+    db.QUERY_LOG_PATH = Path(out_dir) / "query_log.db"
+
+
+# =============================================================================
+# STAGES (each returns a dict of details stored with its timings)
+# =============================================================================
+
+def stage_ingest(state, args):
+    db.delete_database()
+    summary = db.load_all_data()
+    if summary.get('error'):
+        raise RuntimeError(summary['error'])
+    return {table: info['count'] for table, info in summary.items()}
+
+
+def stage_get_analysis_data(state, args):
+    df, err = db.get_analysis_data(group_by='BASKET_ID', product_level=args.level)
+    if err:
+        raise RuntimeError(err)
+    state['df'] = df
+    state['data_key'] = db.analysis_fingerprint('BASKET_ID', args.level)
+    return {'baskets': len(df)}
+
+
+def stage_fpgrowth(state, args):
+    df = state['df']
+    data = df.sample(n=args.fp_max_baskets, random_state=42) if len(df) > args.fp_max_baskets else df
+    rules, _ = pp.run_association_rules(data, 'product_list', min_support=args.min_support,
+                                        min_confidence=args.min_confidence, min_lift=args.min_lift)
+    return {'baskets': len(data), 'rules': len(rules)}
+
+
+def stage_fpgrowth_out_of_core(state, args):
+    rules, _ = pp.run_association_rules_out_of_core('BASKET_ID', args.level, min_support=args.min_support,
+                                                    min_confidence=args.min_confidence, min_lift=args.min_lift)
+    return {'rules': len(rules)}
+
+
+def stage_fpgrowth_multilevel(state, args):
+    rules, _ = pp.run_association_rules_multilevel('BASKET_ID', min_support=args.min_support,
+                                                   min_confidence=args.min_confidence, min_lift=args.min_lift)
+    counts = rules['levels'].value_counts().to_dict() if rules is not None and not rules.empty else {}
+    return {'rules': sum(counts.values()), 'levels': counts}
+
+
+def stage_fpgrowth_windowed(state, args):
+    rules, drift, windows = pp.run_association_rules_windowed(args.level, window_weeks=4, min_support=args.min_support,
+                                                               min_confidence=args.min_confidence,
+                                                               min_lift=args.min_lift)
+    return {'windows': len(windows), 'rules': len(rules), 'drifted': len(drift),
+            'recounted': int(windows['recounted'].sum()) if len(windows) else 0}
+
+
+def stage_partitioned(state, args):
+    summary, rules, rfm = pp.run_partitioned_analysis('STORE_ID', args.level, min_confidence=args.min_confidence,
+                                                      min_lift=args.min_lift, save=False)
+    analyzed = summary[summary['status'] == 'ok'] if len(summary) else summary
+    return {'partitions': len(summary), 'analyzed': len(analyzed), 'rules': len(rules), 'rfm_rows': len(rfm),
+            'n_jobs': os.cpu_count()}
+
+
+def stage_rfm(state, args):
+    rfm = pp.calculate_rfm(state['df'], 'household_key', 'DAY', 'product_list', data_key=state['data_key'])
+    return {'households': len(rfm)}
+
+
+def stage_affinity(state, args):
+    rows = 0
+    for col in db.get_demographic_options():
+        affinity, err = db.get_product_affinity_by_demographic(col, 'DEPARTMENT')
+        if err:
+            raise RuntimeError(err)
+        distribution, err = db.get_demographic_distribution(col)
+        if err:
+            raise RuntimeError(err)
+        rows += len(affinity) + len(distribution)
+    return {'rows': rows}
+
+
+def stage_ann(state, args):
+    df = state['df']
+    items, _, err = db.get_item_support_counts('BASKET_ID', args.level)
+    if err:
+        raise RuntimeError(err)
+    target = {items['item'].iloc[0]}  # most frequent item: enough positives at every scale
+    features = [col for col in db.DEMOGRAPHIC_COLUMNS if col != 'phone_number']
+    data_target = pp.create_target_variable(df.copy(), 'product_list', target)
+    data_enc = pp.encode_features(data_target, features)
+    X = data_enc[[col for col in data_enc.columns if col not in data_target.columns]]
+    y = data_enc['PX']
+    split_key = caching.fingerprint(state['data_key'], sorted(target), features)
+    X_train, y_train, X_test, y_test = mu.split_and_resample(X, y, method='undersampling', data_key=split_key)
+    model = mu.train_ann_model(X_train, y_train, data_key=caching.fingerprint(split_key, 'undersampling'))
+    return {'target': sorted(target), 'train_rows': len(X_train), 'iterations': int(model.n_iter_)}
+
+
+STAGE_FUNCS = {name: globals()[f"stage_{name}"] for name in STAGES}
+
+
+def run_scale(scale, args):
+    """Generate/load one scale and time the selected stages; returns its result dict."""
+    dataset = prepare_dataset(args.workdir, scale, args.seed, args.regenerate)
+    use_dataset(dataset['path'])
+    selected = set(args.stages)
+    if not db.database_exists():
+        selected.add('ingest')
+    if selected & {'fpgrowth', 'rfm', 'ann'}:
+        selected.add('get_analysis_data')  # they run on its DataFrame
+
+    state, stages = {}, {}
+    with tracing.trace(f"bench {scale}", memory=args.trace_memory) as run:
+        for name in STAGES:
+            if name not in selected:
+                continue
+            print(f"  {name:<22}", end='', flush=True)
+            with tracing.span(name) as span:
+                try:
+                    span.set(**STAGE_FUNCS[name](state, args))
+                except Exception as e:
+                    span.set(error=f"{type(e).__name__}: {e}")
+            record = span.record()
+            stages[name] = {key: value for key, value in record.items()
+                            if key not in ('stage', 'depth', 'start_s')}
+            status = record['attrs'].get('error', '')
+            print(f"{record['wall_s']:9.2f} s  cpu {record['cpu_s']:8.2f} s  "
+                  f"rss {record['rss_mb'] or 0:8.1f} MB  {status}")
+    return {'dataset': dataset, 'stages': stages, 'trace': run.records()}
+
+
+def compare(results, previous_path, threshold):
+    """Print wall-time ratios against an earlier results file; returns the regressions."""
+    previous = json.loads(Path(previous_path).read_text())
+    regressions = []
+    print(f"\nComparison with {previous_path} (commit {previous['environment'].get('git_commit')}):")
+    print(f"  {'scale':<6} {'stage':<22} {'before':>9} {'after':>9} {'ratio':>7}")
+    for scale, result in results['scales'].items():
+        before_stages = previous['scales'].get(scale, {}).get('stages', {})
+        for name, stage in result['stages'].items():
+            before = before_stages.get(name)
+            if not before or not before.get('wall_s'):
+                continue
+            ratio = stage['wall_s'] / before['wall_s']
+            flag = "  REGRESSION" if ratio > threshold else ""
+            print(f"  {scale:<6} {name:<22} {before['wall_s']:8.2f}s {stage['wall_s']:8.2f}s {ratio:6.2f}x{flag}")
+            if flag:
+                regressions.append((scale, name, ratio))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[2])
+    parser.add_argument('--scales', nargs='+', choices=list(SCALES), default=['10k', '100k', '1m'])
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=list(STAGES))
+    parser.add_argument('--workdir', default=str(ROOT / "datasets" / "synthetic"),
+                        help="where the generated CSV files and scratch databases are kept")
+    parser.add_argument('--regenerate', action='store_true', help="regenerate CSV files even if present")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--level', default='COMMODITY_DESC', help="product level of the baskets")
+    parser.add_argument('--min-support', type=float, default=0.01)
+    parser.add_argument('--min-confidence', type=float, default=0.1)
+    parser.add_argument('--min-lift', type=float, default=1.1)
+    parser.add_argument('--fp-max-baskets', type=int, default=200_000,
+                        help="sample size cap for the in-memory FP-Growth stage")
+    parser.add_argument('--trace-memory', action='store_true', help="record tracemalloc peaks (slower)")
+    parser.add_argument('--output', help="results file (default: benchmarks/results/bench_<timestamp>.json)")
+    parser.add_argument('--compare', help="earlier results file to compare wall times against")
+    parser.add_argument('--threshold', type=float, default=1.2, help="ratio reported as a regression")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    caching.set_backend(caching.CacheBackend())
+    results = {'started': time.strftime('%Y-%m-%d %H:%M:%S'), 'environment': environment(),
+               'args': vars(args).copy(), 'scales': {}}
+
+    for scale in args.scales:
+        print(f"== {scale} ({SCALES[scale]:,} lines) ==")
+        results['scales'][scale] = run_scale(scale, args)
+
+    output = Path(args.output) if args.output else RESULTS_DIR / f"bench_{time.strftime('%Y%m%d_%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=1, default=str))
+    print(f"\nResults written to {output}")
+
+    if args.compare and compare(results, args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
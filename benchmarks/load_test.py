@@ -0,0 +1,111 @@
+"""load_test.py
+
+Load-test the local scoring service (`service.py`): keep-alive connections
+send batched requests for a fixed duration, then p50/p99 latency and
+requests per second are reported.
+
+Payloads are built from the same artifacts the service loads (rule items for
+/recommend, RFM household keys for /segments and /predict).
+
+Usage (start `python service.py` first):
+    python benchmarks/load_test.py [--endpoint recommend] [--concurrency 32] [--duration 10] [--batch 16]
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import preprocessing as pp  # noqa: E402
+
+
+def make_payloads(endpoint, batch, n_payloads=200, seed=42):
+    """Pre-encoded request bodies so the client spends its time on I/O."""
+    rng = random.Random(seed)
+    if endpoint == 'recommend':
+        _, index = pp.load_rules()
+        if index is None:
+            sys.exit("No saved rules - run Association Rules in the app first.")
+        items = index.items
+        make = lambda: {'baskets': [rng.sample(items, min(len(items), rng.randint(2, 8))) for _ in range(batch)]}
+    else:
+        rfm = pp.load_rfm()
+        if rfm is None:
+            sys.exit("No saved RFM segments - run RFM Analysis in the app first.")
+        keys = [int(key) for key in rfm.iloc[:, 0]]
+        make = lambda: {'households': rng.sample(keys, min(len(keys), batch))}
+    return [json.dumps(make()).encode() for _ in range(n_payloads)]
+
+
+async def worker(host, port, path, payloads, deadline, latencies, errors):
+    reader, writer = await asyncio.open_connection(host, port)
+    i = 0
+    try:
+        while time.perf_counter() < deadline:
+            body = payloads[i % len(payloads)]
+            i += 1
+            start = time.perf_counter()
+            writer.write(
+                f"POST {path} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+            status = int((await reader.readline()).split()[1])
+            length = 0
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b''):
+                    break
+                name, _, value = line.decode().partition(':')
+                if name.lower() == 'content-length':
+                    length = int(value)
+            await reader.readexactly(length)
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                errors.append(status)
+    finally:
+        writer.close()
+
+
+async def run(args, payloads):
+    latencies, errors = [], []
+    deadline = time.perf_counter() + args.duration
+    start = time.perf_counter()
+    await asyncio.gather(*[
+        worker(args.host, args.port, f"/{args.endpoint}", payloads, deadline, latencies, errors)
+        for _ in range(args.concurrency)
+    ])
+    return time.perf_counter() - start, np.array(latencies), errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[2])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--endpoint', choices=['recommend', 'segments', 'predict'], default='recommend')
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--batch', type=int, default=16, help="baskets/households per request")
+    args = parser.parse_args()
+
+    payloads = make_payloads(args.endpoint, args.batch)
+    elapsed, latencies, errors = asyncio.run(run(args, payloads))
+    if not len(latencies):
+        sys.exit("no requests completed")
+
+    p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+    print(f"endpoint: /{args.endpoint}, concurrency: {args.concurrency}, batch: {args.batch}")
+    print(f"requests: {len(latencies):,} in {elapsed:.1f} s, errors: {len(errors):,}")
+    print(f"latency p50 {p50:8.2f} ms   p99 {p99:8.2f} ms")
+    print(f"throughput {len(latencies) / elapsed:10.0f} req/s  ({len(latencies) * args.batch / elapsed:,.0f} items/s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,259 @@
+"""synthetic_data.py
+
+Synthetic retail dataset in the layout of the CSV files the app loads
+(`hh_demographics.csv`, `product.csv`, `transaction_data.csv`), at a
+configurable scale, for benchmarks without the real data:
+
+- item popularity is Zipfian (product rank r is bought with weight 1 / r^s),
+  spread randomly over a DEPARTMENT > COMMODITY > SUB_COMMODITY hierarchy
+- basket sizes follow a negative binomial (mean ~9 lines, long tail)
+- part of each basket is a "shopping mission" in one department, so rules
+  with lift > 1 exist
+- household activity is log-normal (a few households shop a lot), each
+  household mostly visits its home store
+- prices, quantities, retail/coupon discounts, DAY, WEEK_NO and TRANS_TIME
+  have plausible ranges
+
+Transactions are generated and written in chunks, so 50M lines need about
+as much memory as 1M.
+
+Usage:
+    python benchmarks/synthetic_data.py --scale 1m [--out datasets/synthetic/1m] [--seed 42]
+    python benchmarks/synthetic_data.py --lines 2500000 --households 2500 --products 20000
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Transaction lines per named scale
+SCALES = {
+    '10k': 10_000,
+    '100k': 100_000,
+    '1m': 1_000_000,
+    '10m': 10_000_000,
+    '50m': 50_000_000,
+}
+
+N_DAYS = 711            # two years, as in the original transaction data
+N_DEPARTMENTS = 30
+CHUNK_LINES = 1_000_000
+
+DEMOGRAPHICS = {
+    'AGE_DESC': (['19-24', '25-34', '35-44', '45-54', '55-64', '65+'], [0.06, 0.18, 0.24, 0.29, 0.11, 0.12]),
+    'MARITAL_STATUS_CODE': (['A', 'B', 'U'], [0.42, 0.15, 0.43]),
+    'INCOME_DESC': (['Under 15K', '15-24K', '25-34K', '35-49K', '50-74K', '75-99K', '100-124K',
+                     '125-149K', '150-174K', '175-199K', '200-249K', '250K+'],
+                    [0.08, 0.09, 0.10, 0.22, 0.24, 0.12, 0.04, 0.05, 0.03, 0.01, 0.01, 0.01]),
+    'HOMEOWNER_DESC': (['Homeowner', 'Renter', 'Probable Owner', 'Probable Renter', 'Unknown'],
+                       [0.63, 0.05, 0.02, 0.01, 0.29]),
+    'HH_COMP_DESC': (['2 Adults No Kids', '2 Adults Kids', 'Single Female', 'Single Male',
+                      '1 Adult Kids', 'Unknown'], [0.32, 0.23, 0.18, 0.12, 0.06, 0.09]),
+    'HOUSEHOLD_SIZE_DESC': (['1', '2', '3', '4', '5+'], [0.32, 0.40, 0.14, 0.09, 0.05]),
+    'KID_CATEGORY_DESC': (['None/Unknown', '1', '2', '3+'], [0.70, 0.14, 0.07, 0.09]),
+}
+
+
+def default_households(lines):
+    """Roughly 1,000 transaction lines per household over two years, at least 200."""
+    return int(np.clip(lines // 1000, 200, 2_500_000))
+
+
+def default_products(lines):
+    return int(np.clip(lines // 30, 1_000, 92_000))
+
+
+def make_demographics(n_households, rng):
+    df = pd.DataFrame({
+        col: rng.choice(values, size=n_households, p=np.array(p) / sum(p))
+        for col, (values, p) in DEMOGRAPHICS.items()
+    })
+    df['household_key'] = np.arange(1, n_households + 1)
+    df['phone_number'] = rng.integers(2_000_000_000, 9_999_999_999, size=n_households)
+    return df
+
+
+def make_products(n_products, rng):
+    """Product catalog with a random DEPARTMENT > COMMODITY > SUB_COMMODITY hierarchy."""
+    n_commodities = int(np.clip(n_products // 30, 40, 300))
+    n_subcommodities = int(np.clip(n_products // 6, n_commodities, 2_500))
+    commodity_dept = rng.integers(0, N_DEPARTMENTS, size=n_commodities)
+    sub_commodity = rng.integers(0, n_commodities, size=n_subcommodities)
+    product_sub = rng.integers(0, n_subcommodities, size=n_products)
+    product_comm = sub_commodity[product_sub]
+    catalog = pd.DataFrame({
+        'PRODUCT_ID': np.arange(1, n_products + 1),
+        'MANUFACTURER': rng.integers(1, max(2, n_products // 15), size=n_products),
+        'DEPARTMENT': pd.Categorical.from_codes(commodity_dept[product_comm],
+                                                [f"DEPT{i}" for i in range(N_DEPARTMENTS)]),
+        'BRAND': rng.choice(['National', 'Private'], size=n_products, p=[0.7, 0.3]),
+        'COMMODITY_DESC': pd.Categorical.from_codes(product_comm, [f"COMM{i}" for i in range(n_commodities)]),
+        'SUB_COMMODITY_DESC': pd.Categorical.from_codes(product_sub, [f"SUB{i}" for i in range(n_subcommodities)]),
+        'CURR_SIZE_OF_PRODUCT': rng.choice(['', '12 OZ', '16 OZ', '1 LB', '1 GAL', '6 PK'], size=n_products),
+    })
+    return catalog
+
+
+class TransactionGenerator:
+    """Vectorized chunked generator of transaction lines (see module docstring)."""
+
+    def __init__(self, catalog, n_households, zipf_s=1.0, mean_basket=9.0, mission_share=0.4,
+                 n_stores=None, rng=None):
+        self.rng = rng or np.random.default_rng()
+        rng = self.rng
+        n_products = len(catalog)
+        self.product_ids = catalog['PRODUCT_ID'].to_numpy()
+        self.departments = catalog['DEPARTMENT'].cat.codes.to_numpy()
+
+        # Zipf popularity over a random permutation of the catalog
+        weights = np.empty(n_products)
+        weights[rng.permutation(n_products)] = 1.0 / np.arange(1, n_products + 1) ** zipf_s
+        self.cdf = np.cumsum(weights) / weights.sum()
+        self.dept_products = []
+        self.dept_cdfs = []
+        for dept in range(N_DEPARTMENTS):
+            members = np.flatnonzero(self.departments == dept)
+            self.dept_products.append(members)
+            w = weights[members]
+            self.dept_cdfs.append(np.cumsum(w) / w.sum() if len(members) else np.array([]))
+        dept_weight = np.bincount(self.departments, weights=weights, minlength=N_DEPARTMENTS)
+        self.dept_cdf = np.cumsum(dept_weight) / dept_weight.sum()
+
+        self.price = np.round(rng.lognormal(np.log(2.5), 0.7, size=n_products), 2).clip(0.1, 80)
+        self.n_households = n_households
+        activity = rng.lognormal(0.0, 1.0, size=n_households)
+        self.household_cdf = np.cumsum(activity) / activity.sum()
+        n_stores = n_stores or int(np.clip(n_households // 8, 5, 600))
+        store_weight = 1.0 / np.arange(1, n_stores + 1) ** 0.8
+        self.home_store = np.searchsorted(np.cumsum(store_weight) / store_weight.sum(),
+                                          rng.random(n_households)) + 1
+        self.n_stores = n_stores
+        self.mean_basket = mean_basket
+        self.mission_share = mission_share
+        self.next_basket_id = 26_984_851_472
+
+    def _draw(self, cdf, n):
+        return np.minimum(np.searchsorted(cdf, self.rng.random(n)), len(cdf) - 1)
+
+    def chunk(self, n_lines):
+        """About `n_lines` transaction lines (whole baskets) as a DataFrame."""
+        rng = self.rng
+        # Basket sizes: 1 + negative binomial, mean `mean_basket`
+        r = 1.5
+        n_est = int(n_lines / self.mean_basket * 1.1) + 10
+        sizes = 1 + rng.negative_binomial(r, r / (r + self.mean_basket - 1), size=n_est)
+        sizes = sizes[:np.searchsorted(np.cumsum(sizes), n_lines) + 1]
+        n_baskets = len(sizes)
+        total = int(sizes.sum())
+
+        household = self._draw(self.household_cdf, n_baskets)
+        day = rng.integers(1, N_DAYS + 1, size=n_baskets)
+        hour = np.clip(rng.normal(15, 3.5, size=n_baskets), 6, 23).astype(np.int64)
+        trans_time = hour * 100 + rng.integers(0, 60, size=n_baskets)
+        away = rng.random(n_baskets) < 0.15
+        store = np.where(away, rng.integers(1, self.n_stores + 1, size=n_baskets), self.home_store[household])
+        basket_ids = self.next_basket_id + np.arange(n_baskets)
+        self.next_basket_id += n_baskets
+        mission_dept = self._draw(self.dept_cdf, n_baskets)
+
+        line_basket = np.repeat(np.arange(n_baskets), sizes)
+        products = self._draw(self.cdf, total)
+        mission = rng.random(total) < self.mission_share
+        line_dept = mission_dept[line_basket]
+        for dept in range(N_DEPARTMENTS):
+            lines = np.flatnonzero(mission & (line_dept == dept))
+            if len(lines) and len(self.dept_products[dept]):
+                products[lines] = self.dept_products[dept][self._draw(self.dept_cdfs[dept], len(lines))]
+
+        quantity = rng.geometric(0.75, size=total)
+        sales = np.round(self.price[products] * quantity, 2)
+        retail_disc = np.where(rng.random(total) < 0.35, -np.round(sales * rng.uniform(0.05, 0.3, total), 2), 0.0)
+        coupon = rng.random(total) < 0.012
+        coupon_disc = np.where(coupon, -np.round(rng.uniform(0.25, 2.0, total), 2), 0.0)
+        coupon_match = np.where(coupon & (rng.random(total) < 0.3), -0.4, 0.0)
+        day_line = day[line_basket]
+
+        return pd.DataFrame({
+            'household_key': household[line_basket] + 1,
+            'BASKET_ID': basket_ids[line_basket],
+            'DAY': day_line,
+            'PRODUCT_ID': self.product_ids[products],
+            'QUANTITY': quantity,
+            'SALES_VALUE': sales,
+            'STORE_ID': store[line_basket],
+            'RETAIL_DISC': retail_disc,
+            'TRANS_TIME': trans_time[line_basket],
+            'WEEK_NO': (day_line - 1) // 7 + 1,
+            'COUPON_DISC': coupon_disc,
+            'COUPON_MATCH_DISC': coupon_match,
+        })
+
+
+def generate(out_dir, lines, households=None, products=None, zipf_s=1.0, seed=42, progress_callback=None):
+    """
+    Write the three CSV files for a dataset of ~`lines` transaction lines into `out_dir`.
+    Returns a summary dict (counts, parameters, seconds).
+    """
+    start = time.perf_counter()
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    households = households or default_households(lines)
+    products = products or default_products(lines)
+    rng = np.random.default_rng(seed)
+
+    customers = make_demographics(households, rng)
+    customers.to_csv(out_dir / "hh_demographics.csv", index=False)
+    catalog = make_products(products, rng)
+    catalog.to_csv(out_dir / "product.csv", index=False)
+
+    generator = TransactionGenerator(catalog, households, zipf_s=zipf_s, rng=rng)
+    path = out_dir / "transaction_data.csv"
+    written = baskets = 0
+    with open(path, 'w', newline='') as f:
+        while written < lines:
+            chunk = generator.chunk(min(CHUNK_LINES, lines - written))
+            chunk.to_csv(f, index=False, header=(written == 0), float_format='%.2f')
+            written += len(chunk)
+            baskets += chunk['BASKET_ID'].nunique()
+            if progress_callback:
+                progress_callback(min(written / lines, 1.0), f"{written:,} / {lines:,} lines written")
+
+    return {
+        'lines': written, 'baskets': baskets, 'households': households, 'products': products,
+        'zipf_s': zipf_s, 'seed': seed, 'path': str(out_dir), 'seconds': round(time.perf_counter() - start, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[2])
+    parser.add_argument('--scale', choices=list(SCALES), help="named size (transaction lines)")
+    parser.add_argument('--lines', type=int, help="transaction lines (overrides --scale)")
+    parser.add_argument('--households', type=int, help="default: lines / 1000, at least 200")
+    parser.add_argument('--products', type=int, help="default: lines / 30, between 1,000 and 92,000")
+    parser.add_argument('--zipf', type=float, default=1.0, help="Zipf exponent of item popularity")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--out', help="output directory (default: datasets/synthetic/<scale>)")
+    args = parser.parse_args()
+
+    if args.lines is None and args.scale is None:
+        parser.error("give --scale or --lines")
+    lines = args.lines or SCALES[args.scale]
+    out_dir = Path(args.out) if args.out else ROOT / "datasets" / "synthetic" / (args.scale or str(lines))
+
+    def report(pct, msg):
+        print(f"\r[{pct:4.0%}] {msg}", end='', file=sys.stderr, flush=True)
+
+    summary = generate(out_dir, lines, args.households, args.products, args.zipf, args.seed, report)
+    print(file=sys.stderr)
+    print(f"{summary['lines']:,} lines, {summary['baskets']:,} baskets, {summary['households']:,} households, "
+          f"{summary['products']:,} products -> {summary['path']} ({summary['seconds']:.1f} s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,379 @@
+"""caching.py
+
+Pluggable caching layer for the compute modules (database, preprocessing,
+model_utils), so they do not depend on Streamlit:
+
+    @caching.cache_data(ttl=600, show_spinner="Loading...")
+    def get_analysis_data(...): ...
+
+    @caching.cache_resource
+    def train_ann_model(...): ...
+
+Decorated functions bind to the active backend on first call, so a backend
+installed after the modules were imported still applies.
+
+- CacheBackend  -> default; no caching, calls go straight through (CLI, workers)
+- TieredCache   -> memory LRU + SQLite store under datasets/cache/, invalidated
+                   by the dataset version (the dashboard installs it, see
+                   streamlit_adapter.py)
+- set_backend   -> install a backend
+
+Options such as `ttl` and `show_spinner` are passed to the backend as-is;
+backends ignore the ones they do not support. As with Streamlit, parameters
+whose name starts with an underscore are not part of the cache key.
+
+Large inputs are keyed by a fingerprint instead of being hashed on every call:
+analysis functions take the DataFrame as an `_underscore` argument plus a
+`data_key` string (`fingerprint` of the dataset version, basket config and
+parameters, see `database.analysis_fingerprint`). `frame_fingerprint` hashes
+the content once for callers that have no such key.
+"""
+
+import contextlib
+import functools
+import hashlib
+import inspect
+import marshal
+import pickle
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict
+from pathlib import Path
+
+CACHE_DIR = Path(__file__).parent / "datasets" / "cache"
+
+# Part of every TieredCache key. The source of the cached function is hashed
+# into the key as well; bump this when a cached result changes shape without
+# a change to that function (e.g. a helper or query it relies on changed).
+CACHE_SCHEMA = 1
+
+
+class CacheBackend:
+    """Pass-through backend. Subclasses return a cached version of `func`."""
+
+    def wrap(self, func, kind, **options):
+        """`kind` is 'data' (results are copied per caller) or 'resource' (shared object)."""
+        return func
+
+
+_backend = CacheBackend()
+_lock = threading.Lock()
+
+
+def get_backend():
+    return _backend
+
+
+def set_backend(backend):
+    """Install `backend` process-wide; returns the previous one."""
+    global _backend
+    previous, _backend = _backend, backend
+    return previous
+
+
+class CachedFunction:
+    """Function wrapper that (re)binds to the active backend lazily."""
+
+    def __init__(self, func, kind, options):
+        functools.update_wrapper(self, func)
+        self._func = func
+        self._kind = kind
+        self._options = {key: value for key, value in options.items() if value is not None}
+        self._bound_backend = None
+        self._bound = func
+
+    def _resolve(self):
+        backend = _backend
+        if self._bound_backend is not backend:
+            with _lock:
+                if self._bound_backend is not backend:
+                    self._bound = backend.wrap(self._func, self._kind, **self._options)
+                    self._bound_backend = backend
+        return self._bound
+
+    def __call__(self, *args, **kwargs):
+        return self._resolve()(*args, **kwargs)
+
+    def clear(self):
+        """Drop cached results of this function (no-op for backends without a cache)."""
+        clear = getattr(self._resolve(), 'clear', None)
+        if clear is not None:
+            clear()
+
+
+def _decorator(kind, func, options):
+    if func is not None:
+        return CachedFunction(func, kind, options)
+    return lambda f: CachedFunction(f, kind, options)
+
+
+def cache_data(func=None, *, ttl=None, show_spinner=None):
+    """Cache serializable results (DataFrames, lists, dicts)."""
+    return _decorator('data', func, {'ttl': ttl, 'show_spinner': show_spinner})
+
+
+def cache_resource(func=None, *, ttl=None, show_spinner=None):
+    """Cache a shared, unserializable object (models, connections)."""
+    return _decorator('resource', func, {'ttl': ttl, 'show_spinner': show_spinner})
+
+
+# =============================================================================
+# FINGERPRINTS
+# =============================================================================
+
+def _canonical(value):
+    """Order-independent form of sets/dicts so equal values fingerprint equally."""
+    if isinstance(value, (set, frozenset)):
+        return ('set', tuple(sorted((_canonical(item) for item in value), key=repr)))
+    if isinstance(value, dict):
+        return ('dict', tuple(sorted(((_canonical(k), _canonical(v)) for k, v in value.items()), key=repr)))
+    if isinstance(value, (list, tuple)):
+        return tuple(_canonical(item) for item in value)
+    return value
+
+
+def fingerprint(*parts):
+    """Short stable hash of simple values (str, numbers, None, tuples/lists, sets, dicts)."""
+    return hashlib.blake2b(repr(_canonical(parts)).encode(), digest_size=8).hexdigest()
+
+
+def frame_fingerprint(*frames):
+    """Content hash of DataFrames/Series (values, index, columns, dtypes); O(rows), vectorized."""
+    import pandas as pd
+
+    digest = hashlib.blake2b(digest_size=8)
+    for frame in frames:
+        if isinstance(frame, pd.DataFrame):
+            schema = (tuple(frame.columns), tuple(str(dtype) for dtype in frame.dtypes))
+        else:
+            schema = (frame.name, str(frame.dtype))
+        digest.update(repr((type(frame).__name__, frame.shape, schema)).encode())
+        digest.update(pd.util.hash_pandas_object(frame, index=True).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+# =============================================================================
+# TWO-TIER CACHE (memory LRU + disk)
+# =============================================================================
+
+def _stable(value):
+    """Argument -> value with a content-based repr (for `fingerprint`); TypeError if impossible."""
+    if value is None or isinstance(value, (str, int, float, bool, bytes)):
+        return value
+    if isinstance(value, (list, tuple)):
+        return tuple(_stable(item) for item in value)
+    if isinstance(value, (set, frozenset)):
+        return frozenset(_stable(item) for item in value)
+    if isinstance(value, dict):
+        return {key: _stable(item) for key, item in value.items()}
+    if type(value).__module__.startswith('pandas'):
+        return ('frame', frame_fingerprint(value))
+    try:
+        return ('pickle', hashlib.blake2b(pickle.dumps(value), digest_size=8).hexdigest())
+    except Exception as e:
+        raise TypeError(f"cannot fingerprint argument of type {type(value).__name__}") from e
+
+
+def _code_fingerprint(func):
+    """Hash of the source of `func` (its code object if the source is unavailable)."""
+    try:
+        code = inspect.getsource(func).encode()
+    except (OSError, TypeError):
+        code = marshal.dumps(func.__code__) if hasattr(func, '__code__') else repr(func).encode()
+    return hashlib.blake2b(code, digest_size=8).hexdigest()
+
+
+def _is_error_result(value):
+    """`(data, error)` results that carry an error are not cached."""
+    return isinstance(value, tuple) and len(value) == 2 and isinstance(value[1], str) and bool(value[1])
+
+
+class TieredCache(CacheBackend):
+    """
+    Memory LRU in front of a SQLite store on disk that survives restarts.
+
+    Entries are keyed by function, arguments (minus `_underscore` ones), the
+    dataset version returned by `version()` (e.g.
+    database.get_dataset_version), CACHE_SCHEMA and a hash of the function's
+    source, so results of older code are not served after an upgrade. A
+    reloaded database invalidates every entry, so `ttl` is ignored. Each tier evicts least recently used entries
+    once it exceeds its byte budget. 'data' results are stored pickled (every
+    caller gets its own copy); 'resource' results are shared objects and stay
+    in memory only.
+    """
+
+    def __init__(self, directory=CACHE_DIR, version=lambda: None,
+                 max_memory_bytes=256 * 2**20, max_disk_bytes=1024 * 2**20):
+        self.path = Path(directory) / "results.sqlite"
+        self.version = version
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self._memory = OrderedDict()    # key -> (name, version, value_or_payload, size)
+        self._memory_bytes = 0
+        self._stats = {}                # name -> Counter(memory_hits, disk_hits, misses, ...)
+        self._evictions = Counter()
+        self._current_version = None
+        self._lock = threading.RLock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._disk = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._disk.execute("PRAGMA journal_mode=WAL")
+        self._disk.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY, name TEXT, version TEXT,
+                size INTEGER, created REAL, accessed REAL, payload BLOB
+            )
+        """)
+
+    def spinner(self, message):
+        """Context shown while a miss is computed (overridden by the Streamlit adapter)."""
+        return contextlib.nullcontext()
+
+    def wrap(self, func, kind, show_spinner=None, **_options):
+        name = f"{func.__module__}.{func.__qualname__}"
+        signature = inspect.signature(func)
+        code = (CACHE_SCHEMA, _code_fingerprint(func))
+
+        @functools.wraps(func)
+        def cached(*args, **kwargs):
+            version = self.version()
+            try:
+                bound = signature.bind(*args, **kwargs)
+                bound.apply_defaults()
+                key = fingerprint(name, version, code, [(param, _stable(value))
+                                                        for param, value in bound.arguments.items()
+                                                        if not param.startswith('_')])
+            except TypeError:
+                self._count(name, 'uncacheable')
+                return func(*args, **kwargs)
+
+            found, value = self._get(key, name, version, kind)
+            if found:
+                return value
+            with self.spinner(show_spinner):
+                value = func(*args, **kwargs)
+            if not _is_error_result(value):
+                self._put(key, name, version, kind, value)
+            return value
+
+        cached.clear = lambda: self.clear(name)
+        return cached
+
+    # --- lookups ---
+
+    def _count(self, name, event):
+        with self._lock:
+            self._stats.setdefault(name, Counter())[event] += 1
+
+    def _check_version(self, version):
+        """Drop entries of other dataset versions the first time a new version is seen."""
+        if version == self._current_version:
+            return
+        self._current_version = version
+        stale = [key for key, entry in self._memory.items() if entry[1] != version]
+        for key in stale:
+            self._memory_bytes -= self._memory.pop(key)[3]
+        removed = self._disk.execute("DELETE FROM entries WHERE version IS NOT ?", (version,)).rowcount
+        self._evictions['version'] += len(stale) + max(removed, 0)
+
+    def _get(self, key, name, version, kind):
+        with self._lock:
+            self._check_version(version)
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                self._stats.setdefault(name, Counter())['memory_hits'] += 1
+            elif kind == 'data':
+                row = self._disk.execute("SELECT payload FROM entries WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    self._disk.execute("UPDATE entries SET accessed = ? WHERE key = ?", (time.time(), key))
+                    entry = (name, version, row[0], len(row[0]))
+                    self._memory_put(key, entry)
+                    self._stats.setdefault(name, Counter())['disk_hits'] += 1
+            if entry is None:
+                self._stats.setdefault(name, Counter())['misses'] += 1
+                return False, None
+        value = entry[2]
+        return True, (value if kind == 'resource' else pickle.loads(value))
+
+    def _put(self, key, name, version, kind, value):
+        if kind == 'resource':
+            try:
+                size = len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+            except Exception:
+                size = 0
+            with self._lock:
+                self._memory_put(key, (name, version, value, size))
+            return
+        try:
+            payload = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            self._count(name, 'uncacheable')
+            return
+        now = time.time()
+        with self._lock:
+            self._memory_put(key, (name, version, payload, len(payload)))
+            if len(payload) <= self.max_disk_bytes:
+                self._disk.execute(
+                    "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (key, name, version, len(payload), now, now, payload)
+                )
+                self._evict_disk()
+
+    def _memory_put(self, key, entry):
+        if key in self._memory:
+            self._memory_bytes -= self._memory.pop(key)[3]
+        if entry[3] > self.max_memory_bytes:
+            return
+        self._memory[key] = entry
+        self._memory_bytes += entry[3]
+        while self._memory_bytes > self.max_memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= evicted[3]
+            self._evictions['memory'] += 1
+
+    def _evict_disk(self):
+        total = self._disk.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_disk_bytes:
+            return
+        for key, size in self._disk.execute("SELECT key, size FROM entries ORDER BY accessed").fetchall():
+            self._disk.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self._evictions['disk'] += 1
+            total -= size
+            if total <= self.max_disk_bytes:
+                break
+
+    # --- maintenance & metrics ---
+
+    def clear(self, name=None):
+        """Drop the entries of one function (qualified name) or of all functions."""
+        with self._lock:
+            for key in [key for key, entry in self._memory.items() if name is None or entry[0] == name]:
+                self._memory_bytes -= self._memory.pop(key)[3]
+            if name is None:
+                self._disk.execute("DELETE FROM entries")
+            else:
+                self._disk.execute("DELETE FROM entries WHERE name = ?", (name,))
+
+    def stats(self):
+        """Hit/miss counters per function plus the size of both tiers."""
+        with self._lock:
+            disk_entries, disk_bytes = self._disk.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()
+            totals = Counter()
+            for counter in self._stats.values():
+                totals.update(counter)
+            return {
+                'totals': dict(totals),
+                'functions': {name: dict(counter) for name, counter in self._stats.items()},
+                'memory_entries': len(self._memory),
+                'memory_bytes': self._memory_bytes,
+                'max_memory_bytes': self.max_memory_bytes,
+                'disk_entries': disk_entries,
+                'disk_bytes': disk_bytes,
+                'max_disk_bytes': self.max_disk_bytes,
+                'evictions': dict(self._evictions),
+                'version': self._current_version,
+                'path': str(self.path),
+            }
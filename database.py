@@ -8,11 +8,19 @@ SQLite Database Module for Retail Decision Support System.
 - datasets/transaction_data.csv -> transactions
 """
 
+import json
+import re
 import sqlite3
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeout
 import pandas as pd
 import os
 from pathlib import Path
-import streamlit as st
+import caching
+import tracing
 
 # Database configuration
 DB_PATH = Path(__file__).parent / "datasets" / "retail.db"
@@ -192,6 +200,8 @@ def load_all_data(progress_callback=None):
         if progress_callback:
             progress_callback(0.95, "Creating indexes...")
         create_indexes(conn)
+        write_dataset_version(conn)
+        _query_plans.clear()
         conn.commit()
 
         if progress_callback:
@@ -205,23 +215,216 @@ def load_all_data(progress_callback=None):
     return summary
 
 # =============================================================================
-# QUERY UTILITIES
+# DATASET VERSION (cache fingerprints)
 # =============================================================================
 
-def execute_query(query, params=None):
-    """Execute a SQL query and return results as DataFrame."""
+def write_dataset_version(conn):
+    """Stamp the loaded data with a new version ID (end of `load_all_data`)."""
+    version = uuid.uuid4().hex[:16]
+    conn.execute("CREATE TABLE IF NOT EXISTS dataset_meta (key TEXT PRIMARY KEY, value TEXT)")
+    conn.executemany(
+        "INSERT OR REPLACE INTO dataset_meta (key, value) VALUES (?, ?)",
+        [('version', version), ('loaded_at', time.strftime('%Y-%m-%d %H:%M:%S'))]
+    )
+    return version
+
+def get_dataset_version():
+    """
+    ID of the data currently in the database; changes every time it is (re)loaded.
+    Databases built before versioning fall back to the file's mtime and size.
+    Returns None if the database does not exist.
+    """
+    if not database_exists():
+        return None
     conn = get_connection()
     try:
-        if params:
-            df = pd.read_sql_query(query, conn, params=params)
-        else:
-            df = pd.read_sql_query(query, conn)
+        row = conn.execute("SELECT value FROM dataset_meta WHERE key = 'version'").fetchone()
+    except sqlite3.OperationalError:
+        row = None
+    finally:
+        conn.close()
+    if row:
+        return row[0]
+    stat = DB_PATH.stat()
+    return f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+
+def analysis_fingerprint(group_by='BASKET_ID', product_level='COMMODITY_DESC'):
+    """
+    Fingerprint of `get_analysis_data(group_by, product_level)`: dataset version +
+    basket config. Analysis caches key on it (plus their parameters) instead of
+    hashing the DataFrame.
+    """
+    return caching.fingerprint(get_dataset_version(), group_by, product_level)
+
+# =============================================================================
+# QUERY PROFILING
+# =============================================================================
+
+# Queries at least this slow are written to the slow-query log.
+SLOW_QUERY_MS = 250
+# Separate file so the log survives database rebuilds and stays out of the table browser.
+QUERY_LOG_PATH = Path(__file__).parent / "datasets" / "query_log.db"
+
+QUERY_LOG_SCHEMA = """
+CREATE TABLE IF NOT EXISTS slow_queries (
+    logged_at TEXT,
+    source TEXT,
+    duration_ms REAL,
+    rows INTEGER,
+    full_scan INTEGER,
+    query TEXT,
+    params TEXT,
+    plan TEXT
+);
+"""
+
+_query_stats = {}   # (source, query) -> timings aggregated since process start
+_query_plans = {}   # query text -> EXPLAIN QUERY PLAN detail lines
+_profile_lock = threading.Lock()
+
+# Functions that only pass a query through; the profiler reports their caller.
+_QUERY_HELPERS = {'record_query', 'execute_query', 'execute_typed_query', '_iter_query_chunks'}
+
+def explain_query(query, params=None):
+    """`EXPLAIN QUERY PLAN` detail lines of a query (memoized per query text)."""
+    plan = _query_plans.get(query)
+    if plan is None:
+        conn = get_connection()
+        try:
+            rows = conn.execute("EXPLAIN QUERY PLAN " + query, params or ()).fetchall()
+            plan = [row[-1] for row in rows]
+        except (sqlite3.Error, sqlite3.Warning) as e:
+            plan = [f"(no plan: {e})"]
+        finally:
+            conn.close()
+        _query_plans[query] = plan
+    return plan
+
+def scans_transactions(query, plan):
+    """True if the plan reads `transactions` row by row without using an index."""
+    names = {'transactions'} | set(re.findall(r'\btransactions\s+(?:AS\s+)?(\w+)', query, re.IGNORECASE))
+    for line in plan:
+        parts = line.split()
+        if len(parts) >= 2 and parts[0] == 'SCAN' and parts[1] in names and 'INDEX' not in line:
+            return True
+    return False
+
+def _query_source():
+    """Name of the function that issued the query (skipping pass-through helpers)."""
+    frame = sys._getframe(2)
+    while frame is not None and frame.f_code.co_name in _QUERY_HELPERS:
+        frame = frame.f_back
+    if frame is None or frame.f_code.co_name == '<module>':
+        return 'ad-hoc'
+    return frame.f_code.co_name
+
+def record_query(query, params, seconds, rows, error=None, source=None):
+    """
+    Record one executed query: timing and row count go into the in-process stats,
+    queries slower than SLOW_QUERY_MS also into the persistent slow-query log.
+    """
+    duration_ms = seconds * 1000
+    plan = explain_query(query, params)
+    full_scan = scans_transactions(query, plan)
+    source = source or _query_source()
+    with _profile_lock:
+        stats = _query_stats.setdefault((source, query), {
+            'calls': 0, 'errors': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'rows': 0,
+            'full_scan': full_scan, 'plan': plan,
+        })
+        stats['calls'] += 1
+        stats['errors'] += error is not None
+        stats['total_ms'] += duration_ms
+        stats['max_ms'] = max(stats['max_ms'], duration_ms)
+        stats['rows'] += rows
+    if duration_ms >= SLOW_QUERY_MS:
+        _log_slow_query(source, query, params, duration_ms, rows, full_scan, plan)
+
+def _log_slow_query(source, query, params, duration_ms, rows, full_scan, plan):
+    try:
+        QUERY_LOG_PATH.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(QUERY_LOG_PATH))
+        try:
+            conn.executescript(QUERY_LOG_SCHEMA)
+            conn.execute(
+                "INSERT INTO slow_queries VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (time.strftime('%Y-%m-%d %H:%M:%S'), source, round(duration_ms, 1), rows, int(full_scan),
+                 query.strip(), json.dumps(params, default=str) if params else None, "\n".join(plan))
+            )
+            conn.commit()
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        pass  # profiling must never break the query itself
+
+def get_query_stats():
+    """Per source and query: calls, timings, rows and plan since the process started (slowest total first)."""
+    with _profile_lock:
+        records = [
+            {'source': source, 'calls': s['calls'], 'errors': s['errors'],
+             'total_ms': round(s['total_ms'], 1), 'avg_ms': round(s['total_ms'] / s['calls'], 1),
+             'max_ms': round(s['max_ms'], 1), 'avg_rows': round(s['rows'] / s['calls']),
+             'full_scan': s['full_scan'], 'query': query.strip(), 'plan': "\n".join(s['plan'])}
+            for (source, query), s in _query_stats.items()
+        ]
+    columns = ['source', 'calls', 'errors', 'total_ms', 'avg_ms', 'max_ms', 'avg_rows', 'full_scan', 'query', 'plan']
+    return pd.DataFrame(records, columns=columns).sort_values('total_ms', ascending=False, ignore_index=True)
+
+def get_slow_queries(limit=200):
+    """Most recent entries of the persistent slow-query log."""
+    if not QUERY_LOG_PATH.exists():
+        return pd.DataFrame(), None
+    conn = sqlite3.connect(str(QUERY_LOG_PATH))
+    try:
+        df = pd.read_sql_query(
+            "SELECT * FROM slow_queries ORDER BY logged_at DESC, rowid DESC LIMIT ?", conn, params=(limit,)
+        )
+        df['full_scan'] = df['full_scan'].astype(bool)
         return df, None
     except Exception as e:
         return None, str(e)
     finally:
         conn.close()
 
+def clear_query_log():
+    """Reset the in-process query stats and empty the slow-query log."""
+    with _profile_lock:
+        _query_stats.clear()
+        _query_plans.clear()
+    if QUERY_LOG_PATH.exists():
+        conn = sqlite3.connect(str(QUERY_LOG_PATH))
+        try:
+            conn.execute("DELETE FROM slow_queries")
+            conn.commit()
+        except sqlite3.Error:
+            pass
+        finally:
+            conn.close()
+
+# =============================================================================
+# QUERY UTILITIES
+# =============================================================================
+
+def execute_query(query, params=None):
+    """Execute a SQL query and return results as DataFrame (profiled, see `record_query`)."""
+    source = _query_source()
+    conn = get_connection()
+    with tracing.span(f"sql:{source}") as span:
+        start = time.perf_counter()
+        try:
+            if params:
+                df = pd.read_sql_query(query, conn, params=params)
+            else:
+                df = pd.read_sql_query(query, conn)
+            record_query(query, params, time.perf_counter() - start, len(df), source=source)
+            span.set(rows=len(df))
+            return df, None
+        except Exception as e:
+            record_query(query, params, time.perf_counter() - start, 0, error=str(e), source=source)
+            return None, str(e)
+        finally:
+            conn.close()
+
 def get_table_info():
     """Get list of all tables with row counts."""
     conn = get_connection()
@@ -331,7 +534,7 @@ def get_department_sales():
     """
     return execute_query(query)
 
-@st.cache_data(ttl=300)  # Cache for 5 minutes
+@caching.cache_data(ttl=300)  # Cache for 5 minutes
 def get_transaction_count():
     """Get total transaction count from database."""
     query = "SELECT COUNT(DISTINCT BASKET_ID) as count FROM transactions"
@@ -340,7 +543,7 @@ def get_transaction_count():
         return 0
     return df['count'].iloc[0] if not df.empty else 0
 
-@st.cache_data(ttl=300)  # Cache for 5 minutes
+@caching.cache_data(ttl=300)  # Cache for 5 minutes
 def get_customer_count():
     """Get total customer count from database."""
     query = "SELECT COUNT(*) as count FROM customers"
@@ -349,7 +552,7 @@ def get_customer_count():
         return 0
     return df['count'].iloc[0] if not df.empty else 0
 
-@st.cache_data(ttl=300)  # Cache for 5 minutes
+@caching.cache_data(ttl=300)  # Cache for 5 minutes
 def get_product_count():
     """Get total unique product count from database."""
     query = "SELECT COUNT(DISTINCT PRODUCT_ID) as count FROM products"
@@ -376,7 +579,56 @@ def get_basket_options():
         }
     }
 
-@st.cache_data(ttl=600, show_spinner="📊 Memuat data analisis...")  # Cache for 10 minutes
+# Product hierarchy, top level first (used by multi-level mining)
+PRODUCT_HIERARCHY = ['DEPARTMENT', 'COMMODITY_DESC', 'SUB_COMMODITY_DESC']
+
+# Demographic columns returned as pandas Categoricals by the typed loaders.
+# Categories are taken from `customers` so every analysis frame shares the same
+# category set (and therefore the same one-hot columns) regardless of basket config.
+DEMOGRAPHIC_COLUMNS = [
+    'AGE_DESC',
+    'MARITAL_STATUS_CODE',
+    'INCOME_DESC',
+    'HOMEOWNER_DESC',
+    'HH_COMP_DESC',
+    'HOUSEHOLD_SIZE_DESC',
+    'KID_CATEGORY_DESC',
+    'phone_number',
+]
+
+@caching.cache_data(ttl=600)
+def get_demographic_categories():
+    """Get the sorted category set of every demographic column from customers."""
+    conn = get_connection()
+    try:
+        categories = {}
+        for col in DEMOGRAPHIC_COLUMNS:
+            cursor = conn.execute(
+                f"SELECT DISTINCT {col} FROM customers WHERE {col} IS NOT NULL ORDER BY {col}"
+            )
+            categories[col] = [row[0] for row in cursor.fetchall()]
+        return categories
+    except sqlite3.Error:
+        return {}
+    finally:
+        conn.close()
+
+def apply_demographic_dtypes(df, categories=None):
+    """Convert the demographic columns of a query result to pandas Categoricals."""
+    if categories is None:
+        categories = get_demographic_categories()
+    for col, values in categories.items():
+        if col in df.columns:
+            df[col] = pd.Categorical(df[col], categories=values)
+    return df
+
+def execute_typed_query(query, params=None):
+    """Execute a SQL query and return results with demographics as Categoricals."""
+    df, err = execute_query(query, params)
+    if err:
+        return df, err
+    return apply_demographic_dtypes(df), None
+
 def get_analysis_data(group_by='BASKET_ID', product_level='COMMODITY_DESC'):
     """
     Get consolidated data for Association Rules, RFM, and ANN analysis.
@@ -388,8 +640,18 @@ def get_analysis_data(group_by='BASKET_ID', product_level='COMMODITY_DESC'):
     
     Returns:
     --------
-    DataFrame with basket data and customer demographics
+    DataFrame with basket data and customer demographics (demographic columns
+    are Categoricals with the category set of the `customers` table) plus the
+    numeric totals total_quantity, total_sales, total_retail_disc,
+    total_coupon_disc and total_coupon_match_disc (discounts are <= 0, as in
+    `transactions`)
     """
+    with tracing.span("load_analysis_data", group_by=group_by, product_level=product_level):
+        return _load_analysis_data(group_by, product_level, get_dataset_version())
+
+@caching.cache_data(ttl=600, show_spinner="📊 Memuat data analisis...")  # Cache for 10 minutes
+def _load_analysis_data(group_by, product_level, dataset_version):
+    """Cached per dataset version, so a reloaded database is never served from a stale cache."""
     query = f"""
     SELECT 
         t.household_key,
@@ -405,7 +667,10 @@ def get_analysis_data(group_by='BASKET_ID', product_level='COMMODITY_DESC'):
         c.KID_CATEGORY_DESC,
         c.phone_number,
         SUM(t.QUANTITY) as total_quantity,
-        ROUND(SUM(t.SALES_VALUE), 2) as total_sales
+        ROUND(SUM(t.SALES_VALUE), 2) as total_sales,
+        ROUND(SUM(t.RETAIL_DISC), 2) as total_retail_disc,
+        ROUND(SUM(t.COUPON_DISC), 2) as total_coupon_disc,
+        ROUND(SUM(t.COUPON_MATCH_DISC), 2) as total_coupon_match_disc
     FROM transactions t
     JOIN products p ON t.PRODUCT_ID = p.PRODUCT_ID
     JOIN customers c ON t.household_key = c.household_key
@@ -413,7 +678,121 @@ def get_analysis_data(group_by='BASKET_ID', product_level='COMMODITY_DESC'):
     GROUP BY t.{group_by}
     ORDER BY t.household_key, t.DAY
     """
-    return execute_query(query)
+    return execute_typed_query(query)
+
+def get_item_support_counts(group_by='BASKET_ID', product_level='COMMODITY_DESC'):
+    """
+    First pass of out-of-core mining: basket support count of every item,
+    computed inside SQLite (no baskets are materialized in Python).
+
+    Returns
+    -------
+    (DataFrame[item, baskets], total_baskets, error)
+    """
+    item_expr = f"UPPER(TRIM(p.{product_level}))"
+    query = f"""
+    SELECT 
+        {item_expr} as item,
+        COUNT(DISTINCT t.{group_by}) as baskets
+    FROM transactions t
+    JOIN products p ON t.PRODUCT_ID = p.PRODUCT_ID
+    WHERE p.{product_level} IS NOT NULL AND TRIM(p.{product_level}) != ''
+    GROUP BY {item_expr}
+    ORDER BY baskets DESC
+    """
+    total_query = f"""
+    SELECT COUNT(DISTINCT t.{group_by}) as count
+    FROM transactions t
+    JOIN products p ON t.PRODUCT_ID = p.PRODUCT_ID
+    WHERE p.{product_level} IS NOT NULL AND TRIM(p.{product_level}) != ''
+    """
+    df, err = execute_query(query)
+    if err:
+        return None, 0, err
+    total_df, err = execute_query(total_query)
+    if err:
+        return None, 0, err
+    return df, int(total_df['count'].iloc[0]), None
+
+def iter_basket_items(group_by='BASKET_ID', product_level='COMMODITY_DESC', chunk_size=250_000):
+    """
+    Stream (basket_key, item) rows ordered by basket key in DataFrame chunks.
+    Rows of one basket are contiguous but may span two chunks.
+    """
+    query = f"""
+    SELECT 
+        t.{group_by} as basket_key,
+        UPPER(TRIM(p.{product_level})) as item
+    FROM transactions t
+    JOIN products p ON t.PRODUCT_ID = p.PRODUCT_ID
+    WHERE p.{product_level} IS NOT NULL AND TRIM(p.{product_level}) != ''
+    ORDER BY t.{group_by}
+    """
+    yield from _iter_query_chunks(query, chunk_size)
+
+def get_product_hierarchy(levels=PRODUCT_HIERARCHY):
+    """Hierarchy path (one column per level, normalized like basket items) of every product."""
+    columns = ", ".join(f"UPPER(TRIM({level})) as {level}" for level in levels)
+    conditions = " AND ".join(f"{level} IS NOT NULL AND TRIM({level}) != ''" for level in levels)
+    return execute_query(f"SELECT PRODUCT_ID, {columns} FROM products WHERE {conditions}")
+
+def iter_basket_products(group_by='BASKET_ID', chunk_size=250_000):
+    """Stream (basket_key, PRODUCT_ID) rows of all transactions in table order (no sort)."""
+    query = f"SELECT {group_by} as basket_key, PRODUCT_ID FROM transactions"
+    yield from _iter_query_chunks(query, chunk_size)
+
+def iter_household_events(chunk_size=250_000):
+    """
+    Stream (household_key, BASKET_ID, DAY, TRANS_TIME, PRODUCT_ID) rows of all
+    transactions in table order (no sort; callers order them in memory).
+    """
+    query = "SELECT household_key, BASKET_ID, DAY, TRANS_TIME, PRODUCT_ID FROM transactions"
+    yield from _iter_query_chunks(query, chunk_size)
+
+def iter_weekly_basket_products(chunk_size=250_000):
+    """Stream (basket_key, WEEK_NO, PRODUCT_ID) rows of all transactions in table order (no sort)."""
+    query = "SELECT BASKET_ID as basket_key, WEEK_NO, PRODUCT_ID FROM transactions"
+    yield from _iter_query_chunks(query, chunk_size)
+
+# Columns analyses can be partitioned by: the store of a basket or a household demographic.
+PARTITION_COLUMNS = ['STORE_ID'] + [col for col in DEMOGRAPHIC_COLUMNS if col != 'phone_number']
+
+def iter_partitioned_basket_products(partition_by='STORE_ID', chunk_size=250_000):
+    """
+    Stream (partition_key, basket_key, household_key, DAY, PRODUCT_ID, SALES_VALUE) rows of all
+    transactions in table order (no sort). Demographic partitions are joined from
+    `customers`; rows without a partition value are skipped.
+    """
+    if partition_by not in PARTITION_COLUMNS:
+        raise ValueError(f"Unknown partition column: {partition_by}")
+    if partition_by == 'STORE_ID':
+        source, column = "transactions t", "t.STORE_ID"
+    else:
+        source, column = "transactions t JOIN customers c ON c.household_key = t.household_key", f"c.{partition_by}"
+    query = f"""
+    SELECT {column} as partition_key, t.BASKET_ID as basket_key, t.household_key, t.DAY, t.PRODUCT_ID, t.SALES_VALUE
+    FROM {source}
+    WHERE {column} IS NOT NULL
+    """
+    yield from _iter_query_chunks(query, chunk_size)
+
+def _iter_query_chunks(query, chunk_size):
+    """Yield DataFrame chunks of `query`; the query profile records fetch time only."""
+    conn = get_connection()
+    seconds, rows = 0.0, 0  # time spent fetching only, not in the consumer
+    try:
+        chunks = pd.read_sql_query(query, conn, chunksize=chunk_size)
+        while True:
+            start = time.perf_counter()
+            chunk = next(chunks, None)
+            seconds += time.perf_counter() - start
+            if chunk is None:
+                break
+            rows += len(chunk)
+            yield chunk
+    finally:
+        conn.close()
+        record_query(query, None, seconds, rows)
 
 def get_product_level_sample(level='COMMODITY_DESC', limit=10):
     """Get sample values for a product level."""
@@ -436,7 +815,7 @@ def get_demographic_options():
         'KID_CATEGORY_DESC': 'Kids Category'
     }
 
-@st.cache_data(ttl=600, show_spinner="📊 Menghitung product affinity...")
+@caching.cache_data(ttl=600, show_spinner="📊 Menghitung product affinity...")
 def get_product_affinity_by_demographic(demo_column, product_level='DEPARTMENT', top_n=10):
     """
     Get product affinity scores for each demographic segment.
@@ -518,16 +897,9 @@ def get_top_products_by_segment(demo_column, segment_value, product_level='DEPAR
     ORDER BY total_sales DESC
     LIMIT {top_n}
     """
-    conn = get_connection()
-    try:
-        df = pd.read_sql_query(query, conn, params=(segment_value,))
-        return df, None
-    except Exception as e:
-        return None, str(e)
-    finally:
-        conn.close()
+    return execute_query(query, (segment_value,))
 
-@st.cache_data(ttl=600)
+@caching.cache_data(ttl=600)
 def get_demographic_distribution(demo_column):
     """Get distribution of a demographic dimension."""
     query = f"""
@@ -550,7 +922,7 @@ def get_demographic_distribution(demo_column):
     """
     return execute_query(query)
 
-@st.cache_data(ttl=600)
+@caching.cache_data(ttl=600)
 def get_segment_comparison(demo_column, product_level='DEPARTMENT'):
     """Get pivot-style comparison of product preferences across segments."""
     query = f"""
@@ -584,13 +956,286 @@ def get_segment_comparison(demo_column, product_level='DEPARTMENT'):
     return execute_query(query)
 
 
+# =============================================================================
+# PARTITIONED ANALYSIS RESULTS (PER STORE / SEGMENT)
+# =============================================================================
+
+# Separate file (like the query log) so stored runs stay out of the table browser;
+# each run records the dataset version it was computed from.
+PARTITION_RESULTS_PATH = Path(__file__).parent / "datasets" / "partition_results.db"
+
+PARTITION_RESULTS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS partition_runs (
+    run_id TEXT PRIMARY KEY,
+    created_at TEXT,
+    partition_by TEXT,
+    product_level TEXT,
+    dataset_version TEXT,
+    params TEXT,
+    partitions INTEGER,
+    seconds REAL,
+    partial TEXT
+);
+
+-- Shared item dictionary of a run: rule item IDs of every partition index into it
+CREATE TABLE IF NOT EXISTS partition_items (
+    run_id TEXT,
+    item_id INTEGER,
+    item TEXT
+);
+
+CREATE TABLE IF NOT EXISTS partition_summary (
+    run_id TEXT,
+    partition_key TEXT,
+    baskets INTEGER,
+    households INTEGER,
+    items INTEGER,
+    itemsets INTEGER,
+    rules INTEGER,
+    seconds REAL,
+    status TEXT
+);
+
+CREATE TABLE IF NOT EXISTS partition_rules (
+    run_id TEXT,
+    partition_key TEXT,
+    antecedents TEXT,
+    consequents TEXT,
+    antecedent_ids TEXT,
+    consequent_ids TEXT,
+    support REAL,
+    confidence REAL,
+    lift REAL,
+    leverage REAL,
+    conviction REAL
+);
+
+CREATE TABLE IF NOT EXISTS partition_rfm (
+    run_id TEXT,
+    partition_key TEXT,
+    household_key INTEGER,
+    Recency REAL,
+    Frequency INTEGER,
+    Monetary REAL,
+    R_Score INTEGER,
+    F_Score INTEGER,
+    M_Score INTEGER,
+    Segment TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_partition_items_run ON partition_items(run_id);
+CREATE INDEX IF NOT EXISTS idx_partition_summary_run ON partition_summary(run_id);
+CREATE INDEX IF NOT EXISTS idx_partition_rules_run ON partition_rules(run_id, partition_key);
+CREATE INDEX IF NOT EXISTS idx_partition_rfm_run ON partition_rfm(run_id, partition_key);
+"""
+
+PARTITION_RESULT_TABLES = ['partition_items', 'partition_summary', 'partition_rules', 'partition_rfm']
+
+def _partition_results_connection():
+    PARTITION_RESULTS_PATH.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(PARTITION_RESULTS_PATH), check_same_thread=False)
+    conn.executescript(PARTITION_RESULTS_SCHEMA)
+    return conn
+
+def _query_partition_results(query, params=None):
+    """Run a query against the partition results file; returns (df, error) like `execute_query`."""
+    if not PARTITION_RESULTS_PATH.exists():
+        return pd.DataFrame(), None
+    conn = _partition_results_connection()
+    try:
+        return pd.read_sql_query(query, conn, params=params), None
+    except Exception as e:
+        return None, str(e)
+    finally:
+        conn.close()
+
+def save_partition_run(run, items, summary, rules, rfm):
+    """
+    Store one partitioned run in a single transaction.
+
+    `run` holds partition_by, product_level, params (dict), seconds and partial;
+    `items` is the shared item dictionary (position = item ID); `summary`,
+    `rules` and `rfm` are frames with a partition_key column whose other
+    columns match the partition_* tables. Returns the new run_id.
+    """
+    run_id = uuid.uuid4().hex[:12]
+    conn = _partition_results_connection()
+    try:
+        with conn:
+            conn.execute(
+                "INSERT INTO partition_runs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (run_id, time.strftime('%Y-%m-%d %H:%M:%S'), run['partition_by'], run['product_level'],
+                 get_dataset_version(), json.dumps(run.get('params', {}), default=str), len(summary),
+                 run.get('seconds'), json.dumps(run['partial'], default=str) if run.get('partial') else None)
+            )
+            frames = {
+                'partition_items': pd.DataFrame({'item_id': range(len(items)), 'item': list(items)}),
+                'partition_summary': summary, 'partition_rules': rules, 'partition_rfm': rfm,
+            }
+            for table, frame in frames.items():
+                frame = frame.copy()
+                if 'partition_key' in frame.columns:
+                    frame['partition_key'] = frame['partition_key'].astype(str)
+                frame.insert(0, 'run_id', run_id)
+                frame.to_sql(table, conn, if_exists='append', index=False, chunksize=50_000)
+    finally:
+        conn.close()
+    return run_id
+
+def get_partition_runs():
+    """Stored partitioned runs, newest first."""
+    return _query_partition_results("SELECT * FROM partition_runs ORDER BY created_at DESC, rowid DESC")
+
+def get_partition_summary(run_id):
+    """Per-partition sizes, rule counts and timings of one run (largest partition first)."""
+    return _query_partition_results(
+        "SELECT * FROM partition_summary WHERE run_id = ? ORDER BY baskets DESC", (run_id,)
+    )
+
+def get_partition_rules(run_id, partition_key=None, limit=None):
+    """Rules of one run (optionally one partition), strongest lift first."""
+    where, params = "run_id = ?", [run_id]
+    if partition_key is not None:
+        where += " AND partition_key = ?"
+        params.append(str(partition_key))
+    query = f"SELECT * FROM partition_rules WHERE {where} ORDER BY lift DESC"
+    if limit:
+        query += " LIMIT ?"
+        params.append(int(limit))
+    return _query_partition_results(query, tuple(params))
+
+def get_partition_rule_comparison(run_id, min_partitions=2, limit=500):
+    """
+    Rules across the partitions of one run: in how many partitions each rule
+    holds (and which share of partitions that mined rules), with the spread of
+    its lift and confidence between partitions.
+    """
+    query = """
+    WITH mined AS (
+        SELECT COUNT(*) as n FROM partition_summary WHERE run_id = ? AND status IN ('ok', 'partial')
+    )
+    SELECT
+        antecedents,
+        consequents,
+        COUNT(*) as partitions,
+        ROUND(COUNT(*) * 1.0 / MAX((SELECT n FROM mined), 1), 4) as partition_share,
+        AVG(support) as avg_support,
+        AVG(confidence) as avg_confidence,
+        AVG(lift) as avg_lift,
+        MIN(lift) as min_lift,
+        MAX(lift) as max_lift
+    FROM partition_rules
+    WHERE run_id = ?
+    GROUP BY antecedent_ids, consequent_ids
+    HAVING COUNT(*) >= ?
+    ORDER BY partitions DESC, avg_lift DESC
+    LIMIT ?
+    """
+    return _query_partition_results(query, (run_id, run_id, int(min_partitions), int(limit)))
+
+def get_partition_segment_shares(run_id):
+    """RFM segment sizes per partition of one run (households and share of the partition)."""
+    query = """
+    SELECT
+        partition_key,
+        Segment,
+        COUNT(*) as households,
+        ROUND(COUNT(*) * 100.0 / SUM(COUNT(*)) OVER (PARTITION BY partition_key), 2) as pct_of_partition,
+        AVG(Monetary) as avg_monetary
+    FROM partition_rfm
+    WHERE run_id = ?
+    GROUP BY partition_key, Segment
+    ORDER BY partition_key, households DESC
+    """
+    return _query_partition_results(query, (run_id,))
+
+def delete_partition_run(run_id):
+    """Remove one stored run and all of its per-partition rows."""
+    if not PARTITION_RESULTS_PATH.exists():
+        return False
+    conn = _partition_results_connection()
+    try:
+        with conn:
+            for table in ['partition_runs'] + PARTITION_RESULT_TABLES:
+                conn.execute(f"DELETE FROM {table} WHERE run_id = ?", (run_id,))
+    finally:
+        conn.close()
+    return True
+
+
+# =============================================================================
+# CACHE WARM-UP
+# =============================================================================
+
+def warmup_tasks(group_by='BASKET_ID', product_level='COMMODITY_DESC', affinity_level='DEPARTMENT'):
+    """(name, func, args) of the queries the dashboard runs first, most important first."""
+    demo_cols = list(get_demographic_options())
+    return (
+        [
+            ('analysis_data', get_analysis_data, (group_by, product_level)),
+            ('transaction_count', get_transaction_count, ()),
+            ('customer_count', get_customer_count, ()),
+            ('product_count', get_product_count, ()),
+        ]
+        + [(f'distribution:{col}', get_demographic_distribution, (col,)) for col in demo_cols]
+        + [(f'affinity:{col}', get_product_affinity_by_demographic, (col, affinity_level)) for col in demo_cols]
+    )
+
+def _run_warmup_task(func, args):
+    start = time.perf_counter()
+    try:
+        result = func(*args)
+        failed = isinstance(result, tuple) and len(result) == 2 and isinstance(result[1], str)
+        status, error = ('error', result[1]) if failed else ('warmed', None)
+    except Exception as e:
+        status, error = 'error', str(e)
+    return status, time.perf_counter() - start, error
+
+def warm_cache(time_budget=120, max_workers=None, tasks=None, progress_callback=None):
+    """
+    Run the dashboard's first queries in parallel so their results land in the
+    active cache backend (see caching.TieredCache). Call after `load_all_data`.
+
+    Queries run on `max_workers` threads (default: up to 4, one per CPU);
+    sqlite3 releases the GIL while a query executes.
+    Tasks still running when `time_budget` (seconds) runs out are reported as
+    'timeout' (they finish in the background and are still cached); tasks that
+    had not started are 'skipped'.
+
+    Returns {'seconds': float, 'tasks': [{'task', 'status', 'seconds', 'error'}]}.
+    """
+    tasks = warmup_tasks() if tasks is None else tasks
+    max_workers = max_workers or min(4, os.cpu_count() or 1)
+    start = time.perf_counter()
+    report = {name: {'task': name, 'status': 'skipped', 'seconds': None, 'error': None} for name, _, _ in tasks}
+
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="cache-warmup")
+    try:
+        futures = {executor.submit(_run_warmup_task, func, args): name for name, func, args in tasks}
+        try:
+            for done, future in enumerate(as_completed(futures, timeout=time_budget), start=1):
+                name = futures[future]
+                status, seconds, error = future.result()
+                report[name].update(status=status, seconds=round(seconds, 3), error=error)
+                if progress_callback:
+                    progress_callback(done / len(tasks), f"Warmed {name} ({seconds:.1f}s)")
+        except FuturesTimeout:
+            for future, name in futures.items():
+                if future.running():
+                    report[name]['status'] = 'timeout'
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    return {'seconds': round(time.perf_counter() - start, 3), 'tasks': list(report.values())}
+
 def clear_cached_queries():
     """Clear cache for database query helpers (call after DB refresh/reload)."""
     cached_funcs = [
         get_transaction_count,
         get_customer_count,
         get_product_count,
-        get_analysis_data,
+        get_demographic_categories,
+        _load_analysis_data,
         get_product_affinity_by_demographic,
         get_demographic_distribution,
         get_segment_comparison,
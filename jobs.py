@@ -0,0 +1,250 @@
+"""jobs.py
+
+Background job runner for long analyses (FP-Growth, RFM, ANN training), so
+they do not block the Streamlit script thread:
+
+    runner = jobs.get_runner()
+    job = runner.submit("FP-Growth", pp.run_association_rules, df, "product_list",
+                        key=("rules", "BASKET_ID", "COMMODITY_DESC", 0.01))
+    job.status     # queued / running / done / failed / cancelled
+    job.progress   # (pct, text) of the last reporting.progress(...) update
+    job.result     # return value once done
+    runner.cancel(job.id, subscriber=session_id)
+
+Jobs run on a thread pool shared by every dashboard session in the process,
+and the registry outlives reruns, so a page can poll its job by id.
+
+- Inside a job, `reporting` calls are captured by a JobReporter: progress goes
+  to `job.progress`, messages to `job.messages` (the page replays them).
+- Submissions with the same `key` share one job while it is queued, running
+  or done, so several sessions asking for the same analysis run it once.
+  Each submitting `subscriber` (e.g. a session id) is tracked; cancelling
+  only detaches that subscriber, and the job stops once none is left.
+- Cancellation is cooperative: queued jobs never start, running jobs stop at
+  their next progress update or `checkpoint()` call. Loops without progress
+  updates (FP-tree mining) poll `reporting.cancel_requested()` instead.
+- Every job runs inside a `tracing` trace (`job.trace`): the per-stage timing
+  breakdown of the run.
+"""
+
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import reporting
+import tracing
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = 'queued', 'running', 'done', 'failed', 'cancelled'
+FINISHED = (DONE, FAILED, CANCELLED)
+
+
+class JobCancelled(Exception):
+    """Raised inside a job once cancellation was requested."""
+
+
+class Job:
+    """Status, progress and outcome of one submitted analysis."""
+
+    def __init__(self, job_id, name, key=None):
+        self.id = job_id
+        self.name = name
+        self.key = key
+        self.status = QUEUED
+        self.progress = (0, "")
+        self.messages = []          # [(level, objects)] reported by the job
+        self.result = None
+        self.error = None
+        self.trace = None           # tracing.Trace of the run
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self._cancel = threading.Event()
+        self._future = None
+        self._subscribers = set()   # who submitted this job and has not cancelled it
+
+    @property
+    def done(self):
+        return self.status in FINISHED
+
+    @property
+    def cancel_requested(self):
+        return self._cancel.is_set()
+
+    @property
+    def elapsed(self):
+        """Seconds spent running (so far)."""
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.time()) - self.started
+
+    def _finish(self, status):
+        self.status = status
+        self.finished = time.time()
+
+    def __repr__(self):
+        return f"Job({self.id!r}, {self.name!r}, status={self.status!r})"
+
+
+class JobReporter(reporting.Reporter):
+    """Records a job's reports on the Job instead of rendering them."""
+
+    def __init__(self, job):
+        self.job = job
+
+    def checkpoint(self):
+        if self.job.cancel_requested:
+            raise JobCancelled(f"{self.job.name} cancelled")
+
+    def cancel_requested(self):
+        return self.job.cancel_requested
+
+    def on_progress(self, pct, text):
+        self.checkpoint()
+        self.job.progress = (pct, text)
+
+    def _record(self, level, *objects):
+        self.job.messages.append((level, objects))
+
+    def caption(self, message):
+        self._record('caption', message)
+
+    def info(self, message):
+        self._record('info', message)
+
+    def success(self, message):
+        self._record('success', message)
+
+    def warning(self, message):
+        self._record('warning', message)
+
+    def error(self, message):
+        self._record('error', message)
+
+    def write(self, *objects):
+        self._record('write', *objects)
+
+
+def checkpoint():
+    """Raise JobCancelled if the job running in this thread was cancelled (no-op outside jobs)."""
+    reporter = reporting.get_reporter()
+    if isinstance(reporter, JobReporter):
+        reporter.checkpoint()
+
+
+class JobRunner:
+    """Thread pool plus a registry of submitted jobs."""
+
+    def __init__(self, max_workers=2, max_finished=50, trace_memory=False):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="dss-job")
+        self._max_finished = max_finished
+        self._trace_memory = trace_memory
+        self._jobs = {}        # id -> Job, in submission order
+        self._by_key = {}      # key -> id of the job serving that key
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def submit(self, name, func, *args, key=None, subscriber=None, **kwargs):
+        """
+        Run `func(*args, **kwargs)` in the background; returns the (possibly shared) Job.
+
+        `subscriber` identifies the submitter (e.g. a session id) for `cancel`;
+        None = an anonymous subscriber of its own.
+        """
+        subscriber = subscriber if subscriber is not None else object()
+        with self._lock:
+            if key is not None:
+                existing = self._jobs.get(self._by_key.get(key))
+                if (existing is not None and existing.status not in (FAILED, CANCELLED)
+                        and not existing.cancel_requested):
+                    existing._subscribers.add(subscriber)
+                    return existing
+            job = Job(f"job-{next(self._ids)}", name, key)
+            job._subscribers.add(subscriber)
+            self._jobs[job.id] = job
+            if key is not None:
+                self._by_key[key] = job.id
+            self._prune()
+        job._future = self._executor.submit(self._run, job, func, args, kwargs)
+        return job
+
+    def _run(self, job, func, args, kwargs):
+        if job.cancel_requested:
+            job._finish(CANCELLED)
+            return
+        job.status = RUNNING
+        job.started = time.time()
+        job.trace = tracing.trace(job.name, memory=self._trace_memory)
+        try:
+            with reporting.use_reporter(JobReporter(job)), job.trace:
+                job.result = func(*args, **kwargs)
+        except JobCancelled:
+            job._finish(CANCELLED)
+        except Exception as e:
+            job.error = f"{type(e).__name__}: {e}"
+            job._finish(FAILED)
+        else:
+            job._finish(DONE)
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def jobs(self):
+        """All registered jobs, newest first."""
+        with self._lock:
+            return list(reversed(self._jobs.values()))
+
+    def cancel(self, job_id, subscriber=None):
+        """
+        Withdraw `subscriber` from the job; cancellation is requested once no
+        subscriber is left (subscriber=None cancels it for everyone, e.g. on
+        shutdown). Returns False if the job is unknown or already finished.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.done:
+                return False
+            if subscriber is None:
+                job._subscribers.clear()
+            else:
+                job._subscribers.discard(subscriber)
+            if job._subscribers:
+                return True
+        job._cancel.set()
+        if job._future is not None and job._future.cancel():
+            job._finish(CANCELLED)
+        return True
+
+    def forget_finished(self):
+        """Drop finished jobs so their results are not reused (e.g. after the database was rebuilt)."""
+        with self._lock:
+            for job_id in [job_id for job_id, job in self._jobs.items() if job.done]:
+                self._drop(job_id)
+
+    def _drop(self, job_id):
+        job = self._jobs.pop(job_id)
+        if job.key is not None and self._by_key.get(job.key) == job_id:
+            del self._by_key[job.key]
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.done]
+        for job_id in finished[:max(0, len(finished) - self._max_finished)]:
+            self._drop(job_id)
+
+    def shutdown(self, wait=True):
+        for job in self.jobs():
+            self.cancel(job.id)
+        self._executor.shutdown(wait=wait)
+
+
+_runner = None
+_runner_lock = threading.Lock()
+
+
+def get_runner():
+    """Process-wide JobRunner (shared by all sessions of the dashboard)."""
+    global _runner
+    with _runner_lock:
+        if _runner is None:
+            _runner = JobRunner()
+        return _runner
@@ -0,0 +1,1592 @@
+# mining.py
+"""mining.py
+
+Frequent itemset mining engine for the Retail Decision Support System.
+
+- MiningBudget               -> wall-clock limit + cooperative cancellation (partial results)
+- FPTree / mine_fp_tree      -> compressed FP-tree + FP-Growth over integer item IDs
+- build_fp_tree              -> FP-tree of in-memory (CSR) baskets
+- mine_top_itemsets          -> top-k itemsets with a dynamically raised support threshold
+- mine_top_rules             -> top-k rules by lift / confidence down to a basket floor (capped search)
+- generate_rules             -> vectorized rule generation on integer item IDs
+- mine_out_of_core           -> two-pass FP-Growth over baskets streamed from SQLite
+- ItemTaxonomy / mine_generalized / prune_redundant_rules
+                             -> multi-level itemsets across the product hierarchy
+- SequenceDatabase / mine_sequences
+                             -> sequential patterns (PrefixSpan) of household basket histories
+- WindowSupports             -> sliding-window itemset supports by delta counting (WEEK_NO windows)
+- load_partitioned_baskets   -> baskets per STORE_ID / demographic partition over one item dictionary
+- required_sample_size       -> (epsilon, delta) sample size for support estimates
+- count_itemset_support      -> exact support of candidate itemsets in one bitset pass
+
+Item IDs are frequency ranks (0 = most frequent item), so every basket is
+inserted into the tree in descending-support order.
+"""
+
+import heapq
+import multiprocessing
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+import pandas as pd
+
+import database as db
+import tracing
+
+# =============================================================================
+# MINING BUDGET (TIME LIMIT & CANCELLATION)
+# =============================================================================
+
+class MiningBudget:
+    """
+    Wall-clock limit and cooperative cancellation for one mining run.
+
+    The miners call `exhausted()` before expanding an item and stop as soon as
+    it returns True, keeping the itemsets found so far. Items are expanded most
+    frequent first, so a stopped run holds every frequent itemset made of the
+    m most frequent items (for some m): the partial result is downward-closed
+    and rules can still be generated from it.
+
+    `stopped` is 'time_limit' or 'cancelled' once the budget ran out, else None.
+    """
+
+    def __init__(self, seconds=None, cancelled=None):
+        self.seconds = seconds
+        self.cancelled = cancelled  # callable returning True once cancellation was requested
+        self.started = time.perf_counter()
+        self.stopped = None
+
+    @property
+    def partial(self):
+        return self.stopped is not None
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def exhausted(self):
+        if self.stopped is None:
+            if self.seconds is not None and self.elapsed >= self.seconds:
+                self.stopped = 'time_limit'
+            elif self.cancelled is not None and self.cancelled():
+                self.stopped = 'cancelled'
+        return self.stopped is not None
+
+
+def run_in_spawn_pool(func, tasks, initializer, initargs, n_jobs, budget, on_result):
+    """
+    Run `func(task)` for every task in `n_jobs` spawned worker processes and
+    pass each result to `on_result` as it completes.
+
+    Workers are set up once with `initializer(*initargs, deadline, stop)`:
+    `deadline` is the budget's time limit as a time.time() value (None = no
+    limit) and `stop` an Event set once the `budget` is exhausted, so workers
+    can build their own MiningBudget. Tasks that have not started by then are
+    cancelled; running ones stop at their next budget check.
+    """
+    context = multiprocessing.get_context('spawn')  # no fork() of a process running other threads
+    stop = context.Event()
+    deadline = None
+    if budget is not None and budget.seconds is not None:
+        deadline = time.time() + budget.seconds - budget.elapsed
+    with ProcessPoolExecutor(min(n_jobs, len(tasks)), mp_context=context, initializer=initializer,
+                             initargs=(*initargs, deadline, stop)) as pool:
+        pending = {pool.submit(func, task) for task in tasks}
+        while pending:
+            done, pending = wait(pending, timeout=0.2, return_when=FIRST_COMPLETED)
+            for future in done:
+                if not future.cancelled():
+                    on_result(future.result())
+            if budget is not None and budget.exhausted():
+                stop.set()  # running workers stop at their next budget check
+                for future in pending:
+                    future.cancel()
+
+
+# =============================================================================
+# FP-TREE
+# =============================================================================
+
+class FPTree:
+    """
+    Compressed prefix tree of frequency-ordered baskets.
+
+    Nodes live in parallel lists (item, count, parent) and children are kept in
+    a single dict keyed by (parent, item), which keeps per-node overhead small
+    enough to hold millions of nodes.
+    """
+
+    def __init__(self, n_items):
+        self.n_items = n_items
+        self.item = [-1]
+        self.count = [0]
+        self.parent = [-1]
+        self.children = {}
+        self.header = [[] for _ in range(n_items)]
+
+    def __len__(self):
+        return len(self.item) - 1
+
+    def insert(self, path, count=1):
+        """Insert a basket (item IDs in ascending rank order) `count` times."""
+        node = 0
+        for item in path:
+            key = (node, item)
+            child = self.children.get(key)
+            if child is None:
+                child = len(self.item)
+                self.item.append(item)
+                self.count.append(0)
+                self.parent.append(node)
+                self.children[key] = child
+                self.header[item].append(child)
+            self.count[child] += count
+            node = child
+
+    def item_support(self, item):
+        """Total count of `item` in the tree."""
+        count = self.count
+        return sum(count[node] for node in self.header[item])
+
+    def prefix_paths(self, item):
+        """Conditional pattern base of `item`: [(path root->leaf, count)]."""
+        parent, node_item, count = self.parent, self.item, self.count
+        paths = []
+        for node in self.header[item]:
+            path = []
+            p = parent[node]
+            while p > 0:
+                path.append(node_item[p])
+                p = parent[p]
+            if path:
+                path.reverse()
+                paths.append((path, count[node]))
+        return paths
+
+
+def mine_fp_tree(tree, min_count, max_len=None, suffix=(), budget=None):
+    """
+    FP-Growth over an FPTree.
+
+    Items are expanded most frequent first; with a `budget` the search stops
+    once it is exhausted (see MiningBudget).
+
+    Returns
+    -------
+    list of (itemset tuple of item IDs, count)
+    """
+    results = []
+    for item in range(tree.n_items):
+        if budget is not None and budget.exhausted():
+            break
+        if not tree.header[item]:
+            continue
+        support = tree.item_support(item)
+        if support < min_count:
+            continue
+        itemset = (item,) + suffix
+        results.append((itemset, support))
+        if max_len and len(itemset) >= max_len:
+            continue
+
+        cond_tree = conditional_tree(tree, item, min_count)
+        if cond_tree is not None:
+            results.extend(mine_fp_tree(cond_tree, min_count, max_len, itemset, budget))
+    return results
+
+
+def conditional_tree(tree, item, min_count, exclude=None):
+    """
+    FP-tree of the prefix paths of `item`, restricted to items frequent in them
+    and not in `exclude` (None if empty).
+    """
+    paths = tree.prefix_paths(item)
+    cond_counts = Counter()
+    for path, count in paths:
+        for path_item in path:
+            cond_counts[path_item] += count
+    frequent = {path_item for path_item, count in cond_counts.items()
+                if count >= min_count and not (exclude and path_item in exclude)}
+    if not frequent:
+        return None
+
+    cond_tree = FPTree(tree.n_items)
+    for path, count in paths:
+        filtered = [path_item for path_item in path if path_item in frequent]
+        if filtered:
+            cond_tree.insert(filtered, count)
+    return cond_tree
+
+
+def build_fp_tree(baskets, min_count=1):
+    """
+    FP-tree of in-memory baskets (preprocessing.EncodedBaskets).
+
+    Returns
+    -------
+    (FPTree, labels) - labels[i] is the item with frequency rank i
+    """
+    counts = baskets.item_counts()
+    order = np.argsort(-counts, kind='stable')
+    order = order[counts[order] >= min_count]
+    rank = np.full(baskets.n_items, -1, dtype=np.int64)
+    rank[order] = np.arange(len(order))
+
+    tree = FPTree(len(order))
+    for path, count in _basket_paths(baskets.row_ids(), rank[baskets.indices]).items():
+        tree.insert(path, count)
+    return tree, baskets.items[order].tolist()
+
+# =============================================================================
+# TOP-K MINING (NO FIXED MIN_SUPPORT)
+# =============================================================================
+
+def mine_top_itemsets(tree, n_itemsets, min_count=1, max_len=None, budget=None):
+    """
+    FP-Growth that keeps the `n_itemsets` most frequent itemsets of length >= 2
+    instead of taking a support threshold (TFP-style top-k mining).
+
+    The threshold starts at `min_count` and is raised to the support of the
+    n-th best itemset found so far, so conditional trees are pruned more and
+    more aggressively as the search progresses. Items are explored most
+    frequent first, which finds high-support itemsets (and raises the
+    threshold) early. With a `budget` the search stops once it is exhausted.
+
+    Returns
+    -------
+    (list of (itemset tuple of item IDs, count), final min_count)
+        All itemsets (including singletons) with support >= the final
+        threshold; the result is downward-closed, so rules can be generated
+        from it directly.
+    """
+    best = []  # min-heap of the n_itemsets best supports
+    threshold = min_count
+    results = []
+
+    def grow(tree, suffix):
+        nonlocal threshold
+        for item in range(tree.n_items):
+            if budget is not None and budget.exhausted():
+                return
+            if not tree.header[item]:
+                continue
+            support = tree.item_support(item)
+            if support < threshold:
+                continue
+            itemset = (item,) + suffix
+            results.append((itemset, support))
+            if len(itemset) >= 2:
+                if len(best) < n_itemsets:
+                    heapq.heappush(best, support)
+                elif support > best[0]:
+                    heapq.heapreplace(best, support)
+                if len(best) == n_itemsets:
+                    threshold = max(threshold, best[0])
+            if max_len and len(itemset) >= max_len:
+                continue
+            cond_tree = conditional_tree(tree, item, threshold)
+            if cond_tree is not None:
+                grow(cond_tree, itemset)
+
+    grow(tree, ())
+    return [(itemset, count) for itemset, count in results if count >= threshold], threshold
+
+
+TOP_RULE_METRICS = ('lift', 'confidence')
+
+
+def mine_top_rules(tree, n_baskets, k, metric='lift', min_count=1, min_confidence=0.0, min_lift=0.0,
+                   max_len=None, max_itemsets=None, budget=None, batch_size=20_000):
+    """
+    The `k` association rules with the highest `metric` ('lift' or
+    'confidence', ties broken by support) among itemsets in at least
+    `min_count` baskets, without a support threshold.
+
+    Lift and confidence are not anti-monotone: the best rules often come from
+    rare itemsets, and no score bound can prune the itemset search. FP-Growth
+    therefore runs down to `min_count`, and its cost is bounded only by
+    `min_count`, `max_len`, `max_itemsets` and the `budget`, not by `k`.
+    Rules are generated after each batch of completed top-level items (an
+    item's subtree holds every itemset whose least frequent item it is, so
+    all subsets are known by then) and the k best seen so far are kept. The
+    k-th best score only makes rule generation cheaper:
+
+    - rules are generated with min_confidence / min_lift raised to it,
+      so consequents stop growing once their confidence falls below it;
+    - for lift, itemsets in more than n_baskets / score baskets produce no
+      rules (lift <= 1 / support of either side <= 1 / support of the itemset);
+    - for confidence, the search stops once the k-th best rule has
+      confidence 1 and a support no later itemset can beat (items are
+      explored most frequent first).
+
+    Once the `budget` is exhausted or more than `max_itemsets` itemsets were
+    found (budget.stopped = 'max_itemsets'), the search stops; the unfinished
+    item is dropped, so the result is the exact top-k over the items done.
+
+    Returns
+    -------
+    (DataFrame with RULE_COLUMNS sorted by `metric`, at most k rows,
+     dict with itemsets, items done, final k-th best score and early stop flag)
+    """
+    if metric not in TOP_RULE_METRICS:
+        raise ValueError(f"metric must be one of {TOP_RULE_METRICS}, not {metric!r}")
+    done, done_supports = [], []      # itemsets whose rules were generated (lookups only)
+    pending = []                      # (itemset, count) of completed items not yet turned into rules
+    top = pd.DataFrame(columns=RULE_COLUMNS)
+    bound = None
+    if budget is None:
+        budget = MiningBudget()
+
+    def exhausted(found):
+        if max_itemsets is not None and budget.stopped is None \
+                and len(done) + len(pending) + len(found) > max_itemsets:
+            budget.stopped = 'max_itemsets'
+        return budget.exhausted()
+
+    def grow(tree, suffix, found):
+        for item in range(tree.n_items):
+            if exhausted(found):
+                return
+            if not tree.header[item]:
+                continue
+            support = tree.item_support(item)
+            if support < min_count:
+                continue
+            itemset = (item,) + suffix
+            found.append((itemset, support))
+            if max_len and len(itemset) >= max_len:
+                continue
+            cond_tree = conditional_tree(tree, item, min_count)
+            if cond_tree is not None:
+                grow(cond_tree, itemset, found)
+
+    def flush():
+        nonlocal top, bound, pending
+        itemsets = [itemset for itemset, _ in pending]
+        supports = np.array([count for _, count in pending], dtype=np.float64) / n_baskets
+        rule_from = np.array([len(itemset) >= 2 for itemset in itemsets], dtype=bool)
+        min_conf, min_lft = min_confidence, min_lift
+        if bound is not None:
+            if metric == 'confidence':
+                min_conf = max(min_conf, bound)
+            else:
+                min_lft = max(min_lft, bound)
+                rule_from &= supports * bound <= 1 + 1e-9
+        rule_sets = [itemset for itemset, keep in zip(itemsets, rule_from) if keep]
+        if rule_sets:
+            known = ([itemset for itemset, keep in zip(itemsets, rule_from) if not keep] + done,
+                     np.concatenate([supports[~rule_from], done_supports]))
+            rules = generate_rules(rule_sets, supports[rule_from], min_conf, min_lft, known=known)
+            if not rules.empty:
+                top = (rules if top.empty else pd.concat([top, rules], ignore_index=True))
+                top = top.sort_values([metric, 'support'], ascending=False, kind='stable').head(k)
+                if len(top) == k:
+                    bound = top[metric].iloc[-1]
+        done.extend(itemsets)
+        done_supports.extend(supports.tolist())
+        pending = []
+
+    items_done, stopped_early = 0, False
+    for item in range(tree.n_items):
+        if exhausted(()):
+            break
+        if (metric == 'confidence' and bound is not None and bound >= 1
+                and top['support'].iloc[-1] * n_baskets >= tree.item_support(item)):
+            stopped_early = True
+            break
+        if not tree.header[item] or tree.item_support(item) < min_count:
+            items_done += 1
+            continue
+        found = [((item,), tree.item_support(item))]
+        cond_tree = conditional_tree(tree, item, min_count) if max_len != 1 else None
+        if cond_tree is not None:
+            grow(cond_tree, (item,), found)
+        if exhausted(found):
+            break
+        pending.extend(found)
+        items_done += 1
+        if len(pending) >= batch_size:
+            flush()
+    if pending:
+        flush()
+
+    top = top.reset_index(drop=True)
+    return top, {'itemsets': len(done), 'items_done': items_done, 'bound': bound, 'stopped_early': stopped_early}
+
+
+def itemsets_to_frame(itemsets, labels, n_baskets):
+    """
+    Convert [(item IDs, count)] to the mlxtend frame: support, itemsets.
+
+    Itemsets are frozensets of labels, or of the item IDs themselves when
+    `labels` is None (mlxtend's `use_colnames=False` convention).
+    """
+    if not itemsets:
+        return pd.DataFrame(columns=['support', 'itemsets'])
+    counts = np.fromiter((count for _, count in itemsets), dtype=np.float64, count=len(itemsets))
+    if labels is None:
+        sets = [frozenset(ids) for ids, _ in itemsets]
+    else:
+        sets = [frozenset(labels[i] for i in ids) for ids, _ in itemsets]
+    return pd.DataFrame({'support': counts / n_baskets, 'itemsets': sets})
+
+# =============================================================================
+# RULE GENERATION (INTEGER ITEM IDS)
+# =============================================================================
+
+RULE_COLUMNS = ['antecedent_ids', 'consequent_ids', 'antecedent support', 'consequent support',
+                'support', 'confidence', 'lift', 'leverage', 'conviction']
+
+
+def _row_keys(rows):
+    """One sortable fixed-width key per row of a 2-D item ID array (big-endian bytes keep numeric order)."""
+    rows = np.ascontiguousarray(rows, dtype='>i4')
+    return rows.view(np.dtype((np.void, rows.dtype.itemsize * rows.shape[1]))).ravel()
+
+
+def _itemset_arrays(itemsets, supports):
+    """{length: (2-D array of sorted item IDs, supports)} of `itemsets`."""
+    by_len = {}
+    for position, itemset in enumerate(itemsets):
+        by_len.setdefault(len(itemset), []).append(position)
+    return {length: (np.sort(np.array([sorted(itemsets[p]) for p in positions], dtype=np.int64), axis=1),
+                     supports[positions])
+            for length, positions in by_len.items()}
+
+
+def generate_rules(itemsets, supports, min_confidence=0.0, min_lift=0.0, known=None):
+    """
+    Association rules from a downward-closed collection of frequent itemsets.
+
+    Itemsets of each length are stacked into a 2-D array of sorted item IDs;
+    the support of an antecedent/consequent is found with a searchsorted over
+    fixed-width row keys instead of a dict of frozensets. Consequents are
+    grown level-wise and a consequent is only evaluated where all of its
+    sub-consequents reached `min_confidence` (confidence can only drop when
+    an item moves from the antecedent to the consequent). Lift is filtered on
+    the survivors. No labels are touched.
+
+    Parameters
+    ----------
+    itemsets : sequence of tuples/frozensets of item IDs
+    supports : array-like of relative supports aligned with `itemsets`
+    known : (itemsets, supports) of further itemsets that are only looked up
+            as antecedents/consequents (no rules are generated from them), so
+            rules can be generated batch by batch; `itemsets` plus `known`
+            must be downward-closed
+
+    Returns
+    -------
+    DataFrame with RULE_COLUMNS (antecedent_ids / consequent_ids are sorted tuples)
+
+    Raises ValueError if the support of an antecedent or consequent is missing
+    (`itemsets` plus `known` not downward-closed).
+    """
+    supports = np.asarray(supports, dtype=np.float64)
+    arrays = _itemset_arrays(itemsets, supports)
+    if known is not None and len(known[0]):
+        lookup_arrays = _itemset_arrays(list(itemsets) + list(known[0]),
+                                        np.concatenate([supports, np.asarray(known[1], dtype=np.float64)]))
+    else:
+        lookup_arrays = arrays
+
+    lookup = {}  # length -> (sorted row keys, supports)
+    for length, (rows, values) in lookup_arrays.items():
+        keys = _row_keys(rows)
+        order = np.argsort(keys)
+        lookup[length] = (keys[order], values[order])
+
+    def support_of(rows):
+        keys, values = lookup.get(rows.shape[1], (None, None))
+        query = _row_keys(rows)
+        if keys is not None and len(keys):
+            position = np.minimum(np.searchsorted(keys, query), len(keys) - 1)
+            if (keys[position] == query).all():
+                return values[position]
+        raise ValueError("itemsets must be downward-closed: a subset of a frequent itemset is missing")
+
+    blocks = []
+    for length, (rows, itemset_support) in arrays.items():
+        if length < 2:
+            continue
+        full = (1 << length) - 1
+        masks = sorted(range(1, full), key=lambda mask: bin(mask).count('1'))
+        passed = {}
+        for mask in masks:  # mask = consequent positions
+            bits = [b for b in range(length) if mask >> b & 1]
+            candidates = np.ones(len(rows), dtype=bool)
+            if len(bits) > 1:
+                for b in bits:
+                    candidates &= passed[mask ^ (1 << b)]
+            ok = np.zeros(len(rows), dtype=bool)
+            passed[mask] = ok
+            index = np.flatnonzero(candidates)
+            if not len(index):
+                continue
+
+            ante_cols = [b for b in range(length) if not mask >> b & 1]
+            ante = rows[np.ix_(index, ante_cols)]
+            ante_support = support_of(ante)
+            confidence = itemset_support[index] / ante_support
+            keep = confidence >= min_confidence
+            ok[index[keep]] = True
+
+            index, ante, ante_support, confidence = index[keep], ante[keep], ante_support[keep], confidence[keep]
+            cons = rows[np.ix_(index, bits)]
+            cons_support = support_of(cons)
+            lift = confidence / cons_support
+            keep = lift >= min_lift
+            if keep.any():
+                blocks.append((ante[keep], cons[keep], ante_support[keep], cons_support[keep],
+                               itemset_support[index[keep]], confidence[keep], lift[keep]))
+
+    if not blocks:
+        return pd.DataFrame(columns=RULE_COLUMNS)
+
+    ante_support, cons_support, support, confidence, lift = (
+        np.concatenate([block[i] for block in blocks]) for i in range(2, 7)
+    )
+    with np.errstate(divide='ignore', invalid='ignore'):
+        conviction = np.where(confidence < 1, (1 - cons_support) / (1 - confidence), np.inf)
+    return pd.DataFrame({
+        'antecedent_ids': [ids for block in blocks for ids in map(tuple, block[0].tolist())],
+        'consequent_ids': [ids for block in blocks for ids in map(tuple, block[1].tolist())],
+        'antecedent support': ante_support,
+        'consequent support': cons_support,
+        'support': support,
+        'confidence': confidence,
+        'lift': lift,
+        'leverage': support - ante_support * cons_support,
+        'conviction': conviction,
+    })
+
+# =============================================================================
+# OUT-OF-CORE MINING (STREAMED FROM SQLITE)
+# =============================================================================
+
+def _chunk_paths(chunk, rank):
+    """Group a (basket_key, item) chunk into Counter{rank-ordered basket tuple: count}.
+
+    `rank` is a pd.Index of the frequent item labels in rank order.
+    """
+    codes = rank.get_indexer(chunk['item']).astype(np.int64)
+    return _basket_paths(chunk['basket_key'].to_numpy(), codes)
+
+
+def _basket_paths(keys, codes):
+    """Counter{rank-ordered basket tuple: count} of (basket key, item rank) pairs; rank -1 is dropped."""
+    keep = codes >= 0  # infrequent items are pruned before building the tree
+    keys, codes = keys[keep], codes[keep]
+    if not len(codes):
+        return Counter()
+
+    order = np.lexsort((codes, keys))
+    keys, codes = keys[order], codes[order]
+    first = np.ones(len(codes), dtype=bool)
+    first[1:] = (keys[1:] != keys[:-1]) | (codes[1:] != codes[:-1])
+    keys, codes = keys[first], codes[first]
+
+    bounds = np.flatnonzero(keys[1:] != keys[:-1]) + 1
+    return Counter(tuple(basket) for basket in np.split(codes, bounds))
+
+
+def mine_out_of_core(group_by='BASKET_ID', product_level='COMMODITY_DESC', min_support=0.01,
+                     max_len=None, chunk_size=250_000, progress_callback=None, budget=None):
+    """
+    Two-pass FP-Growth without materializing baskets in memory.
+
+    Pass 1 counts item support inside SQLite and prunes infrequent items.
+    Pass 2 streams (basket, item) rows in chunks, collapses identical baskets
+    and inserts them into a compressed FP-tree, which is then mined.
+
+    A `budget` (MiningBudget) only bounds the mining step: a partially built
+    tree would give wrong supports. `stats['stopped']` tells whether the
+    itemsets are partial.
+
+    Returns
+    -------
+    (frequent_itemsets DataFrame[support, itemsets], stats dict, error)
+    """
+    def report(pct, msg):
+        if progress_callback:
+            progress_callback(pct, msg)
+
+    report(0.0, "Pass 1: counting item support in SQLite...")
+    item_counts, n_baskets, err = db.get_item_support_counts(group_by, product_level)
+    if err:
+        return None, {}, err
+    if n_baskets == 0:
+        return pd.DataFrame(columns=['support', 'itemsets']), {'n_baskets': 0}, None
+
+    min_count = max(1, int(np.ceil(min_support * n_baskets)))
+    frequent = item_counts[item_counts['baskets'] >= min_count]
+    labels = frequent['item'].tolist()  # already sorted by support (rank order)
+    rank = pd.Index(labels)
+    stats = {
+        'n_baskets': n_baskets,
+        'n_items': len(item_counts),
+        'n_frequent_items': len(labels),
+        'min_count': min_count,
+    }
+    if not labels:
+        return pd.DataFrame(columns=['support', 'itemsets']), stats, None
+
+    report(0.2, f"Pass 2: streaming baskets into FP-tree ({len(labels):,} frequent items)...")
+    tree = FPTree(len(labels))
+    carry = None
+    rows_read = 0
+    with tracing.span("fp_tree.build") as span:
+        for chunk in db.iter_basket_items(group_by, product_level, chunk_size):
+            rows_read += len(chunk)
+            if carry is not None:
+                chunk = pd.concat([carry, chunk], ignore_index=True)
+            # The last basket may continue in the next chunk
+            last_key = chunk['basket_key'].iloc[-1]
+            tail = chunk['basket_key'].to_numpy() == last_key
+            carry = chunk[tail]
+            for path, count in _chunk_paths(chunk[~tail], rank).items():
+                tree.insert(path, count)
+            report(0.2, f"Pass 2: {rows_read:,} rows streamed, {len(tree):,} tree nodes")
+        if carry is not None and len(carry):
+            for path, count in _chunk_paths(carry, rank).items():
+                tree.insert(path, count)
+        span.set(rows=rows_read, nodes=len(tree))
+
+    stats['tree_nodes'] = len(tree)
+    report(0.6, f"Mining FP-tree ({len(tree):,} nodes)...")
+    with tracing.span("fp_tree.mine") as span:
+        itemsets = mine_fp_tree(tree, min_count, max_len, budget=budget)
+        span.set(itemsets=len(itemsets))
+    stats['stopped'] = budget.stopped if budget is not None else None
+    report(1.0, f"Found {len(itemsets):,} frequent itemsets")
+    return itemsets_to_frame(itemsets, labels, n_baskets), stats, None
+
+# =============================================================================
+# MULTI-LEVEL (GENERALIZED) MINING OVER THE PRODUCT HIERARCHY
+# =============================================================================
+
+LEVEL_TAGS = {'DEPARTMENT': 'Dept', 'COMMODITY_DESC': 'Comm', 'SUB_COMMODITY_DESC': 'Sub', 'BRAND': 'Brand'}
+
+
+class ItemTaxonomy:
+    """
+    Product hierarchy (e.g. DEPARTMENT > COMMODITY_DESC > SUB_COMMODITY_DESC)
+    as integer nodes.
+
+    A node is a path prefix, so equal names under different parents stay
+    distinct. Node i has a name, a level (0 = top) and a parent (-1 at the top).
+    """
+
+    def __init__(self, levels):
+        self.levels = list(levels)
+        self.names = []
+        self.level = []
+        self.parent = []
+        self._nodes = {}  # path tuple -> node
+
+    def __len__(self):
+        return len(self.names)
+
+    def _node(self, path):
+        node = self._nodes.get(path)
+        if node is None:
+            parent = self._node(path[:-1]) if len(path) > 1 else -1
+            node = len(self.names)
+            self._nodes[path] = node
+            self.names.append(path[-1])
+            self.level.append(len(path) - 1)
+            self.parent.append(parent)
+        return node
+
+    def encode(self, paths):
+        """Leaf node of every row of `paths` (one column per level), registering new paths."""
+        columns = [paths[level].astype(str) for level in self.levels]
+        keys = columns[0].str.cat(columns[1:], sep='\x1f') if len(columns) > 1 else columns[0]
+        codes, uniques = pd.factorize(keys)
+        leaves = np.fromiter((self._node(tuple(key.split('\x1f'))) for key in uniques),
+                             dtype=np.int64, count=len(uniques))
+        return leaves[codes]
+
+    def ancestor_table(self):
+        """Array [level, node] -> ancestor of `node` at `level` (the node itself at its own level, -1 below it)."""
+        table = np.full((len(self.levels), len(self)), -1, dtype=np.int64)
+        for node in range(len(self)):
+            ancestor = node
+            while ancestor >= 0:
+                table[self.level[ancestor], node] = ancestor
+                ancestor = self.parent[ancestor]
+        return table
+
+    def labels(self):
+        """Display label per node: 'NAME [Tag]', with the parent name added where names repeat on a level."""
+        tags = [LEVEL_TAGS.get(level, level) for level in self.levels]
+        seen = Counter(zip(self.names, self.level))
+        labels = []
+        for name, level, parent in zip(self.names, self.level, self.parent):
+            if seen[(name, level)] > 1 and parent >= 0:
+                labels.append(f"{name} [{tags[level]}: {self.names[parent]}]")
+            else:
+                labels.append(f"{name} [{tags[level]}]")
+        return labels
+
+    def related_items(self, nodes):
+        """
+        For items given as `nodes[i]` (e.g. FP-tree ranks -> node), the set of
+        item positions that are an ancestor or descendant of item i.
+        """
+        position = {node: i for i, node in enumerate(nodes)}
+        related = [set() for _ in nodes]
+        for i, node in enumerate(nodes):
+            ancestor = self.parent[node]
+            while ancestor >= 0:
+                j = position.get(ancestor)
+                if j is not None:
+                    related[i].add(j)
+                    related[j].add(i)
+                ancestor = self.parent[ancestor]
+        return [frozenset(items) for items in related]
+
+
+def load_basket_leaves(group_by='BASKET_ID', levels=None, chunk_size=250_000, progress_callback=None):
+    """
+    Encode the product hierarchy once (ItemTaxonomy over `products`, levels
+    default to db.PRODUCT_HIERARCHY), then stream (basket, product) rows from
+    SQLite and map every product to its leaf node with one array lookup.
+
+    Returns
+    -------
+    (basket keys, leaf nodes, ItemTaxonomy, error) - keys and leaves aligned per row
+    """
+    taxonomy = ItemTaxonomy(levels or db.PRODUCT_HIERARCHY)
+    empty = np.empty(0, dtype=np.int64)
+    products, err = db.get_product_hierarchy(taxonomy.levels)
+    if err:
+        return empty, empty, taxonomy, err
+    product_leaf = taxonomy.encode(products)
+    product_index = pd.Index(products['PRODUCT_ID'])
+
+    keys, leaves, rows = [], [], 0
+    with tracing.span("taxonomy.encode", products=len(products), nodes=len(taxonomy)) as span:
+        for chunk in db.iter_basket_products(group_by, chunk_size):
+            position = product_index.get_indexer(chunk['PRODUCT_ID'])
+            known = position >= 0  # products without a full hierarchy path are skipped
+            keys.append(chunk['basket_key'].to_numpy()[known])
+            leaves.append(product_leaf[position[known]])
+            rows += len(chunk)
+            if progress_callback:
+                progress_callback(rows, len(taxonomy))
+        span.set(rows=rows)
+    if not keys:
+        return empty, empty, taxonomy, None
+    return np.concatenate(keys), np.concatenate(leaves), taxonomy, None
+
+
+def mine_generalized(tree, min_count, related, max_len=None, suffix=(), excluded=frozenset(), budget=None,
+                     levels=None):
+    """
+    FP-Growth over baskets extended with the ancestors of their items
+    (generalized itemsets, Srikant & Agrawal), mining every hierarchy level in
+    one pass.
+
+    An itemset is never extended with an ancestor or descendant of one of its
+    items (`related[i]`, see ItemTaxonomy.related_items): support({COLA, SOFT
+    DRINKS}) == support({COLA}), so such itemsets only produce redundant rules.
+    They are cut from the conditional trees, which also keeps the search small.
+
+    With `levels` (hierarchy level of each item) only single-level itemsets
+    are mined: the conditional tree of each top-level item drops the items of
+    other levels, so the trees below it never see them.
+
+    Returns
+    -------
+    list of (itemset tuple of item IDs, count)
+    """
+    other_levels = None
+    if levels is not None:
+        levels = np.asarray(levels)
+        other_levels = {level: frozenset(np.flatnonzero(levels != level).tolist()) for level in np.unique(levels)}
+    results = []
+    for item in range(tree.n_items):
+        if budget is not None and budget.exhausted():
+            break
+        if not tree.header[item]:
+            continue
+        support = tree.item_support(item)
+        if support < min_count:
+            continue
+        itemset = (item,) + suffix
+        results.append((itemset, support))
+        if max_len and len(itemset) >= max_len:
+            continue
+
+        item_excluded = excluded | related[item]
+        cond_excluded = item_excluded if other_levels is None else item_excluded | other_levels[levels[item]]
+        cond_tree = conditional_tree(tree, item, min_count, exclude=cond_excluded)
+        if cond_tree is not None:
+            results.extend(mine_generalized(cond_tree, min_count, related, max_len, itemset, item_excluded, budget))
+    return results
+
+
+def prune_redundant_rules(rules, itemsets, supports, parent, min_interest=1.1):
+    """
+    Drop rules that an ancestor rule already explains (R-interest, Srikant & Agrawal).
+
+    Ancestor rules of X -> Y replace one item, or every item, by its parent.
+    When the generalized itemsets are frequent, the ancestor rule X' -> Y'
+    predicts conf(X -> Y) = conf(X' -> Y') * prod(support(y) / support(y'))
+    over the replaced consequent items. A rule is kept only if its confidence
+    reaches `min_interest` times every such expectation; rules without frequent
+    ancestor rules are kept.
+
+    Parameters
+    ----------
+    rules : DataFrame from `generate_rules` (item IDs)
+    itemsets, supports : the frequent itemsets the rules were generated from
+    parent : sequence, parent[item] = parent item ID (-1 at the top)
+    """
+    support_of = {frozenset(itemset): support for itemset, support in zip(itemsets, supports)}
+
+    def expected_confidence(ante, cons, replace):
+        general_ante = frozenset(parent[item] if item in replace else item for item in ante)
+        general_cons = frozenset(parent[item] if item in replace else item for item in cons)
+        if len(general_ante) < len(ante) or len(general_cons) < len(cons) or general_ante & general_cons:
+            return None  # two items share a parent: not an ancestor rule of the same shape
+        both, base = support_of.get(general_ante | general_cons), support_of.get(general_ante)
+        if both is None or base is None:
+            return None
+        expected = both / base
+        for item in cons & replace:
+            expected *= support_of[frozenset([item])] / support_of[frozenset([parent[item]])]
+        return expected
+
+    keep = np.ones(len(rules), dtype=bool)
+    for row, (ante, cons, confidence) in enumerate(zip(rules['antecedent_ids'], rules['consequent_ids'],
+                                                       rules['confidence'])):
+        ante, cons = frozenset(ante), frozenset(cons)
+        items = [item for item in ante | cons if parent[item] >= 0]
+        candidates = [{item} for item in items]
+        if len(items) > 1 and len(items) == len(ante) + len(cons):
+            candidates.append(set(items))
+        for replace in candidates:
+            expected = expected_confidence(ante, cons, replace)
+            if expected is not None and confidence < min_interest * expected:
+                keep[row] = False
+                break
+    return rules[keep]
+
+# =============================================================================
+# SEQUENTIAL PATTERN MINING (PREFIXSPAN) OVER HOUSEHOLD HISTORIES
+# =============================================================================
+
+class SequenceDatabase:
+    """
+    Basket sequence of every household in flat (CSR-like) arrays.
+
+    Sequence s holds the events (baskets) seq_start[s]:seq_start[s+1] in
+    purchase order (DAY, TRANS_TIME); event e holds the sorted, unique item
+    IDs item[event_start[e]:event_start[e+1]] and happened on day[e].
+    """
+
+    def __init__(self, seq_start, event_start, item, day, labels, keys):
+        self.seq_start = seq_start
+        self.event_start = event_start
+        self.item = item
+        self.day = day
+        self.labels = list(labels)
+        self.keys = keys  # household key per sequence
+        self.event_seq = np.repeat(np.arange(len(seq_start) - 1), np.diff(seq_start))
+        self.item_event = np.repeat(np.arange(len(event_start) - 1), np.diff(event_start))
+
+    def __len__(self):
+        return len(self.seq_start) - 1
+
+    @property
+    def n_events(self):
+        return len(self.event_start) - 1
+
+    @classmethod
+    def from_rows(cls, households, baskets, days, times, items, labels):
+        """Build from aligned transaction rows (any order, duplicate basket items allowed)."""
+        order = np.lexsort((items, baskets, times, days, households))
+        households, baskets, days, items = households[order], baskets[order], days[order], items[order]
+        first = np.ones(len(items), dtype=bool)
+        first[1:] = (baskets[1:] != baskets[:-1]) | (items[1:] != items[:-1])
+        households, baskets, days, items = households[first], baskets[first], days[first], items[first]
+
+        event_rows = np.flatnonzero(np.r_[True, baskets[1:] != baskets[:-1]]) if len(items) else np.empty(0, int)
+        event_households = households[event_rows]
+        seq_events = np.flatnonzero(np.r_[True, event_households[1:] != event_households[:-1]]) \
+            if len(event_rows) else np.empty(0, int)
+        return cls(np.append(seq_events, len(event_rows)), np.append(event_rows, len(items)),
+                   items.astype(np.int64), days[event_rows].astype(np.int64), labels, event_households[seq_events])
+
+    def item_support(self):
+        """Number of sequences containing each item."""
+        n_items = len(self.labels)
+        pairs = np.unique(self.event_seq[self.item_event] * n_items + self.item)
+        return np.bincount(pairs % n_items, minlength=n_items)
+
+    def frequent(self, min_count):
+        """Copy without items in fewer than `min_count` sequences; item IDs become support ranks (0 = most frequent)."""
+        support = self.item_support()
+        order = np.argsort(-support, kind='stable')
+        order = order[support[order] >= min_count]
+        rank = np.full(len(self.labels), -1, dtype=np.int64)
+        rank[order] = np.arange(len(order))
+        item = rank[self.item]
+        keep = item >= 0
+        item, item_event = item[keep], self.item_event[keep]
+        by_event = np.lexsort((item, item_event))
+        event_start = np.zeros(self.n_events + 1, dtype=np.int64)
+        np.cumsum(np.bincount(item_event, minlength=self.n_events), out=event_start[1:])
+        return SequenceDatabase(self.seq_start, event_start, item[by_event], self.day,
+                                [self.labels[i] for i in order], self.keys)
+
+    def window_end(self, max_gap=None):
+        """
+        Per event e: end (exclusive) of the events that may follow e in a
+        pattern, i.e. the later events of its sequence at most `max_gap` days after it.
+        """
+        seq_end = self.seq_start[1:][self.event_seq]
+        if max_gap is None or not len(self.day):
+            return seq_end
+        day = self.day - self.day.min()
+        key = self.event_seq * (int(day.max()) + max_gap + 1) + day  # sorted: sequences in order, days ascending
+        return np.searchsorted(key, key + max_gap, side='right')
+
+
+def load_household_sequences(product_level='COMMODITY_DESC', chunk_size=250_000, progress_callback=None):
+    """
+    Basket sequences of all households from one pass over `transactions`.
+
+    Products map to item IDs at `product_level` with one array lookup (as in
+    `load_basket_leaves`); the rows are put in purchase order
+    (household, DAY, TRANS_TIME, BASKET_ID) in memory instead of by SQLite.
+
+    Returns
+    -------
+    (SequenceDatabase, error)
+    """
+    products, err = db.get_product_hierarchy([product_level])
+    if err:
+        return None, err
+    product_item, labels = pd.factorize(products[product_level])
+    product_index = pd.Index(products['PRODUCT_ID'])
+
+    columns = {'household_key': [], 'BASKET_ID': [], 'DAY': [], 'TRANS_TIME': []}
+    items, rows = [], 0
+    with tracing.span("sequences.load", products=len(products)) as span:
+        for chunk in db.iter_household_events(chunk_size):
+            position = product_index.get_indexer(chunk['PRODUCT_ID'])
+            known = position >= 0
+            for name, values in columns.items():
+                values.append(chunk[name].fillna(0).to_numpy(dtype=np.int64)[known])
+            items.append(product_item[position[known]])
+            rows += len(chunk)
+            if progress_callback:
+                progress_callback(rows)
+        span.set(rows=rows)
+    if not items:
+        items = [np.empty(0, dtype=np.int64)]
+        columns = {name: [np.empty(0, dtype=np.int64)] for name in columns}
+    with tracing.span("sequences.build") as span:
+        sequences = SequenceDatabase.from_rows(*(np.concatenate(columns[name]) for name in columns),
+                                               np.concatenate(items), labels)
+        span.set(sequences=len(sequences), events=sequences.n_events)
+    return sequences, None
+
+
+def _ranges(starts, stops):
+    """Concatenation of arange(start, stop) over all pairs (empty ranges allowed)."""
+    lengths = stops - starts
+    total = int(lengths.sum())
+    if total == 0:
+        return np.empty(0, dtype=np.int64)
+    offsets = np.cumsum(lengths) - lengths
+    return np.repeat(starts - offsets, lengths) + np.arange(total)
+
+
+class PrefixSpan:
+    """
+    PrefixSpan over a SequenceDatabase with pseudo-projection.
+
+    A projected database is the sorted array of events where an occurrence of
+    the current prefix ends. Under a max-gap constraint every occurrence
+    matters (the next element must follow within `max_gap` days of the
+    previous one), so all of them are kept, not only the first per sequence.
+    Extensions are counted once per sequence:
+
+    - itemset extension: item > last item, in an event where the prefix ends
+    - sequence extension: item in a later event inside the gap window; the
+      windows of one sequence are merged, so each event is scanned once
+    """
+
+    def __init__(self, sequences, min_count, max_gap=None, max_len=None):
+        self.sequences = sequences
+        self.min_count = min_count
+        self.max_len = max_len
+        self.n_items = len(sequences.labels)
+        self.window = sequences.window_end(max_gap)
+
+    def _frequent_extensions(self, positions, with_events=True):
+        """
+        {item: (support, sorted events holding it)} for the frequent items at
+        `positions` (ascending); events are None when not `with_events`.
+        """
+        if not len(positions):
+            return {}
+        seqs = self.sequences
+        items = seqs.item[positions]
+        events = seqs.item_event[positions]
+        seq = seqs.event_seq[events]
+        # positions ascend, so every sequence is one run: number the runs and
+        # mark (run, item) pairs instead of sorting them
+        run = np.zeros(len(seq), dtype=np.int64)
+        np.cumsum(seq[1:] != seq[:-1], out=run[1:])
+        seen = np.zeros((int(run[-1]) + 1) * self.n_items, dtype=bool)
+        seen[run * self.n_items + items] = True
+        support = seen.reshape(-1, self.n_items).sum(axis=0)
+        frequent = np.flatnonzero(support >= self.min_count)
+        if not with_events:
+            return {int(item): (int(support[item]), None) for item in frequent}
+        if not len(frequent):
+            return {}
+        keep = support[items] >= self.min_count
+        items, events = items[keep], events[keep]
+        order = np.argsort(items, kind='stable')  # events stay sorted per item
+        items, events = items[order], events[order]
+        bounds = np.searchsorted(items, np.append(frequent, self.n_items))
+        return {int(item): (int(support[item]), events[bounds[i]:bounds[i + 1]]) for i, item in enumerate(frequent)}
+
+    def _itemset_positions(self, ends, last):
+        event_start = self.sequences.event_start
+        positions = _ranges(event_start[ends], event_start[ends + 1])
+        return positions[self.sequences.item[positions] > last]
+
+    def _sequence_positions(self, ends):
+        stops = self.window[ends]
+        starts = ends + 1
+        if len(ends) > 1:  # merge overlapping windows of the same sequence
+            starts[1:] = np.maximum(starts[1:], np.maximum.accumulate(stops)[:-1])
+        starts = np.minimum(starts, stops)
+        event_start = self.sequences.event_start
+        return _ranges(event_start[starts], event_start[stops])
+
+    def _grow(self, pattern, length, ends, results, budget):
+        if self.max_len and length >= self.max_len:
+            return
+        leaves = bool(self.max_len) and length + 1 >= self.max_len  # extensions are not grown further
+        extensions = [
+            (lambda item: pattern[:-1] + (pattern[-1] + (item,),),
+             self._frequent_extensions(self._itemset_positions(ends, pattern[-1][-1]), not leaves)),
+            (lambda item: pattern + ((item,),),
+             self._frequent_extensions(self._sequence_positions(ends), not leaves)),
+        ]
+        for extend, frequent in extensions:
+            for item, (count, item_ends) in frequent.items():
+                if budget is not None and budget.exhausted():
+                    return
+                extended = extend(item)
+                results.append((extended, count))
+                if not leaves:
+                    self._grow(extended, length + 1, item_ends, results, budget)
+
+    def mine_item(self, item, budget=None):
+        """All frequent patterns starting with `item`: [(pattern as tuple of itemsets, count)]."""
+        seqs = self.sequences
+        ends = seqs.item_event[seqs.item == item]
+        count = len(np.unique(seqs.event_seq[ends]))
+        if count < self.min_count:
+            return []
+        results = [(((item,),), count)]
+        self._grow(((item,),), 1, ends, results, budget)
+        return results
+
+
+_sequence_worker = {}
+
+
+def _init_sequence_worker(miner, deadline, stop):
+    _sequence_worker.update(miner=miner, deadline=deadline, stop=stop)
+
+
+def _mine_sequence_prefix(item):
+    deadline = _sequence_worker['deadline']
+    budget = MiningBudget(None if deadline is None else deadline - time.time(),
+                          cancelled=_sequence_worker['stop'].is_set)
+    return _sequence_worker['miner'].mine_item(item, budget), budget.stopped
+
+
+def mine_sequences(sequences, min_count, max_gap=None, max_len=None, n_jobs=1, budget=None):
+    """
+    Frequent sequential patterns (PrefixSpan) of a SequenceDatabase.
+
+    Consecutive elements of a pattern occur in different baskets of the same
+    household, at most `max_gap` days apart (None = any later basket);
+    support counts households. The search space is split by first item and,
+    with `n_jobs` > 1, the parts are mined in worker processes (the
+    sequence arrays are sent once per worker). Items are submitted most
+    frequent first, so the largest projections start early.
+
+    Returns
+    -------
+    (list of (pattern, count), labels) - pattern: tuple of itemsets (tuples of item IDs into `labels`)
+    """
+    frequent = sequences.frequent(min_count)
+    miner = PrefixSpan(frequent, min_count, max_gap, max_len)
+    items = range(len(frequent.labels))
+    results = []
+    if n_jobs <= 1 or len(items) < 2:
+        for item in items:
+            if budget is not None and budget.exhausted():
+                break
+            results.extend(miner.mine_item(item, budget))
+        return results, frequent.labels
+
+    def collect(result):
+        patterns, stopped = result
+        results.extend(patterns)
+        if stopped and budget is not None and budget.stopped is None:
+            budget.stopped = stopped
+
+    run_in_spawn_pool(_mine_sequence_prefix, list(items), _init_sequence_worker, (miner,), n_jobs, budget, collect)
+    return results, frequent.labels
+
+# =============================================================================
+# SLIDING-WINDOW MINING (INCREMENTAL SUPPORT BY DELTA COUNTING)
+# =============================================================================
+
+BITSET_BLOCK_BYTES = 32 * 2**20  # packed AND results held at once when counting itemsets
+
+
+def load_weekly_baskets(product_level='COMMODITY_DESC', chunk_size=250_000, progress_callback=None):
+    """
+    (BASKET_ID, WEEK_NO, item) of every transaction row from one pass over
+    `transactions`, products mapped to item IDs at `product_level` with one
+    array lookup (as in `load_basket_leaves`).
+
+    Returns
+    -------
+    (basket keys, weeks, item IDs, labels, error) - keys, weeks and items aligned per row
+    """
+    empty = np.empty(0, dtype=np.int64)
+    products, err = db.get_product_hierarchy([product_level])
+    if err:
+        return empty, empty, empty, [], err
+    product_item, labels = pd.factorize(products[product_level])
+    product_index = pd.Index(products['PRODUCT_ID'])
+
+    keys, weeks, items, rows = [], [], [], 0
+    with tracing.span("windows.load", products=len(products)) as span:
+        for chunk in db.iter_weekly_basket_products(chunk_size):
+            position = product_index.get_indexer(chunk['PRODUCT_ID'])
+            known = position >= 0
+            keys.append(chunk['basket_key'].to_numpy()[known])
+            weeks.append(chunk['WEEK_NO'].fillna(0).to_numpy(dtype=np.int64)[known])
+            items.append(product_item[position[known]])
+            rows += len(chunk)
+            if progress_callback:
+                progress_callback(rows)
+        span.set(rows=rows)
+    if not keys:
+        return empty, empty, empty, list(labels), None
+    return np.concatenate(keys), np.concatenate(weeks), np.concatenate(items), list(labels), None
+
+
+def group_itemsets(itemsets):
+    """{length: (positions, item ID matrix)} of `itemsets` (tuples of ascending item IDs)."""
+    by_length = {}
+    for position, itemset in enumerate(itemsets):
+        by_length.setdefault(len(itemset), []).append(position)
+    return {length: (np.array(positions, dtype=np.int64), np.array([itemsets[p] for p in positions], dtype=np.int64))
+            for length, positions in by_length.items()}
+
+
+def count_supports(baskets, itemsets, groups=None):
+    """
+    Basket counts of `itemsets` (tuples of ascending item IDs) in `baskets`:
+    single items with one bincount, longer itemsets with packed bit columns,
+    ANDed for all itemsets of one length at once (vectorized
+    `count_itemset_support`). `groups` is `group_itemsets(itemsets)` when
+    the same itemsets are counted repeatedly.
+    """
+    counts = np.zeros(len(itemsets), dtype=np.int64)
+    if not len(itemsets) or not len(baskets):
+        return counts
+    groups = dict(groups if groups is not None else group_itemsets(itemsets))
+
+    singles = groups.pop(1, None)
+    if singles is not None:
+        positions, members = singles
+        counts[positions] = np.bincount(baskets.indices, minlength=int(members.max()) + 1)[members[:, 0]]
+    if not groups:
+        return counts
+
+    needed = np.unique(np.concatenate([members.ravel() for _, members in groups.values()]))
+    row_ids = baskets.row_ids()
+    order = np.argsort(baskets.indices, kind='stable')
+    sorted_items = baskets.indices[order]
+    starts = np.searchsorted(sorted_items, needed, side='left')
+    ends = np.searchsorted(sorted_items, needed, side='right')
+    columns = np.zeros((len(needed), (len(baskets) + 7) // 8), dtype=np.uint8)
+    for row, (start, end) in enumerate(zip(starts, ends)):
+        column = np.zeros(len(baskets), dtype=bool)
+        column[row_ids[order[start:end]]] = True
+        columns[row] = np.packbits(column)
+
+    block = max(1, BITSET_BLOCK_BYTES // columns.shape[1])
+    for positions, members in groups.values():
+        rows = np.searchsorted(needed, members)
+        for start in range(0, len(positions), block):
+            part = rows[start:start + block]
+            packed = columns[part[:, 0]]
+            for j in range(1, part.shape[1]):
+                packed &= columns[part[:, j]]
+            counts[positions[start:start + block]] = _popcount_rows(packed)
+    return counts
+
+
+class WindowSupports:
+    """
+    Supports of the frequent itemsets of a sliding window of baskets, kept up
+    to date by delta counting as baskets enter and leave the window.
+
+    The tracked itemsets are the frequent itemsets F plus their negative
+    border (itemsets outside F whose subsets are all in F, Toivonen). A slide
+    only adds the counts of the tracked itemsets in the entering baskets and
+    subtracts those in the leaving ones. Unless a border itemset becomes
+    frequent, the new F is exactly the frequent part of the tracked set (a
+    new frequent itemset would have a frequent subset on the old border).
+    Otherwise the border is extended around the newly frequent itemsets and
+    the new candidates are counted once over the whole window, level by
+    level like Apriori; the first window is mined that way.
+
+    Itemsets that left the border (a subset is no longer frequent) cannot
+    become frequent and stay tracked until the tracked set has grown by half
+    since the last clean-up.
+    """
+
+    def __init__(self, n_items, min_support, max_len=None):
+        self.n_items = n_items
+        self.min_support = min_support
+        self.max_len = max_len
+        self.counts = {(item,): 0 for item in range(n_items)}  # tracked itemset -> count in the window
+        self.n_baskets = 0
+        self.recounted = 0  # itemsets counted over a whole window (border expansions)
+        self._frequent = set()
+        self._clean_size = n_items
+        self._itemsets, self._groups = None, None  # tracked itemsets grouped for count_supports
+
+    @property
+    def min_count(self):
+        return max(1, int(np.ceil(self.min_support * self.n_baskets)))
+
+    def slide(self, entering=None, leaving=None, window=None):
+        """
+        Add the `entering` and subtract the `leaving` baskets (EncodedBaskets
+        or None); `window()` returns the baskets of the new window, only
+        called when the border has to be extended.
+
+        Returns
+        -------
+        number of itemsets counted over the whole window (0 = pure delta update)
+        """
+        if self._groups is None:
+            self._itemsets = list(self.counts)
+            self._groups = group_itemsets(self._itemsets)
+        itemsets = self._itemsets
+        delta = np.zeros(len(itemsets), dtype=np.int64)
+        for baskets, sign in ((entering, 1), (leaving, -1)):
+            if baskets is not None and len(baskets):
+                delta += sign * count_supports(baskets, itemsets, self._groups)
+                self.n_baskets += sign * len(baskets)
+        for itemset, change in zip(itemsets, delta.tolist()):
+            if change:
+                self.counts[itemset] += change
+        return self._extend_border(window)
+
+    def _extensions(self, added, frequent, neighbors):
+        """
+        Border candidates around the newly frequent itemsets `added`: a + {item}
+        with all subsets frequent (`neighbors`: item -> items it forms a frequent pair with).
+        """
+        frequent_items = {itemset[0] for itemset in frequent if len(itemset) == 1}
+        candidates = set()
+        for itemset in added:
+            if self.max_len and len(itemset) >= self.max_len:
+                continue
+            if len(itemset) == 1:
+                pool = frequent_items - {itemset[0]}
+            else:  # every pair of the candidate must be frequent
+                pool = set.intersection(*(neighbors.get(item, set()) for item in itemset))
+            for item in pool:
+                candidate = tuple(sorted(itemset + (item,)))
+                if candidate in frequent or candidate in candidates or candidate in self.counts:
+                    continue
+                if all(candidate[:j] + candidate[j + 1:] in frequent for j in range(len(candidate))):
+                    candidates.add(candidate)
+        return candidates
+
+    def _extend_border(self, window):
+        min_count = self.min_count
+        frequent = {itemset for itemset, count in self.counts.items() if count >= min_count}
+        added = frequent - self._frequent
+        neighbors = {}
+        recounted = 0
+        while added:
+            pairs = frequent if not neighbors else added
+            for itemset in pairs:
+                if len(itemset) == 2:
+                    neighbors.setdefault(itemset[0], set()).add(itemset[1])
+                    neighbors.setdefault(itemset[1], set()).add(itemset[0])
+            missing = list(self._extensions(added, frequent, neighbors))
+            if not missing:
+                break
+            found = count_supports(window(), missing).tolist()
+            self._track(missing, found)
+            recounted += len(missing)
+            added = {itemset for itemset, count in zip(missing, found) if count >= min_count}
+            frequent |= added
+        self._frequent = frequent
+        self.recounted += recounted
+        if len(self.counts) > 1.5 * self._clean_size:
+            self._drop_stale()
+        return recounted
+
+    def _track(self, itemsets, counts):
+        """Start tracking `itemsets` with their window `counts`."""
+        self.counts.update(zip(itemsets, counts))
+        if self._groups is not None:
+            offset = len(self._itemsets)
+            self._itemsets.extend(itemsets)
+            for length, (positions, members) in group_itemsets(itemsets).items():
+                if length in self._groups:
+                    old_positions, old_members = self._groups[length]
+                    self._groups[length] = (np.concatenate([old_positions, positions + offset]),
+                                            np.concatenate([old_members, members]))
+                else:
+                    self._groups[length] = (positions + offset, members)
+
+    def _drop_stale(self):
+        """Keep only F, single items and itemsets whose subsets are all frequent."""
+        frequent = self._frequent
+        self.counts = {
+            itemset: count for itemset, count in self.counts.items()
+            if len(itemset) == 1 or itemset in frequent
+            or all(itemset[:j] + itemset[j + 1:] in frequent for j in range(len(itemset)))
+        }
+        self._clean_size = len(self.counts)
+        self._groups = None
+
+    def frequent_itemsets(self):
+        """[(itemset, count)] of the frequent itemsets of the current window."""
+        min_count = self.min_count
+        return [(itemset, count) for itemset, count in self.counts.items() if count >= min_count]
+
+# =============================================================================
+# PARTITIONED BASKETS (ONE SHARED ITEM DICTIONARY)
+# =============================================================================
+
+def load_partitioned_baskets(partition_by='STORE_ID', product_level='COMMODITY_DESC', chunk_size=250_000,
+                             progress_callback=None):
+    """
+    (partition, basket, household, DAY, SALES_VALUE, item) of every transaction row from one
+    pass over `transactions`. Products are mapped to item IDs at
+    `product_level` once, so all partitions share one item dictionary and
+    their itemsets and rules are directly comparable.
+
+    Returns
+    -------
+    (rows, labels, error) - rows: DataFrame [partition_key, basket_key, household_key, DAY, SALES_VALUE, item]
+    """
+    columns = ['partition_key', 'basket_key', 'household_key', 'DAY', 'SALES_VALUE', 'item']
+    products, err = db.get_product_hierarchy([product_level])
+    if err:
+        return pd.DataFrame(columns=columns), [], err
+    product_item, labels = pd.factorize(products[product_level])
+    product_index = pd.Index(products['PRODUCT_ID'])
+
+    chunks, rows = [], 0
+    with tracing.span("partitions.load", partition_by=partition_by, products=len(products)) as span:
+        for chunk in db.iter_partitioned_basket_products(partition_by, chunk_size):
+            position = product_index.get_indexer(chunk['PRODUCT_ID'])
+            known = position >= 0
+            chunk = chunk.loc[known, columns[:-1]]
+            chunk['item'] = product_item[position[known]]
+            chunks.append(chunk)
+            rows += len(known)
+            if progress_callback:
+                progress_callback(rows)
+        span.set(rows=rows)
+    if not chunks:
+        return pd.DataFrame(columns=columns), list(labels), None
+    return pd.concat(chunks, ignore_index=True), list(labels), None
+
+# =============================================================================
+# STATISTICALLY BOUNDED SAMPLING
+# =============================================================================
+
+def d_index(basket_sizes):
+    """Largest d such that at least d baskets contain at least d items."""
+    sizes = np.sort(np.asarray(basket_sizes))[::-1]
+    return int(np.count_nonzero(sizes >= np.arange(1, len(sizes) + 1)))
+
+
+def required_sample_size(epsilon, delta, basket_sizes, c=0.5):
+    """
+    Sample size that estimates the support of EVERY itemset within +-epsilon
+    with probability >= 1 - delta (Riondato & Upfal VC-dimension bound):
+
+        n = (c / epsilon^2) * (d + ln(1 / delta))
+
+    `d` is the d-index of the basket sizes, an upper bound of the VC-dimension
+    of the itemset range space, so the bound holds for all itemsets at once
+    (unlike a per-itemset Chernoff/Hoeffding bound with a union bound).
+    """
+    d = d_index(basket_sizes)
+    return int(np.ceil(c / epsilon ** 2 * (d + np.log(1 / delta))))
+
+
+def _popcount(packed):
+    """Number of set bits in a packed uint8 array."""
+    if hasattr(np, 'bitwise_count'):
+        return int(np.bitwise_count(packed).sum())
+    return int(np.unpackbits(packed).sum())
+
+
+def _popcount_rows(packed):
+    """Number of set bits in every row of a packed uint8 matrix."""
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(packed).sum(axis=1, dtype=np.int64)
+    return np.unpackbits(packed, axis=1).sum(axis=1, dtype=np.int64)
+
+
+def count_itemset_support(baskets, itemsets):
+    """
+    Exact basket counts of candidate itemsets over `baskets` (EncodedBaskets).
+
+    Every item is a packed bit column; an itemset count is the popcount of the
+    AND of its columns. Itemsets are processed in lexicographic order so that
+    the AND of the longest shared prefix is reused (one AND per itemset for
+    the downward-closed output of FP-Growth).
+
+    Parameters
+    ----------
+    itemsets : list of tuples of item IDs (into baskets.items)
+    """
+    n = len(baskets)
+    needed = sorted({item for itemset in itemsets for item in itemset})
+    row_ids = baskets.row_ids()
+    order = np.argsort(baskets.indices, kind='stable')
+    sorted_items = baskets.indices[order]
+    starts = np.searchsorted(sorted_items, needed, side='left')
+    ends = np.searchsorted(sorted_items, needed, side='right')
+    columns = {}
+    for item, start, end in zip(needed, starts, ends):
+        column = np.zeros(n, dtype=bool)
+        column[row_ids[order[start:end]]] = True
+        columns[item] = np.packbits(column)
+
+    keyed = sorted((tuple(sorted(itemset)), i) for i, itemset in enumerate(itemsets))
+    counts = np.zeros(len(itemsets), dtype=np.int64)
+    stack = []  # [(item, packed AND of prefix up to item)]
+    for itemset, position in keyed:
+        shared = 0
+        while shared < min(len(stack), len(itemset)) and stack[shared][0] == itemset[shared]:
+            shared += 1
+        del stack[shared:]
+        for item in itemset[shared:]:
+            packed = columns[item] if not stack else np.bitwise_and(stack[-1][1], columns[item])
+            stack.append((item, packed))
+        counts[position] = _popcount(stack[-1][1]) if stack else n
+    return counts
+
+# =============================================================================
+# COST ESTIMATION (MEMORY / TIME PLANNING)
+# =============================================================================
+
+PILOT_BASKETS = 10_000
+NODE_BYTES = 250        # FPTree node: list slots, (parent, item) dict entry, boxed ints
+ITEMSET_BYTES = 300     # frozenset of labels + row of the itemsets frame
+RULE_BYTES = 400        # row of the rules frame incl. formatted labels
+ROW_SECONDS = 4e-6      # SQLite streaming cost per (basket, item) row (out-of-core)
+DENSE_SLOWDOWN = 2.0    # mlxtend fpgrowth on the one-hot frame vs. this FP-tree (measured 1.5-2x)
+
+
+def estimate_mining_costs(baskets, min_support, max_itemsets=50_000, pilot_baskets=PILOT_BASKETS,
+                          chunk_size=250_000, seed=42):
+    """
+    Cost estimates of mining `baskets` (EncodedBaskets) at `min_support`,
+    before running anything expensive.
+
+    Item frequencies give the frequent items and the one-hot matrix size. A
+    pilot FP-Growth on a random sample of `pilot_baskets` baskets (top-k
+    mining capped at `max_itemsets`, so the pilot itself cannot explode)
+    gives the itemset count, FP-tree size and time per basket, which are
+    extrapolated linearly to the full data (tree size and time are upper
+    bounds in practice: trees compress better on more baskets).
+
+    If more than `max_itemsets` itemsets of length >= 2 are frequent at
+    `min_support`, `explosion` is True and `capped_support` is the support at
+    which the pilot reached `max_itemsets` (the lowest safe min_support).
+
+    Returns
+    -------
+    dict with n_baskets, n_items, n_frequent_items, nnz, estimated_itemsets,
+    estimated_rules, explosion, capped_support, tree_nodes, per strategy
+    ('dense' = mlxtend on the one-hot frame, 'sparse' = FP-tree of the CSR
+    baskets, 'out_of_core') memory_bytes and seconds, the per-basket costs of
+    sparse mining on a sample, output_bytes and the pilot stats.
+    """
+    n = len(baskets)
+    n_items = baskets.n_items
+    nnz = len(baskets.indices)
+    counts = baskets.item_counts()
+    min_count = max(1, int(np.ceil(min_support * n)))
+    n_frequent = int((counts >= min_count).sum())
+
+    # Pilot FP-Growth on a sample
+    rng = np.random.default_rng(seed)
+    n_pilot = min(n, pilot_baskets)
+    pilot = baskets if n_pilot == n else baskets.take(np.sort(rng.choice(n, n_pilot, replace=False)))
+    pilot_min_count = max(1, int(np.ceil(min_support * n_pilot)))
+    start = time.perf_counter()
+    tree, _ = build_fp_tree(pilot, pilot_min_count)
+    build_seconds = time.perf_counter() - start
+    itemsets, threshold = mine_top_itemsets(tree, max_itemsets, pilot_min_count)
+    pilot_seconds = time.perf_counter() - start
+
+    explosion = threshold > pilot_min_count
+    scale = n / max(n_pilot, 1)
+    n_itemsets = len(itemsets)
+    n_rules = sum(2 ** len(itemset) - 2 for itemset, _ in itemsets)
+    tree_nodes = int(len(tree) * scale)
+    output_bytes = n_itemsets * ITEMSET_BYTES + n_rules * RULE_BYTES
+    mine_seconds = pilot_seconds * scale
+
+    return {
+        'n_baskets': n,
+        'n_items': n_items,
+        'n_frequent_items': n_frequent,
+        'nnz': nnz,
+        'estimated_itemsets': n_itemsets,
+        'estimated_rules': n_rules,
+        'explosion': explosion,
+        'capped_support': threshold / n_pilot if explosion else None,
+        'tree_nodes': tree_nodes,
+        'pilot': {'baskets': n_pilot, 'tree_nodes': len(tree), 'build_seconds': build_seconds,
+                  'seconds': pilot_seconds, 'min_count': pilot_min_count, 'final_count': threshold},
+        # one-hot bool matrix + the copy fpgrowth makes of it
+        'dense': {'memory_bytes': 2 * n * n_items + output_bytes, 'seconds': mine_seconds * DENSE_SLOWDOWN},
+        # CSR baskets (already in memory) + FP-tree of integer IDs
+        'sparse': {'memory_bytes': nnz * 12 + tree_nodes * NODE_BYTES + output_bytes, 'seconds': mine_seconds},
+        # one chunk of (basket, item) rows + FP-tree; the baskets are not needed in memory
+        'out_of_core': {'memory_bytes': chunk_size * 150 + tree_nodes * NODE_BYTES + output_bytes,
+                        'seconds': mine_seconds + nnz * ROW_SECONDS},
+        # sparse mining of a sample: per-basket share of CSR + tree, per-basket pilot time
+        'sampled_bytes_per_basket': (nnz * 12 + tree_nodes * NODE_BYTES) / max(n, 1),
+        'sampled_seconds_per_basket': pilot_seconds / max(n_pilot, 1),
+        'output_bytes': output_bytes,
+    }
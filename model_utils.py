@@ -1,51 +1,70 @@
+from pathlib import Path
+
+import joblib
 import pandas as pd
-from sklearn.neural_network import MLPClassifier
-from sklearn.model_selection import train_test_split
-from imblearn.under_sampling import RandomUnderSampler
-from imblearn.over_sampling import SMOTE
-from sklearn.metrics import (
-    classification_report, roc_auc_score, 
-    confusion_matrix, roc_curve, ConfusionMatrixDisplay
-)
-import matplotlib.pyplot as plt
-import streamlit as st
 from collections import Counter
 
-@st.cache_data
-def split_and_resample(X, y, method='undersampling'):
+import caching
+import reporting
+import tracing
+
+# sklearn, imblearn dan matplotlib di-import di dalam fungsi yang
+# memakainya: modul ini cukup ringan untuk di-import worker/CLI yang hanya
+# butuh sebagian fungsinya (mis. service.py hanya memuat model tersimpan).
+
+MODEL_PATH = Path(__file__).parent / "datasets" / "artifacts" / "ann_model.joblib"
+
+@tracing.traced()
+def split_and_resample(X, y, method='undersampling', data_key=None):
     """
     Melakukan split data dan resampling (hanya pada data training).
     Aman untuk:
       - Kelas minoritas sangat sedikit (SMOTE bisa error)
       - Fitur hasil one-hot encoding yang bertipe boolean
+
+    `data_key` adalah fingerprint X & y (dataset, target, fitur) sebagai kunci
+    cache, sehingga X dan y tidak di-hash setiap pemanggilan; None = dihitung
+    dari isi X dan y.
     """
+    if data_key is None:
+        data_key = caching.frame_fingerprint(X, y)
+    return _split_and_resample(X, y, method, data_key)
+
+@caching.cache_data
+def _split_and_resample(_X, _y, method, data_key):
+    from sklearn.model_selection import train_test_split
+    from imblearn.under_sampling import RandomUnderSampler
+    from imblearn.over_sampling import SMOTE
 
     # 🔹 Pastikan semua fitur numerik (SMOTE tidak bisa untuk boolean)
     # Jika sebelumnya hasil encode berupa bool, ini akan mengubahnya ke 0.0 / 1.0
-    X = X.astype(float)
+    X = _X.astype(float)
+    y = _y
 
     # 1. Split data menjadi train dan test (Test set asli, imbalanced)
-    X_train_orig, X_test, y_train_orig, y_test = train_test_split(
-        X, y, test_size=0.20, random_state=42, stratify=y
-    )
+    with tracing.span("train_test_split", rows=len(X)):
+        X_train_orig, X_test, y_train_orig, y_test = train_test_split(
+            X, y, test_size=0.20, random_state=42, stratify=y
+        )
 
     # 🔹 Metode Random Under-Sampling
     if method == 'undersampling':
         sampler = RandomUnderSampler(random_state=42)
-        st.write("Menerapkan Random Under-Sampling (RUS) pada data latih...")
-        X_train_res, y_train_res = sampler.fit_resample(X_train_orig, y_train_orig)
+        reporting.write("Menerapkan Random Under-Sampling (RUS) pada data latih...")
+        with tracing.span("undersampling"):
+            X_train_res, y_train_res = sampler.fit_resample(X_train_orig, y_train_orig)
         return X_train_res, y_train_res, X_test, y_test
 
     # 🔹 Metode SMOTE (Oversampling)
     elif method == 'oversampling':
-        st.write("Mencoba menerapkan SMOTE (Over-sampling) pada data latih...")
+        reporting.write("Mencoba menerapkan SMOTE (Over-sampling) pada data latih...")
 
         counter = Counter(y_train_orig)
-        st.write("Distribusi y_train sebelum SMOTE:", dict(counter))
+        reporting.write("Distribusi y_train sebelum SMOTE:", dict(counter))
 
         # Jika hanya ada satu kelas di y_train, SMOTE tidak bisa dipakai
         if len(counter) < 2:
-            st.warning(
+            reporting.warning(
                 "⚠️ Data latih hanya memiliki satu kelas. "
                 "SMOTE tidak bisa dijalankan. Model akan dilatih tanpa resampling."
             )
@@ -57,7 +76,7 @@ def split_and_resample(X, y, method='undersampling'):
 
         # Minimal 2 sampel di kelas minoritas untuk SMOTE
         if minority_count < 2:
-            st.warning(
+            reporting.warning(
                 f"⚠️ Jumlah sampel kelas minoritas di data latih sangat sedikit ({minority_count}). "
                 "SMOTE tidak dijalankan. Model akan dilatih tanpa resampling."
             )
@@ -68,22 +87,32 @@ def split_and_resample(X, y, method='undersampling'):
         if k_neighbors < 1:
             k_neighbors = 1
 
-        st.write(
+        reporting.write(
             f"✅ Menjalankan SMOTE dengan k_neighbors={k_neighbors} "
             f"(kelas minoritas={minority_class}, jumlah={minority_count})"
         )
 
         sampler = SMOTE(random_state=42, k_neighbors=k_neighbors)
-        X_train_res, y_train_res = sampler.fit_resample(X_train_orig, y_train_orig)
+        with tracing.span("smote", k_neighbors=k_neighbors):
+            X_train_res, y_train_res = sampler.fit_resample(X_train_orig, y_train_orig)
         return X_train_res, y_train_res, X_test, y_test
 
     # 🔹 Jika method tidak dikenali → tidak ada resampling
     else:
-        st.write("Metode resampling tidak dikenali. Tidak ada resampling yang diterapkan.")
+        reporting.write("Metode resampling tidak dikenali. Tidak ada resampling yang diterapkan.")
         return X_train_orig, y_train_orig, X_test, y_test
 
-@st.cache_resource
-def train_ann_model(X_train, y_train):
+@tracing.traced("mlp.train")
+def train_ann_model(X_train, y_train, data_key=None):
+    """Latih MLPClassifier; `data_key` = fingerprint data latih (kunci cache), None = dari isi data."""
+    if data_key is None:
+        data_key = caching.frame_fingerprint(X_train, y_train)
+    return _train_ann_model(X_train, y_train, data_key)
+
+@caching.cache_resource
+def _train_ann_model(_X_train, _y_train, data_key):
+    from sklearn.neural_network import MLPClassifier
+
     model = MLPClassifier(
         hidden_layer_sizes=(14,),
         activation='tanh',
@@ -91,7 +120,9 @@ def train_ann_model(X_train, y_train):
         random_state=42,
         early_stopping=True
     )
-    model.fit(X_train, y_train)
+    with tracing.span("mlp.fit", rows=len(_X_train), features=_X_train.shape[1]) as span:
+        model.fit(_X_train, _y_train)
+        span.set(iterations=model.n_iter_)
     return model
 
 def get_predictions(_model, X_data):
@@ -100,7 +131,11 @@ def get_predictions(_model, X_data):
     preds = _model.predict(X_data_reordered)
     return probs, preds
 
+@tracing.traced("evaluate")
 def generate_evaluation_metrics(_model, X_test, y_test):
+    import matplotlib.pyplot as plt
+    from sklearn.metrics import classification_report, roc_auc_score, roc_curve, ConfusionMatrixDisplay
+
     probs, preds = get_predictions(_model, X_test)
     results = {}
 
@@ -143,4 +178,23 @@ def generate_evaluation_metrics(_model, X_test, y_test):
     fig_roc.tight_layout() 
     results['roc_plot'] = fig_roc
 
-    return results
\ No newline at end of file
+    return results
+
+def save_model(model, demographic_features, target_products, path=MODEL_PATH):
+    """
+    Simpan model ANN beserta konteks yang dibutuhkan untuk scoring ulang:
+    fitur demografis yang dipakai (sebelum one-hot) dan produk target.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    joblib.dump({
+        'model': model,
+        'demographic_features': list(demographic_features),
+        'target_products': sorted(target_products),
+    }, path)
+    return path
+
+def load_model(path=MODEL_PATH):
+    """Muat artifact `save_model` (dict: model, demographic_features, target_products), atau None."""
+    path = Path(path)
+    return joblib.load(path) if path.exists() else None
@@ -0,0 +1,232 @@
+"""pipeline.py
+
+Headless batch pipeline for nightly runs. Runs the same chain as the
+dashboard without Streamlit and writes the results to datasets/artifacts/,
+where the dashboard and service.py pick them up:
+
+    load_all_data -> get_analysis_data -> association rules / RFM / ANN
+                                      (+ sequential patterns per household)
+                                      (+ rules / RFM per store, written to partition_results.db)
+
+Progress and messages go through `reporting` (here: the `logging` module).
+Each run is traced (see tracing.py); the per-stage timings are written to
+datasets/artifacts/pipeline_trace.json (Chrome trace format).
+
+Usage:
+    python pipeline.py [--build-db] [--warm-cache] [--steps rules rfm ann sequences partitions]
+                       [--group-by BASKET_ID] [--level COMMODITY_DESC]
+                       [--min-support 0.01] [--min-confidence 0.3] [--min-lift 1.1]
+                       [--time-limit 600] [--target "ITEM A,ITEM B"] [--resample undersampling]
+                       [--seq-support 0.1] [--max-gap 14] [--seq-max-len 3] [--jobs 4]
+                       [--partition-by STORE_ID] [--partition-support 0.02] [--min-baskets 200]
+                       [--trace-memory]
+"""
+
+import argparse
+import json
+import logging
+import sys
+import time
+
+from sklearn.metrics import roc_auc_score
+
+import caching
+import database as db
+import model_utils as mu
+import preprocessing as pp
+import reporting
+import tracing
+
+KEY_COL = "household_key"
+PRODUCT_LIST_COL = "product_list"
+DAY_COL = "DAY"
+DEMO_FEATURES = [col for col in db.DEMOGRAPHIC_COLUMNS if col != 'phone_number']
+SUMMARY_PATH = pp.ARTIFACTS_DIR / "pipeline_summary.json"
+TRACE_PATH = pp.ARTIFACTS_DIR / "pipeline_trace.json"
+
+
+def build_database():
+    bar = reporting.progress(0, text="Building database from CSV files...")
+    summary = db.load_all_data(progress_callback=lambda pct, msg: bar.progress(int(pct * 100), text=msg))
+    bar.empty()
+    if summary.get('error'):
+        raise RuntimeError(summary['error'])
+    return None, {table: info['count'] for table, info in summary.items()}
+
+
+def warm_cache(budget):
+    """Fill the dashboard's disk cache (datasets/cache/) with its first queries."""
+    bar = reporting.progress(0, text="Warming cache...")
+    report = db.warm_cache(time_budget=budget,
+                           progress_callback=lambda pct, msg: bar.progress(int(pct * 100), text=msg))
+    bar.empty()
+    statuses = [task['status'] for task in report['tasks']]
+    return None, {status: statuses.count(status) for status in sorted(set(statuses))}
+
+
+def load_analysis_data(args):
+    """Returns (df, data_key): the analysis frame and its cache fingerprint."""
+    data_key = db.analysis_fingerprint(args.group_by, args.level)
+    df, err = db.get_analysis_data(group_by=args.group_by, product_level=args.level)
+    if err:
+        raise RuntimeError(f"Failed to load analysis data: {err}")
+    return (df, data_key), {'rows': len(df), 'group_by': args.group_by, 'level': args.level,
+                            'fingerprint': data_key}
+
+
+def run_rules(df, args):
+    rules, _ = pp.run_association_rules(
+        df, PRODUCT_LIST_COL,
+        min_support=args.min_support,
+        min_confidence=args.min_confidence,
+        min_lift=args.min_lift,
+        time_limit_s=args.time_limit
+    )
+    if rules is None or rules.empty:
+        return None, {'rules': 0}
+    path = pp.save_rules(rules)
+    return rules, {'rules': len(rules), 'path': str(path), 'partial': rules.attrs.get('partial')}
+
+
+def run_rfm(df, data_key):
+    rfm = pp.calculate_rfm(df, KEY_COL, DAY_COL, PRODUCT_LIST_COL, data_key=data_key)
+    path = pp.save_rfm(rfm)
+    return rfm, {'households': len(rfm), 'segments': rfm['Segment'].value_counts().to_dict(), 'path': str(path)}
+
+
+def run_sequences(args):
+    patterns = pp.run_sequential_patterns(
+        product_level=args.level,
+        min_support=args.seq_support,
+        max_gap_days=args.max_gap or None,
+        max_len=args.seq_max_len,
+        n_jobs=args.jobs,
+        time_limit_s=args.time_limit
+    )
+    if patterns.empty:
+        return None, {'patterns': 0}
+    path = pp.save_sequences(patterns)
+    return patterns, {'patterns': len(patterns), 'multi_step': int((patterns['elements'] > 1).sum()),
+                      'path': str(path), 'partial': patterns.attrs.get('partial')}
+
+
+def run_partitions(args):
+    summary, rules, rfm = pp.run_partitioned_analysis(
+        partition_by=args.partition_by,
+        product_level=args.level,
+        min_baskets=args.min_baskets,
+        min_support=args.partition_support,
+        min_confidence=args.min_confidence,
+        min_lift=args.min_lift,
+        n_jobs=args.jobs,
+        time_limit_s=args.time_limit
+    )
+    if summary.empty:
+        return None, {'partitions': 0}
+    return summary, {'partitions': len(summary), 'status': summary['status'].value_counts().to_dict(),
+                     'rules': len(rules), 'households': len(rfm), 'run_id': summary.attrs.get('run_id'),
+                     'path': str(db.PARTITION_RESULTS_PATH), 'partial': summary.attrs.get('partial')}
+
+
+def run_ann(df, data_key, target_list, resample):
+    """Same steps as the ANN Training page; saves the model artifact."""
+    data_target = pp.create_target_variable(df.copy(), PRODUCT_LIST_COL, target_list)
+    data_enc = pp.encode_features(data_target, DEMO_FEATURES)
+    X_full = data_enc[[col for col in data_enc.columns if col not in data_target.columns]]
+    y_full = data_enc['PX']
+
+    split_key = caching.fingerprint(data_key, target_list, DEMO_FEATURES)
+    X_train, y_train, X_test, y_test = mu.split_and_resample(X_full, y_full, method=resample, data_key=split_key)
+    model = mu.train_ann_model(X_train, y_train, data_key=caching.fingerprint(split_key, resample))
+    probs, _ = mu.get_predictions(model, X_test)
+    auc = roc_auc_score(y_test, probs) if y_test.nunique() > 1 else None
+    path = mu.save_model(model, DEMO_FEATURES, target_list)
+    return model, {'target': sorted(target_list), 'positives': int(y_full.sum()), 'test_auc': auc, 'path': str(path)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[2])
+    parser.add_argument('--build-db', action='store_true', help="(re)build datasets/retail.db from the CSV files")
+    parser.add_argument('--warm-cache', action='store_true',
+                        help="precompute the dashboard's first queries into datasets/cache/")
+    parser.add_argument('--warm-budget', type=float, default=300, help="time budget for --warm-cache (seconds)")
+    parser.add_argument('--steps', nargs='+', choices=['rules', 'rfm', 'ann', 'sequences', 'partitions'],
+                        default=['rules', 'rfm', 'ann'])
+    parser.add_argument('--group-by', default='BASKET_ID', choices=['BASKET_ID', 'household_key'])
+    parser.add_argument('--level', default='COMMODITY_DESC')
+    parser.add_argument('--min-support', type=float, default=0.01)
+    parser.add_argument('--min-confidence', type=float, default=0.3)
+    parser.add_argument('--min-lift', type=float, default=1.1)
+    parser.add_argument('--time-limit', type=float,
+                        help="wall-clock limit for rule mining in seconds (partial rules when exceeded)")
+    parser.add_argument('--seq-support', type=float, default=0.1,
+                        help="minimum share of households for sequential patterns")
+    parser.add_argument('--max-gap', type=int, default=14,
+                        help="max days between consecutive pattern steps (0 = no limit)")
+    parser.add_argument('--seq-max-len', type=int, default=3, help="max items per sequential pattern")
+    parser.add_argument('--jobs', type=int,
+                        help="worker processes for sequential / partitioned mining (default: all CPUs)")
+    parser.add_argument('--partition-by', default='STORE_ID', choices=db.PARTITION_COLUMNS,
+                        help="column the partitions step splits baskets by")
+    parser.add_argument('--partition-support', type=float, default=0.02,
+                        help="minimum support within each partition")
+    parser.add_argument('--min-baskets', type=int, default=200, help="skip partitions with fewer baskets")
+    parser.add_argument('--target', help="comma-separated target products for the ANN "
+                                         "(default: antecedent of the strongest rule)")
+    parser.add_argument('--resample', default='undersampling', choices=['undersampling', 'oversampling'])
+    parser.add_argument('--trace-memory', action='store_true',
+                        help="also record the Python heap peak per stage (tracemalloc, slower)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    summary = {'started': time.strftime('%Y-%m-%d %H:%M:%S'), 'args': vars(args), 'steps': {}}
+
+    def step(name, func, *func_args):
+        reporting.info(f"== {name} ==")
+        start = time.perf_counter()
+        with tracing.span(f"step:{name}"):
+            result, info = func(*func_args)
+        summary['steps'][name] = {'seconds': round(time.perf_counter() - start, 2), **info}
+        return result
+
+    run = tracing.trace("pipeline", memory=args.trace_memory)
+    try:
+        with run:
+            if args.build_db or not db.database_exists():
+                step('build_db', build_database)
+            if args.warm_cache:
+                caching.set_backend(caching.TieredCache(version=db.get_dataset_version))
+                step('warm_cache', warm_cache, args.warm_budget)
+            df, data_key = step('load_analysis_data', load_analysis_data, args)
+
+            rules = step('rules', run_rules, df, args) if 'rules' in args.steps else None
+            if 'rfm' in args.steps:
+                step('rfm', run_rfm, df, data_key)
+            if 'sequences' in args.steps:
+                step('sequences', run_sequences, args)
+            if 'partitions' in args.steps:
+                step('partitions', run_partitions, args)
+            if 'ann' in args.steps:
+                if args.target:
+                    target_list = {item.strip().upper() for item in args.target.split(',') if item.strip()}
+                elif rules is not None:
+                    target_list = set(rules.iloc[0]['antecedents'])
+                else:
+                    target_list = None
+                if target_list:
+                    step('ann', run_ann, df, data_key, target_list, args.resample)
+                else:
+                    reporting.warning("ANN skipped: no --target given and no rules to pick one from.")
+    except RuntimeError as e:
+        reporting.error(str(e))
+        sys.exit(1)
+    finally:
+        summary['trace'] = str(run.save(TRACE_PATH))
+        SUMMARY_PATH.parent.mkdir(parents=True, exist_ok=True)
+        SUMMARY_PATH.write_text(json.dumps(summary, indent=2, ensure_ascii=False, default=str))
+
+    reporting.success(f"Pipeline finished, summary written to {SUMMARY_PATH}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,32 @@
 # preprocessing.py
+import os
+import time
+from collections import Counter
+from pathlib import Path
+
+import joblib
 import pandas as pd
-import ast
-import streamlit as st
-from mlxtend.preprocessing import TransactionEncoder
-from mlxtend.frequent_patterns import fpgrowth, association_rules
+import numpy as np
+import caching
+import database as db
+import mining
+import reporting
+import tracing
+
+ARTIFACTS_DIR = Path(__file__).parent / "datasets" / "artifacts"
+RULES_PATH = ARTIFACTS_DIR / "association_rules.joblib"
+RFM_PATH = ARTIFACTS_DIR / "rfm_segments.joblib"
+SEQUENCES_PATH = ARTIFACTS_DIR / "sequential_patterns.joblib"
+
+# Anggaran default planner FP-Growth (lihat `plan_association_rules`)
+FP_MEMORY_BUDGET_MB = 1024
+FP_TIME_BUDGET_S = 120
+FP_MAX_ITEMSETS = 50_000
+# Mode top-k selalu memakai anggaran: mining turun sampai `min_count`, skor ke-k tidak memangkasnya
+TOP_K_TIME_LIMIT_S = 60
+TOP_K_MAX_ITEMSETS = 200_000
 
-@st.cache_data
+@caching.cache_data
 def load_and_preprocess_data(uploaded_file):
     """
     Memuat dan membersihkan data. Tidak ada renaming - menggunakan kolom asli.
@@ -17,153 +38,360 @@ def load_and_preprocess_data(uploaded_file):
     
     return df
 
+class EncodedBaskets:
+    """
+    Keranjang belanja yang sudah di-dictionary-encode dalam layout CSR.
+
+    Item basket ke-i adalah `items[indices[indptr[i]:indptr[i + 1]]]` (ID item
+    terurut & unik per basket). List Python hanya dibuat saat `to_lists()` dipanggil.
+    """
+
+    def __init__(self, indptr, indices, items, index=None):
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int32)
+        self.items = np.asarray(items, dtype=object)
+        self.index = index if index is not None else pd.RangeIndex(len(self.indptr) - 1)
+
+    def __len__(self):
+        return len(self.indptr) - 1
+
+    @property
+    def n_baskets(self):
+        return len(self)
+
+    @property
+    def n_items(self):
+        return len(self.items)
+
+    def basket_sizes(self):
+        """Jumlah item unik per basket."""
+        return np.diff(self.indptr)
+
+    def item_counts(self):
+        """Jumlah basket yang memuat setiap item (urut sesuai `items`)."""
+        return np.bincount(self.indices, minlength=self.n_items)
+
+    def row_ids(self):
+        """Nomor basket untuk setiap entri `indices`."""
+        return np.repeat(np.arange(len(self), dtype=np.int64), self.basket_sizes())
+
+    def item_codes(self, labels):
+        """ID item untuk label (sudah dinormalisasi), -1 jika tidak dikenal."""
+        normalized = [str(label).strip().upper() for label in labels]
+        codes = pd.Index(self.items).get_indexer(normalized)
+        return codes
+
+    def take(self, positions):
+        """Subset basket berdasarkan posisi baris (mis. untuk sampling)."""
+        positions = np.asarray(positions, dtype=np.int64)
+        starts, ends = self.indptr[positions], self.indptr[positions + 1]
+        sizes = ends - starts
+        indptr = np.zeros(len(positions) + 1, dtype=np.int64)
+        np.cumsum(sizes, out=indptr[1:])
+        offsets = np.repeat(starts - indptr[:-1], sizes)
+        indices = self.indices[np.arange(indptr[-1]) + offsets]
+        return EncodedBaskets(indptr, indices, self.items, index=self.index[positions])
+
+    def select_items(self, mask):
+        """Basket yang hanya memuat item dengan `mask[id_item]` True (ID item tidak berubah)."""
+        keep = np.asarray(mask, dtype=bool)[self.indices]
+        indptr = np.zeros(len(self) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.row_ids()[keep], minlength=len(self)), out=indptr[1:])
+        return EncodedBaskets(indptr, self.indices[keep], self.items, index=self.index)
+
+    def non_empty(self):
+        """Hanya basket yang memiliki minimal satu item."""
+        return self.take(np.flatnonzero(self.basket_sizes() > 0))
+
+    def contains_all(self, labels):
+        """Boolean array: basket memuat SEMUA label target."""
+        codes = self.item_codes(labels)
+        if (codes < 0).any():
+            return np.zeros(len(self), dtype=bool)
+        hits = np.isin(self.indices, codes)
+        counts = np.bincount(self.row_ids()[hits], minlength=len(self))
+        return counts == len(set(codes.tolist()))
+
+    def to_dense(self):
+        """Matrix boolean basket x item (format one-hot mlxtend)."""
+        dense = np.zeros((len(self), self.n_items), dtype=bool)
+        dense[self.row_ids(), self.indices] = True
+        return dense
+
+    def to_frame(self):
+        """DataFrame one-hot (kolom = label item) untuk `fpgrowth`."""
+        return pd.DataFrame(self.to_dense(), columns=self.items)
+
+    def to_csr(self):
+        """scipy.sparse.csr_matrix boolean basket x item."""
+        from scipy.sparse import csr_matrix
+        data = np.ones(len(self.indices), dtype=bool)
+        return csr_matrix((data, self.indices, self.indptr), shape=(len(self), self.n_items))
+
+    def to_lists(self):
+        """List label per basket (dibuat lazily, hanya untuk konsumen yang butuh list)."""
+        labels = self.items[self.indices]
+        return [labels[a:b].tolist() for a, b in zip(self.indptr[:-1], self.indptr[1:])]
+
+
+def _holds_python_lists(values):
+    """True jika Series berisi list/tuple/set (hasil `convert_product_list`)."""
+    if values.dtype != object:
+        return False
+    first = values.first_valid_index()
+    return first is not None and isinstance(values.loc[first], (list, tuple, set))
+
+def _tokenize_items(text):
+    """
+    Split (koma) + strip + upper-case semua item dari Series string sekaligus.
+    Mengembalikan (row, code, items) dengan `items` terurut seperti kolom
+    TransactionEncoder. Memakai Arrow compute (pyarrow ikut terpasang bersama
+    Streamlit); fallback ke pandas string methods jika tidak tersedia.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.compute as pc
+    except ImportError:
+        parts = text.str.split(',').explode().dropna().str.strip().str.upper()
+        parts = parts[parts != '']
+        codes, items = pd.factorize(parts, sort=True)
+        return parts.index.to_numpy(dtype=np.int64), codes, np.asarray(items, dtype=object)
+    
+    lists = pc.split_pattern(pc.utf8_upper(pa.array(text.to_numpy(dtype=object), type=pa.string())), ',')
+    tokens = pc.utf8_trim_whitespace(pc.list_flatten(lists))
+    keep = pc.not_equal(tokens, '')
+    rows = pc.filter(pc.list_parent_indices(lists), keep).to_numpy()
+    encoded = pc.dictionary_encode(pc.filter(tokens, keep))
+    labels = np.asarray(encoded.dictionary.to_pylist(), dtype=object)
+    
+    # dictionary_encode memakai urutan kemunculan -> remap ke urutan alfabet
+    order = np.argsort(labels)
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = np.arange(len(order))
+    return rows.astype(np.int64), rank[encoded.indices.to_numpy()], labels[order]
+
+@tracing.traced("encode.parse")
+def parse_product_lists(values):
+    """
+    Parser vektor untuk kolom produk -> `EncodedBaskets`.
+    Split, strip, upper-case dan dictionary-encode dilakukan sekaligus (Arrow
+    compute / pandas string methods), tanpa closure per baris atau `ast.literal_eval`.
+
+    Mendukung format yang sama dengan `convert_product_list`:
+    1. Python list string: "['Roti', 'Susu']"
+    2. Comma-separated string (dari GROUP_CONCAT): "Roti,Susu,Teh"
+    Kolom yang sudah berisi list Python juga diterima.
+    Catatan: koma di dalam nama item pada format 1 ikut dipisah.
+    """
+    if isinstance(values, EncodedBaskets):
+        return values
+    
+    values = pd.Series(values)
+    original_index = values.index
+    values = values.reset_index(drop=True)
+    n_rows = len(values)
+    
+    if _holds_python_lists(values):
+        # Gabungkan kembali ke format GROUP_CONCAT agar normalisasi identik
+        values = values.map(lambda items: ','.join(str(item) for item in items if item),
+                            na_action='ignore')
+    
+    text = values.astype(object).where(values.notna(), '').astype(str)
+    bracket = text.str.startswith('[') & text.str.endswith(']')
+    if bracket.any():
+        # "['Roti', 'Susu']" -> "Roti, Susu" (hapus kurung & tanda kutip pembungkus)
+        inner = text[bracket].str.strip().str.slice(1, -1)
+        text[bracket] = inner.str.replace(r"""(^|,)\s*['"]|['"]\s*(?=,|$)""", r"\1", regex=True)
+    
+    rows, codes, items = _tokenize_items(text)
+    n_items = max(len(items), 1)
+    
+    # Unik per basket + urut berdasarkan (basket, item): sort + buang duplikat
+    keys = np.sort(rows * n_items + codes)
+    if len(keys):
+        first = np.empty(len(keys), dtype=bool)
+        first[0] = True
+        np.not_equal(keys[1:], keys[:-1], out=first[1:])
+        keys = keys[first]
+    rows, indices = np.divmod(keys, n_items)
+    indptr = np.zeros(n_rows + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=n_rows), out=indptr[1:])
+    
+    return EncodedBaskets(indptr, indices, items, index=original_index)
+
+@tracing.traced()
 def convert_product_list(df, product_list_col):
     """
     Mengonversi kolom produk (string) menjadi list Python asli.
     Mendukung dua format:
     1. Python list string: "['Roti', 'Susu']" -> ['Roti', 'Susu']
     2. Comma-separated string (dari GROUP_CONCAT): "Roti,Susu,Teh" -> ['Roti', 'Susu', 'Teh']
-    """
-    def parse_product_string(val):
-        # Handle None or NaN
-        if pd.isna(val) or val is None:
-            return []
-        
-        val = str(val).strip()
-        
-        # Jika kosong
-        if not val:
-            return []
-        
-        # Coba format 1: Python list string "['A', 'B']"
-        if val.startswith('[') and val.endswith(']'):
-            try:
-                result = ast.literal_eval(val)
-                if isinstance(result, list):
-                    return [str(item).strip().upper() for item in result if item]
-            except:
-                pass
-        
-        # Format 2: Comma-separated string "A,B,C" (dari GROUP_CONCAT)
-        items = [item.strip().upper() for item in val.split(',') if item.strip()]
-        return items
     
+    Hanya untuk konsumen yang masih butuh list; analisis lain sebaiknya memakai
+    `parse_product_lists` langsung.
+    """
     try:
-        st.caption(f"🔄 Mengonversi {len(df):,} baris data produk...")
-        df[product_list_col] = df[product_list_col].apply(parse_product_string)
-        
-        # Verifikasi bahwa hasilnya adalah list
-        sample = df[product_list_col].iloc[0] if len(df) > 0 else []
-        if not isinstance(sample, list):
-            raise ValueError("Hasil konversi bukan list.")
+        reporting.caption(f"🔄 Mengonversi {len(df):,} baris data produk...")
+        baskets = parse_product_lists(df[product_list_col])
+        df[product_list_col] = baskets.to_lists()
         
         # Info ke user
-        non_empty = df[product_list_col].apply(len).gt(0).sum()
-        st.caption(f"✅ Berhasil konversi {non_empty:,} baris dengan produk valid.")
+        non_empty = int((baskets.basket_sizes() > 0).sum())
+        reporting.caption(f"✅ Berhasil konversi {non_empty:,} baris dengan produk valid.")
             
     except Exception as e:
-        st.error(f"""
+        reporting.error(f"""
         ❌ Gagal mengonversi kolom '{product_list_col}'.
         Error: {e}
         """)
-        st.stop()
+        raise ValueError(f"Gagal mengonversi kolom '{product_list_col}': {e}") from e
     
     return df
 
-def run_association_rules(_df, product_list_col, min_support=0.01, min_confidence=0.3, min_lift=1.1):
+def run_association_rules(_df, product_list_col, min_support=0.01, min_confidence=0.3, min_lift=1.1,
+                          memory_budget_mb=FP_MEMORY_BUDGET_MB, time_limit_s=None):
     """
     Menjalankan algoritma FP-Growth untuk mencari pola pembelian.
     
     Parameters:
     -----------
     _df : DataFrame - Data dengan kolom product_list
-    product_list_col : str - Nama kolom yang berisi list produk
+    product_list_col : str - Nama kolom produk (string GROUP_CONCAT atau list)
     min_support : float - Minimum support (default 0.01 = 1%)
     min_confidence : float - Minimum confidence (default 0.3 = 30%)
     min_lift : float - Minimum lift (default 1.1)
+    memory_budget_mb : float - Batas ukuran matrix one-hot; jika terlampaui, mining
+                       dibatalkan (gunakan `plan_association_rules`). None = tanpa batas
+    time_limit_s : float - Batas waktu mining (detik). Jika diisi, mining memakai engine
+                   FP-tree yang bisa dihentikan dan mengembalikan hasil parsial saat
+                   waktu habis (fpgrowth mlxtend tidak bisa diinterupsi). None = tanpa batas
     """
+    budget = _mining_budget(time_limit_s) if time_limit_s is not None else None
+    
     # Progress feedback
-    progress_bar = st.progress(0, text="🔄 Memulai proses FP-Growth...")
+    progress_bar = reporting.progress(0, text="🔄 Memulai proses FP-Growth...")
     
-    # 1. Ambil data transaksi yang valid (List tidak kosong)
+    # 1. Parse & encode basket (tanpa list Python), ambil yang tidak kosong
     progress_bar.progress(5, text="📋 Memvalidasi data transaksi...")
-    mask = _df[product_list_col].apply(lambda x: isinstance(x, list) and len(x) > 0)
-    transactions = _df[product_list_col][mask].tolist()
+    baskets = parse_product_lists(_df[product_list_col]).non_empty()
     
-    if not transactions:
+    if baskets.n_baskets == 0:
         progress_bar.empty()
-        st.warning("⚠️ Tidak ada data transaksi yang valid untuk diproses.")
+        reporting.warning("⚠️ Tidak ada data transaksi yang valid untuk diproses.")
         return pd.DataFrame(), []
     
     # Diagnostik: hitung jumlah item unik
-    all_items = set(item for tx in transactions for item in tx)
-    n_items = len(all_items)
-    n_transactions = len(transactions)
+    n_items = baskets.n_items
+    n_transactions = baskets.n_baskets
     
-    st.caption(f"📊 Statistik: {n_transactions:,} transaksi, {n_items:,} item unik")
+    reporting.caption(f"📊 Statistik: {n_transactions:,} transaksi, {n_items:,} item unik")
     
     # Peringatan jika data terlalu besar
     if n_items > 500:
-        st.warning(f"⚠️ Jumlah item unik sangat banyak ({n_items:,}). Proses mungkin lambat. Pertimbangkan menggunakan level produk yang lebih tinggi (misal: DEPARTMENT).")
+        reporting.warning(f"⚠️ Jumlah item unik sangat banyak ({n_items:,}). Proses mungkin lambat. Pertimbangkan menggunakan level produk yang lebih tinggi (misal: DEPARTMENT).")
     
     if min_support < 0.005 and n_transactions > 10000:
-        st.warning(f"⚠️ Min Support sangat rendah ({min_support}) dengan data besar. Ini dapat menyebabkan proses sangat lama.")
+        reporting.warning(f"⚠️ Min Support sangat rendah ({min_support}) dengan data besar. Ini dapat menyebabkan proses sangat lama.")
+
+    if budget is not None:
+        return _run_association_rules_sparse(baskets, min_support, min_confidence, min_lift, progress_bar, budget)
+
+    # Matrix one-hot (+ salinan di fpgrowth) tidak boleh melebihi anggaran memori
+    dense_mb = 2 * n_transactions * n_items / 2**20
+    if memory_budget_mb is not None and dense_mb > memory_budget_mb:
+        progress_bar.empty()
+        reporting.error(
+            f"❌ Matrix one-hot diperkirakan ~{dense_mb:,.0f} MB, melebihi anggaran memori {memory_budget_mb:,.0f} MB. "
+            "Gunakan mode Otomatis (planner) agar strategi sparse/sampling/out-of-core dipilih otomatis."
+        )
+        return pd.DataFrame(), []
 
-    # 2. One-Hot Encoding (Format Wajib FP-Growth)
+    # 2. One-Hot Encoding (Format Wajib FP-Growth) langsung dari ID item
     progress_bar.progress(15, text="🔢 Melakukan One-Hot Encoding...")
-    te = TransactionEncoder()
-    te_ary = te.fit(transactions).transform(transactions)
-    df_encoded = pd.DataFrame(te_ary, columns=te.columns_)
+    with tracing.span("encode.one_hot"):
+        df_encoded = baskets.to_frame()
     
     # Memory check
     mem_mb = df_encoded.memory_usage(deep=True).sum() / 1024 / 1024
-    st.caption(f"💾 Ukuran matrix encoded: {df_encoded.shape[0]:,} × {df_encoded.shape[1]:,} ({mem_mb:.1f} MB)")
+    reporting.caption(f"💾 Ukuran matrix encoded: {df_encoded.shape[0]:,} × {df_encoded.shape[1]:,} ({mem_mb:.1f} MB)")
     
     # 3. Jalankan FP-Growth
     progress_bar.progress(30, text="⛏️ Menjalankan algoritma FP-Growth (langkah terlama)...")
     try:
-        frequent_itemsets = fpgrowth(df_encoded, min_support=min_support, use_colnames=True)
+        from mlxtend.frequent_patterns import fpgrowth
+        with tracing.span("fpgrowth", baskets=n_transactions, items=n_items) as span:
+            frequent_itemsets = fpgrowth(df_encoded, min_support=min_support)
+            span.set(itemsets=len(frequent_itemsets))
     except Exception as e:
         progress_bar.empty()
-        st.error(f"❌ FP-Growth gagal: {e}")
+        reporting.error(f"❌ FP-Growth gagal: {e}")
         return pd.DataFrame(), []
     
     if frequent_itemsets.empty:
         progress_bar.empty()
-        st.warning(f"⚠️ Tidak ditemukan pola dengan Min Support {min_support}. Coba turunkan nilainya.")
+        reporting.warning(f"⚠️ Tidak ditemukan pola dengan Min Support {min_support}. Coba turunkan nilainya.")
         return pd.DataFrame(), []
     
-    st.caption(f"🔍 Ditemukan {len(frequent_itemsets):,} frequent itemsets")
+    reporting.caption(f"🔍 Ditemukan {len(frequent_itemsets):,} frequent itemsets")
 
-    # 4. Generate Rules (Berdasarkan Lift)
+    return _generate_rules(frequent_itemsets, min_confidence, min_lift, progress_bar, labels=baskets.items)
+
+def _generate_rules(frequent_itemsets, min_confidence, min_lift, progress_bar, labels=None, partial=None,
+                    prune=None):
+    """
+    Langkah bersama setelah mining: generate rules pada ID item integer (pruning
+    confidence & lift langsung saat generate, lihat `mining.generate_rules`),
+    urutkan, lalu format label hanya untuk rules yang dikembalikan.
+    
+    labels : array - Label item jika kolom 'itemsets' berisi ID integer
+             (fpgrowth dengan use_colnames=False); None jika berisi label
+    partial : dict - Info hasil parsial (lihat `_partial_result`), disimpan di
+              `rules.attrs['partial']` agar tetap terlihat di hasil
+    prune : callable - Filter tambahan pada rules (ID integer) sebelum diurutkan
+    """
+    # 4. Generate Rules (ID integer, pruning confidence & lift)
     progress_bar.progress(70, text="📐 Menghasilkan association rules...")
+    itemsets = frequent_itemsets['itemsets'].tolist()
+    if labels is None:
+        labels = sorted({label for itemset in itemsets for label in itemset})
+        code_of = {label: code for code, label in enumerate(labels)}
+        itemsets = [[code_of[label] for label in itemset] for itemset in itemsets]
+    labels = np.asarray(labels, dtype=object)
+    supports = frequent_itemsets['support'].to_numpy()
+    
     try:
-        rules = association_rules(frequent_itemsets, metric="lift", min_threshold=min_lift)
+        with tracing.span("association_rules", itemsets=len(itemsets)) as span:
+            rules = mining.generate_rules(itemsets, supports, min_confidence, min_lift)
+            if rules.empty:
+                # Jika tidak ada yang lolos confidence, kembalikan semua rules (filter lift saja)
+                rules = mining.generate_rules(itemsets, supports, 0.0, min_lift)
+                if not rules.empty:
+                    reporting.warning(f"⚠️ Tidak ada rules dengan confidence >= {min_confidence}. Menampilkan semua rules.")
+            if prune is not None:
+                rules = prune(rules)
+            span.set(rules=len(rules))
     except Exception as e:
         progress_bar.empty()
-        st.error(f"❌ Gagal membuat rules: {e}")
+        reporting.error(f"❌ Gagal membuat rules: {e}")
         return pd.DataFrame(), []
     
     if rules.empty:
         progress_bar.empty()
-        st.warning(f"⚠️ Tidak ditemukan aturan asosiasi dengan Lift > {min_lift}.")
+        reporting.warning(f"⚠️ Tidak ditemukan aturan asosiasi dengan Lift > {min_lift}.")
         return pd.DataFrame(), []
     
-    # 5. Filter Rules berdasarkan confidence
-    progress_bar.progress(85, text="🎯 Memfilter rules berdasarkan confidence...")
-    interesting_rules = rules[
-        rules['confidence'] >= min_confidence
-    ].sort_values(by='lift', ascending=False)
-    
-    # Jika hasil filter kosong, kembalikan semua rules saja
-    if interesting_rules.empty:
-        st.warning(f"⚠️ Tidak ada rules dengan confidence >= {min_confidence}. Menampilkan semua rules.")
-        interesting_rules = rules.sort_values(by='lift', ascending=False)
+    # 5. Urutkan sebelum menyentuh label
+    progress_bar.progress(85, text="🎯 Mengurutkan rules...")
+    return _finish_rules(rules.sort_values(by='lift', ascending=False), labels, progress_bar, partial)
 
-    # 6. Formatting Tampilan (Set -> String)
+def _finish_rules(interesting_rules, labels, progress_bar, partial=None):
+    """Format label rules (sudah terurut) dan daftar antecedent unik. Returns (rules, antecedents)."""
+    # 6. Formatting Tampilan (ID -> label) hanya untuk rules yang dikembalikan
     progress_bar.progress(95, text="✨ Memformat hasil akhir...")
-    interesting_rules['antecedents_str'] = interesting_rules['antecedents'].apply(lambda x: ', '.join(list(x)))
-    interesting_rules['consequents_str'] = interesting_rules['consequents'].apply(lambda x: ', '.join(list(x)))
+    with tracing.span("format_rule_labels"):
+        interesting_rules = format_rule_labels(interesting_rules, labels)
+    if partial:
+        interesting_rules.attrs['partial'] = partial
 
     # Ambil daftar unik produk pemicu untuk dropdown
     unique_antecedents = interesting_rules['antecedents_str'].unique().tolist()
@@ -174,45 +402,1261 @@ def run_association_rules(_df, product_list_col, min_support=0.01, min_confidenc
     
     return interesting_rules, unique_antecedents
 
-def create_target_variable(df, product_list_col, target_product_list):
+def format_rule_labels(rules, labels):
     """
-    Membuat variabel target 'PX' dengan PENGAMAN TIPE DATA.
+    Tambahkan kolom label (antecedents/consequents sebagai frozenset, serta
+    antecedents_str/consequents_str) ke rules hasil `mining.generate_rules`.
+    
+    Dipanggil hanya untuk rules yang ditampilkan/diekspor; ID item diterjemahkan
+    lewat satu lookup array per sisi aturan, label diurutkan alfabetis.
     """
-    # Menggunakan set() untuk pencarian yang jauh lebih cepat
-    target_set = set(target_product_list)
+    labels = np.asarray(labels, dtype=object)
+    rules = rules.copy()
+    for side, ids_col in [('antecedents', 'antecedent_ids'), ('consequents', 'consequent_ids')]:
+        names = [sorted(labels[list(ids)]) for ids in rules[ids_col]]
+        rules[side] = [frozenset(row) for row in names]
+        rules[f'{side}_str'] = [', '.join(row) for row in names]
     
-    def check_target(cart_items):
-        # --- PENGAMAN (SAFETY CHECK) ---
-        # Jika data BUKAN list (misal: angka, atau kosong), anggap tidak beli (0)
-        if not isinstance(cart_items, (list, set, tuple)):
-            return 0
-            
-        # Cek apakah target_set ada di dalam keranjang belanja ini
-        return 1 if target_set.issubset(set(cart_items)) else 0
+    metrics = [col for col in mining.RULE_COLUMNS if not col.endswith('_ids')]
+    return rules[['antecedents', 'consequents'] + metrics +
+                 ['antecedents_str', 'consequents_str', 'antecedent_ids', 'consequent_ids']]
+
+def _mining_budget(time_limit_s=None):
+    """MiningBudget: batas waktu (detik, None = tanpa batas) + pembatalan job yang sedang berjalan."""
+    return mining.MiningBudget(time_limit_s, cancelled=reporting.cancel_requested)
+
+def _mine_itemsets(baskets, min_support, budget=None, max_len=None):
+    """
+    FP-Growth dengan engine `mining`: FP-tree dibangun langsung dari keranjang CSR
+    (tanpa matrix one-hot) dan mining dapat dihentikan lewat `budget`.
+    
+    Returns DataFrame [support, itemsets] terurut support menurun; 'itemsets'
+    berisi ID item `baskets.items` (konvensi fpgrowth `use_colnames=False`).
+    """
+    n_baskets = baskets.n_baskets
+    min_count = max(1, int(np.ceil(min_support * n_baskets)))
+    with tracing.span("fp_tree.build", baskets=n_baskets):
+        tree, labels = mining.build_fp_tree(baskets, min_count)
+    with tracing.span("fp_tree.mine", nodes=len(tree)) as span:
+        itemsets = mining.mine_fp_tree(tree, min_count, max_len, budget=budget)
+        span.set(itemsets=len(itemsets))
+    item_ids = pd.Index(baskets.items).get_indexer(labels).tolist()  # rank FP-tree -> ID item
+    itemsets = [(tuple(item_ids[rank] for rank in ranks), count) for ranks, count in itemsets]
+    frequent_itemsets = mining.itemsets_to_frame(itemsets, None, n_baskets)
+    return frequent_itemsets.sort_values('support', ascending=False, ignore_index=True)
+
+def _partial_result(budget, frequent_itemsets):
+    """
+    Info hasil parsial jika `budget` habis sebelum mining selesai (None jika lengkap).
+    Itemset yang sudah ditemukan tetap dipakai: item diproses dari yang paling
+    sering, sehingga rules untuk item-item populer sudah lengkap.
+    """
+    if budget is None or not budget.partial:
+        return None
+    if budget.stopped == 'time_limit':
+        reporting.warning(
+            f"⏱️ Batas waktu {budget.seconds:g} detik tercapai: hasil **PARSIAL** dari "
+            f"{len(frequent_itemsets):,} frequent itemsets pertama (item paling sering lebih dulu). "
+            "Pola dengan item yang lebih jarang belum tercakup."
+        )
+    elif budget.stopped == 'max_itemsets':
+        reporting.warning(
+            f"🧮 Batas jumlah itemset tercapai: hasil **PARSIAL** dari {len(frequent_itemsets):,} "
+            "frequent itemsets pertama (item paling sering lebih dulu). Naikkan Minimum Keranjang "
+            "per Itemset atau turunkan Panjang Itemset Maksimum."
+        )
+    return {'reason': budget.stopped, 'time_limit_s': budget.seconds, 'elapsed_s': round(budget.elapsed, 1),
+            'itemsets': len(frequent_itemsets)}
+
+def _warn_no_itemsets(min_support, budget=None):
+    if budget is not None and budget.stopped == 'time_limit':
+        reporting.warning(f"⏱️ Batas waktu {budget.seconds:g} detik habis sebelum itemset pertama ditemukan. "
+                          "Naikkan batas waktu atau Min Support.")
+    else:
+        reporting.warning(f"⚠️ Tidak ditemukan pola dengan Min Support {min_support}. Coba turunkan nilainya.")
+
+def _run_association_rules_sparse(baskets, min_support, min_confidence, min_lift, progress_bar, budget=None):
+    """Mining tanpa matrix one-hot: FP-tree dibangun langsung dari keranjang CSR."""
+    progress_bar.progress(15, text="🌲 Membangun & mining FP-tree dari keranjang...")
+    frequent_itemsets = _mine_itemsets(baskets, min_support, budget)
+    if frequent_itemsets.empty:
+        progress_bar.empty()
+        _warn_no_itemsets(min_support, budget)
+        return pd.DataFrame(), []
+    reporting.caption(f"🔍 Ditemukan {len(frequent_itemsets):,} frequent itemsets")
+    return _generate_rules(frequent_itemsets, min_confidence, min_lift, progress_bar, labels=baskets.items,
+                           partial=_partial_result(budget, frequent_itemsets))
+
+def run_association_rules_out_of_core(group_by='BASKET_ID', product_level='COMMODITY_DESC',
+                                      min_support=0.01, min_confidence=0.3, min_lift=1.1, time_limit_s=None):
+    """
+    FP-Growth out-of-core: basket di-stream dari SQLite per chunk (lihat
+    `mining.mine_out_of_core`), sehingga seluruh riwayat transaksi bisa dianalisis
+    tanpa random sampling dan tanpa matrix one-hot di memori.
+    
+    Parameters:
+    -----------
+    group_by : str - 'BASKET_ID' atau 'household_key'
+    product_level : str - Level hierarki produk (mis. 'SUB_COMMODITY_DESC')
+    min_support, min_confidence, min_lift : float - Sama dengan `run_association_rules`
+    time_limit_s : float - Batas waktu (detik); setelah habis, hasil mining sejauh ini dikembalikan
+    """
+    budget = _mining_budget(time_limit_s)
+    progress_bar = reporting.progress(0, text="🔄 Memulai FP-Growth out-of-core...")
+    
+    def update_progress(pct, msg):
+        progress_bar.progress(int(5 + pct * 60), text=f"💽 {msg}")
+    
+    try:
+        frequent_itemsets, stats, err = mining.mine_out_of_core(
+            group_by, product_level, min_support, progress_callback=update_progress, budget=budget
+        )
+    except Exception as e:
+        err = str(e)
+    if err:
+        progress_bar.empty()
+        reporting.error(f"❌ FP-Growth out-of-core gagal: {err}")
+        return pd.DataFrame(), []
+    
+    reporting.caption(
+        f"📊 Statistik: {stats.get('n_baskets', 0):,} transaksi, {stats.get('n_items', 0):,} item unik "
+        f"({stats.get('n_frequent_items', 0):,} frequent), FP-tree {stats.get('tree_nodes', 0):,} node"
+    )
+    
+    if frequent_itemsets.empty:
+        progress_bar.empty()
+        _warn_no_itemsets(min_support, budget)
+        return pd.DataFrame(), []
     
-    # Terapkan fungsi dengan aman
-    df['PX'] = df[product_list_col].apply(check_target)
+    reporting.caption(f"🔍 Ditemukan {len(frequent_itemsets):,} frequent itemsets")
+    partial = _partial_result(budget, frequent_itemsets)
+    if partial:
+        frequent_itemsets = frequent_itemsets.sort_values('support', ascending=False, ignore_index=True)
+    return _generate_rules(frequent_itemsets, min_confidence, min_lift, progress_bar, partial=partial)
+
+def run_association_rules_top_k(_df, product_list_col, k=50, metric='lift', min_confidence=0.3,
+                                min_lift=1.0, min_count=10, max_len=4, max_itemsets=TOP_K_MAX_ITEMSETS,
+                                time_limit_s=TOP_K_TIME_LIMIT_S):
+    """
+    Top-k association rules menurut lift atau confidence, tanpa parameter Min Support.
+    
+    FP-Growth berjalan sampai batas noise `min_count` keranjang dan hanya `k`
+    rules terbaik menurut `metric` yang disimpan (lihat `mining.mine_top_rules`).
+    Rules dengan lift tertinggi biasanya berasal dari itemset jarang, sehingga
+    pencarian itemset tidak bisa dipangkas oleh skor ke-k; skor itu hanya
+    menghemat pembuatan rules. Biaya mining ditentukan `min_count` (bukan `k`)
+    dan selalu dibatasi `max_len`, `max_itemsets` dan `time_limit_s`.
+    
+    Parameters:
+    -----------
+    k : int - Jumlah rules yang dikembalikan
+    metric : str - 'lift' atau 'confidence' (seri diurutkan menurut support)
+    min_count : int - Minimum jumlah keranjang per itemset (filter noise)
+    max_len : int - Jumlah item maksimum per itemset (None = tanpa batas)
+    max_itemsets : int - Batas jumlah itemset yang di-mining (None/0 = TOP_K_MAX_ITEMSETS)
+    time_limit_s : float - Batas waktu (detik, None/0 = TOP_K_TIME_LIMIT_S); setelah
+                   anggaran habis, top-k atas item yang sudah selesai dipakai
+    """
+    time_limit_s = time_limit_s or TOP_K_TIME_LIMIT_S
+    max_itemsets = max_itemsets or TOP_K_MAX_ITEMSETS
+    budget = _mining_budget(time_limit_s)
+    progress_bar = reporting.progress(0, text="🏆 Membangun FP-tree untuk mining top-k...")
+    
+    baskets = parse_product_lists(_df[product_list_col]).non_empty()
+    n_baskets = baskets.n_baskets
+    if n_baskets == 0:
+        progress_bar.empty()
+        reporting.warning("⚠️ Tidak ada data transaksi yang valid untuk diproses.")
+        return pd.DataFrame(), []
+    
+    with tracing.span("fp_tree.build", baskets=n_baskets):
+        tree, labels = mining.build_fp_tree(baskets, min_count)
+    progress_bar.progress(20, text=f"⛏️ Mencari {k:,} rules dengan {metric} tertinggi ({len(tree):,} node FP-tree)...")
+    with tracing.span("fp_tree.mine_top_rules") as span:
+        rules, stats = mining.mine_top_rules(tree, n_baskets, k, metric, min_count, min_confidence, min_lift,
+                                             max_len=max_len, max_itemsets=max_itemsets, budget=budget)
+        span.set(itemsets=stats['itemsets'], rules=len(rules))
+    
+    if rules.empty:
+        progress_bar.empty()
+        if budget.stopped == 'max_itemsets' and not stats['itemsets']:
+            reporting.warning(f"🧮 Item paling sering saja sudah menghasilkan lebih dari {max_itemsets:,} itemset. "
+                              "Naikkan Minimum Keranjang per Itemset atau turunkan Panjang Itemset Maksimum.")
+        elif budget.partial and not stats['itemsets']:
+            _warn_no_itemsets(min_count / n_baskets, budget)
+        else:
+            reporting.warning(f"⚠️ Tidak ada rules dari itemset yang muncul di minimal {min_count} keranjang "
+                              f"dengan confidence >= {min_confidence} dan lift >= {min_lift}.")
+        return pd.DataFrame(), []
+    
+    bound = f" | {metric} rules ke-{k}: **{stats['bound']:.3f}**" if stats['bound'] is not None else ""
+    reporting.caption(f"🏆 {stats['itemsets']:,} itemset (>= {min_count} keranjang) dari "
+                      f"{stats['items_done']:,}/{tree.n_items:,} item{bound}")
+    progress_bar.progress(85, text="🎯 Mengurutkan rules...")
+    return _finish_rules(rules, labels, progress_bar, partial=_partial_result(budget, range(stats['itemsets'])))
+
+def run_association_rules_adaptive(_df, product_list_col, epsilon=0.005, delta=0.05, verify=True,
+                                   min_support=0.01, min_confidence=0.3, min_lift=1.1, random_state=42,
+                                   time_limit_s=None):
+    """
+    FP-Growth dengan adaptive sampling: ukuran sampel dihitung dari batas error
+    (ε, δ) pada estimasi support (lihat `mining.required_sample_size`), bukan rasio tetap.
+    
+    - Tanpa verifikasi: dengan probabilitas >= 1-δ, support SEMUA itemset di
+      sampel berada dalam ±ε dari support sebenarnya.
+    - Dengan verifikasi: sampel di-mining pada threshold `min_support - ε`
+      (Toivonen) lalu semua kandidat dihitung ulang secara exact pada data penuh
+      dalam satu pass bitset, sehingga support & confidence akhir exact.
+    
+    Parameters:
+    -----------
+    epsilon : float - Batas error absolut support (mis. 0.005 = ±0.5%)
+    delta : float - Probabilitas gagal batas error (mis. 0.05 = keyakinan 95%)
+    verify : bool - Verifikasi kandidat ke data penuh
+    time_limit_s : float - Batas waktu mining sampel (detik); sama dengan `run_association_rules`
+    """
+    budget = _mining_budget(time_limit_s) if time_limit_s is not None else None
+    if verify and epsilon >= min_support:
+        reporting.warning("⚠️ Batas error ε harus lebih kecil dari Min Support agar kandidat dapat diverifikasi.")
+        return pd.DataFrame(), []
+    
+    progress_bar = reporting.progress(0, text="🎯 Menghitung ukuran sampel adaptif...")
+    
+    baskets = parse_product_lists(_df[product_list_col]).non_empty()
+    if baskets.n_baskets == 0:
+        progress_bar.empty()
+        reporting.warning("⚠️ Tidak ada data transaksi yang valid untuk diproses.")
+        return pd.DataFrame(), []
+    
+    # 1. Ukuran sampel dari batas (ε, δ)
+    n_total = baskets.n_baskets
+    sizes = baskets.basket_sizes()
+    sample_size = mining.required_sample_size(epsilon, delta, sizes)
+    if sample_size < n_total:
+        rng = np.random.default_rng(random_state)
+        sample = baskets.take(np.sort(rng.choice(n_total, sample_size, replace=False)))
+    else:
+        sample, sample_size = baskets, n_total
+    reporting.caption(
+        f"🎯 Sampel adaptif: {sample_size:,} dari {n_total:,} keranjang "
+        f"(ε = {epsilon}, δ = {delta}, d-index = {mining.d_index(sizes)})"
+    )
+    
+    # 2. FP-Growth pada sampel (threshold diturunkan ε jika akan diverifikasi)
+    do_verify = verify and sample is not baskets
+    mining_support = min_support - epsilon if do_verify else min_support
+    progress_bar.progress(20, text="⛏️ Menjalankan FP-Growth pada sampel...")
+    try:
+        if budget is not None:
+            frequent_itemsets = _mine_itemsets(sample, mining_support, budget)
+        else:
+            from mlxtend.frequent_patterns import fpgrowth
+            with tracing.span("fpgrowth", baskets=sample_size, items=sample.n_items) as span:
+                frequent_itemsets = fpgrowth(sample.to_frame(), min_support=mining_support)
+                span.set(itemsets=len(frequent_itemsets))
+    except Exception as e:
+        progress_bar.empty()
+        reporting.error(f"❌ FP-Growth gagal: {e}")
+        return pd.DataFrame(), []
+    
+    # 3. Verifikasi kandidat pada data penuh (satu pass counting)
+    if do_verify and not frequent_itemsets.empty:
+        progress_bar.progress(50, text=f"🔎 Memverifikasi {len(frequent_itemsets):,} kandidat pada data penuh...")
+        with tracing.span("verify_support", candidates=len(frequent_itemsets)):
+            counts = mining.count_itemset_support(baskets, frequent_itemsets['itemsets'].map(tuple).tolist())
+        frequent_itemsets['support'] = counts / n_total
+        frequent_itemsets = frequent_itemsets[frequent_itemsets['support'] >= min_support].reset_index(drop=True)
+        reporting.caption(f"✅ Support & confidence diverifikasi exact pada {n_total:,} keranjang.")
+    elif sample is not baskets:
+        reporting.caption(f"📏 Estimasi support akurat ±{epsilon} dengan probabilitas ≥ {1 - delta:.0%}.")
+    
+    if frequent_itemsets.empty:
+        progress_bar.empty()
+        _warn_no_itemsets(min_support, budget)
+        return pd.DataFrame(), []
+    
+    reporting.caption(f"🔍 Ditemukan {len(frequent_itemsets):,} frequent itemsets")
+    return _generate_rules(frequent_itemsets, min_confidence, min_lift, progress_bar, labels=baskets.items,
+                           partial=_partial_result(budget, frequent_itemsets))
+
+def create_target_variable(df, product_list_col, target_product_list):
+    """
+    Membuat variabel target 'PX' (1 = basket memuat SEMUA produk target).
+    Kolom produk boleh berupa string GROUP_CONCAT atau list; pengecekan dilakukan
+    secara vektor pada ID item sehingga baris non-list otomatis bernilai 0.
+    """
+    baskets = parse_product_lists(df[product_list_col])
+    df['PX'] = baskets.contains_all(target_product_list).astype(int)
     return df
 
 def encode_features(df, demographic_features):
     """
     Mengubah data kategori (teks) menjadi angka (One-Hot Encoding).
     Contoh: "Menikah" -> 1, "Lajang" -> 0
+
+    Kolom Categorical (dari `database.get_analysis_data`) di-encode langsung dari
+    category codes, sehingga string tidak di-hash ulang dan kolom dummy selalu
+    sama untuk category set yang sama. Kolom teks biasa dikonversi dulu ke Categorical.
     """
     if not demographic_features:
         return df
     
-    # drop_first=True untuk mengurangi redundansi kolom (Dummy Variable Trap)
-    df_encoded = pd.get_dummies(df, columns=demographic_features, drop_first=True)
+    dummy_frames = []
+    for col in demographic_features:
+        values = df[col]
+        if not isinstance(values.dtype, pd.CategoricalDtype):
+            values = values.astype('category')
+        
+        codes = values.cat.codes.to_numpy()
+        categories = values.cat.categories
+        onehot = np.zeros((len(codes), len(categories)), dtype=bool)
+        valid = codes >= 0  # -1 = NaN, tidak masuk kategori manapun
+        onehot[np.flatnonzero(valid), codes[valid]] = True
+        
+        # drop_first=True untuk mengurangi redundansi kolom (Dummy Variable Trap)
+        dummy_frames.append(pd.DataFrame(
+            onehot[:, 1:],
+            columns=[f"{col}_{cat}" for cat in categories[1:]],
+            index=df.index
+        ))
+    
+    df_encoded = pd.concat([df.drop(columns=demographic_features)] + dummy_frames, axis=1)
     
     return df_encoded
 
+# =============================================================================
+# MULTI-LEVEL ASSOCIATION RULES (HIERARKI PRODUK)
+# =============================================================================
+
+def _generalized_baskets(keys, leaves, taxonomy):
+    """Keranjang CSR berisi node hierarki: setiap item ditambah semua ancestor-nya (unik per keranjang)."""
+    ancestors = taxonomy.ancestor_table()
+    n_nodes = len(taxonomy)
+    basket_codes, _ = pd.factorize(keys)
+    n_baskets = int(basket_codes.max()) + 1 if len(basket_codes) else 0
+    nodes = ancestors[:, leaves]  # [level, baris]
+    pairs = np.unique((np.tile(basket_codes, len(ancestors)) * n_nodes + nodes.ravel()))
+    baskets, items = np.divmod(pairs, n_nodes)
+    indptr = np.zeros(n_baskets + 1, dtype=np.int64)
+    np.cumsum(np.bincount(baskets, minlength=n_baskets), out=indptr[1:])
+    return EncodedBaskets(indptr, items, taxonomy.labels())
+
+def run_association_rules_multilevel(group_by='BASKET_ID', levels=None, min_support=0.01, min_confidence=0.3,
+                                     min_lift=1.1, min_interest=1.1, cross_level=False, max_len=None,
+                                     time_limit_s=None, chunk_size=250_000):
+    """
+    Association rules multi-level dalam satu pass: DEPARTMENT, COMMODITY_DESC dan
+    SUB_COMMODITY_DESC (atau `levels`) sekaligus, opsional termasuk rules lintas
+    level (mis. SUB_COMMODITY -> DEPARTMENT).
+    
+    Taksonomi produk di-encode sekali dari tabel `products`; transaksi di-stream
+    sekali dari SQLite, setiap keranjang diperluas dengan ancestor item-itemnya
+    lalu di-mining dengan satu FP-tree gabungan semua level
+    (`mining.mine_generalized`); tanpa `cross_level`, item level lain dipangkas
+    dari conditional tree sehingga hanya itemset satu level yang dibentuk.
+    Itemset yang memuat item sekaligus ancestor-nya tidak pernah dibentuk, dan
+    rules yang sudah dijelaskan rules ancestor-nya (level di atasnya) dipangkas
+    (`mining.prune_redundant_rules`).
+    
+    Parameters:
+    -----------
+    group_by : str - 'BASKET_ID' atau 'household_key'
+    levels : list - Level hierarki dari atas ke bawah (default DEPARTMENT > COMMODITY_DESC > SUB_COMMODITY_DESC)
+    min_support, min_confidence, min_lift : float - Sama dengan `run_association_rules`
+    min_interest : float - Rasio minimum confidence terhadap ekspektasi dari rules
+                   ancestor (R-interest); 1.0 = tanpa pemangkasan
+    cross_level : bool - Juga mining itemset campuran level (jauh lebih banyak itemset)
+    max_len : int - Panjang itemset maksimum (None = tanpa batas)
+    time_limit_s : float - Batas waktu mining (detik), hasil parsial saat habis
+    
+    Returns:
+    --------
+    (rules, antecedents) seperti `run_association_rules`; rules memiliki kolom
+    tambahan 'levels' (mis. 'Comm → Dept')
+    """
+    budget = _mining_budget(time_limit_s)
+    progress_bar = reporting.progress(0, text="🪜 Memuat path hierarki produk...")
+    
+    # 1. Satu pass SQLite: path hierarki per baris transaksi -> node taksonomi
+    def update_progress(rows, nodes):
+        progress_bar.progress(5, text=f"🪜 {rows:,} baris di-stream, {nodes:,} node hierarki")
+    
+    try:
+        keys, leaves, taxonomy, err = mining.load_basket_leaves(group_by, levels, chunk_size, update_progress)
+    except Exception as e:
+        err = str(e)
+    if err:
+        progress_bar.empty()
+        reporting.error(f"❌ Gagal memuat hierarki produk: {err}")
+        return pd.DataFrame(), []
+    if not len(keys):
+        progress_bar.empty()
+        reporting.warning("⚠️ Tidak ada data transaksi yang valid untuk diproses.")
+        return pd.DataFrame(), []
+    
+    progress_bar.progress(15, text="🧺 Memperluas keranjang dengan ancestor item...")
+    with tracing.span("taxonomy.extend_baskets"):
+        baskets = _generalized_baskets(keys, leaves, taxonomy)
+    tags = [mining.LEVEL_TAGS.get(level, level) for level in taxonomy.levels]
+    level_counts = Counter(taxonomy.level)
+    reporting.caption(
+        f"📊 Statistik: {baskets.n_baskets:,} transaksi, " +
+        ", ".join(f"{level_counts[i]:,} {tag}" for i, tag in enumerate(tags))
+    )
+    
+    # 2. Satu FP-tree gabungan semua level; tanpa lintas level, itemset campuran
+    #    level dipangkas dari conditional tree setiap item
+    n_baskets = baskets.n_baskets
+    min_count = max(1, int(np.ceil(min_support * n_baskets)))
+    progress_bar.progress(25, text="🌲 Membangun FP-tree multi-level...")
+    with tracing.span("fp_tree.build", baskets=n_baskets):
+        tree, labels = mining.build_fp_tree(baskets, min_count)
+    node_of_rank = pd.Index(baskets.items).get_indexer(labels)
+    progress_bar.progress(35, text=f"⛏️ Mining itemset {'lintas level' if cross_level else 'per level'} "
+                                   f"({len(tree):,} node FP-tree)...")
+    with tracing.span("fp_tree.mine_generalized", cross_level=cross_level) as span:
+        found = mining.mine_generalized(tree, min_count, taxonomy.related_items(node_of_rank), max_len,
+                                        budget=budget,
+                                        levels=None if cross_level else np.asarray(taxonomy.level)[node_of_rank])
+        span.set(itemsets=len(found))
+    itemsets = [(tuple(int(node_of_rank[rank]) for rank in ranks), count) for ranks, count in found]
+    frequent_itemsets = mining.itemsets_to_frame(itemsets, None, n_baskets)
+    if frequent_itemsets.empty:
+        progress_bar.empty()
+        _warn_no_itemsets(min_support, budget)
+        return pd.DataFrame(), []
+    frequent_itemsets = frequent_itemsets.sort_values('support', ascending=False, ignore_index=True)
+    reporting.caption(f"🔍 Ditemukan {len(frequent_itemsets):,} frequent itemsets (semua level)")
+    
+    # 3. Rules + pemangkasan rules redundan terhadap rules ancestor
+    def prune(rules):
+        if min_interest <= 1.0 or rules.empty:
+            return rules
+        with tracing.span("prune_redundant_rules", rules=len(rules)):
+            kept = mining.prune_redundant_rules(rules, frequent_itemsets['itemsets'].tolist(),
+                                                frequent_itemsets['support'].to_numpy(), taxonomy.parent,
+                                                min_interest)
+        reporting.caption(f"✂️ {len(rules) - len(kept):,} rules redundan dipangkas (R-interest < {min_interest})")
+        return kept
+    
+    rules, antecedents = _generate_rules(frequent_itemsets, min_confidence, min_lift, progress_bar,
+                                         labels=baskets.items, partial=_partial_result(budget, frequent_itemsets),
+                                         prune=prune)
+    if not rules.empty:
+        side_levels = lambda ids: "+".join(sorted({tags[taxonomy.level[node]] for node in ids}, key=tags.index))
+        rules['levels'] = [f"{side_levels(ante)} → {side_levels(cons)}"
+                           for ante, cons in zip(rules['antecedent_ids'], rules['consequent_ids'])]
+    return rules, antecedents
+
+# =============================================================================
+# SEQUENTIAL PATTERN MINING (RIWAYAT BELANJA RUMAH TANGGA)
+# =============================================================================
+
+def _format_sequence(sequence):
+    return " → ".join(" + ".join(element) for element in sequence)
+
+def run_sequential_patterns(product_level='COMMODITY_DESC', min_support=0.1, max_gap_days=14, max_len=3,
+                            n_jobs=None, time_limit_s=None, chunk_size=250_000):
+    """
+    Pola sekuensial per rumah tangga (PrefixSpan): urutan pembelian seperti
+    "BEEF → BAKED BREAD/BUNS/ROLLS + CHEESE" dalam keranjang-keranjang berikutnya.
+    
+    Riwayat keranjang setiap `household_key` dibangun dari satu pass tabel
+    `transactions` (urut DAY, TRANS_TIME) dengan ID item integer, lalu di-mining
+    dengan projected database (`mining.mine_sequences`), dibagi per item awal
+    ke beberapa proses.
+    
+    Parameters:
+    -----------
+    product_level : str - Level produk item (DEPARTMENT, COMMODITY_DESC, SUB_COMMODITY_DESC)
+    min_support : float - Minimum proporsi rumah tangga yang memiliki pola
+    max_gap_days : int - Jarak maksimum (hari) antar elemen pola berurutan (None = tanpa batas)
+    max_len : int - Jumlah item maksimum per pola (None = tanpa batas)
+    n_jobs : int - Jumlah proses mining (None = semua CPU)
+    time_limit_s : float - Batas waktu mining (detik), hasil parsial saat habis
+    
+    Returns:
+    --------
+    DataFrame pola [pattern, sequence, elements, length, households, support,
+    confidence] terurut support menurun; confidence = peluang elemen/item
+    terakhir diberikan awalan pola
+    """
+    budget = _mining_budget(time_limit_s)
+    progress_bar = reporting.progress(0, text="🔁 Memuat riwayat keranjang rumah tangga...")
+    
+    try:
+        sequences, err = mining.load_household_sequences(
+            product_level, chunk_size,
+            lambda rows: progress_bar.progress(5, text=f"🔁 {rows:,} baris transaksi di-stream")
+        )
+    except Exception as e:
+        err = str(e)
+    if err:
+        progress_bar.empty()
+        reporting.error(f"❌ Gagal memuat riwayat transaksi: {err}")
+        return pd.DataFrame()
+    if not len(sequences):
+        progress_bar.empty()
+        reporting.warning("⚠️ Tidak ada data transaksi yang valid untuk diproses.")
+        return pd.DataFrame()
+    reporting.caption(
+        f"📊 Statistik: {len(sequences):,} rumah tangga, {sequences.n_events:,} keranjang, "
+        f"{len(sequences.labels):,} item {product_level}"
+    )
+    
+    n_jobs = n_jobs or os.cpu_count() or 1
+    min_count = max(1, int(np.ceil(min_support * len(sequences))))
+    progress_bar.progress(30, text=f"⛏️ Mining pola sekuensial ({n_jobs} proses)...")
+    with tracing.span("prefixspan.mine", sequences=len(sequences), n_jobs=n_jobs) as span:
+        patterns, labels = mining.mine_sequences(sequences, min_count, max_gap_days, max_len, n_jobs, budget)
+        span.set(patterns=len(patterns))
+    if not patterns:
+        progress_bar.empty()
+        _warn_no_itemsets(min_support, budget)
+        return pd.DataFrame()
+    
+    progress_bar.progress(90, text="📋 Menyusun tabel pola...")
+    counts = dict(patterns)
+    
+    def prefix(pattern):
+        if len(pattern[-1]) > 1:
+            return pattern[:-1] + (pattern[-1][:-1],)
+        return pattern[:-1]
+    
+    result = pd.DataFrame({
+        'sequence': [tuple(tuple(labels[item] for item in element) for element in pattern)
+                     for pattern, _ in patterns],
+        'elements': [len(pattern) for pattern, _ in patterns],
+        'length': [sum(map(len, pattern)) for pattern, _ in patterns],
+        'households': [count for _, count in patterns],
+        'confidence': [count / counts[prefix(pattern)] if len(prefix(pattern)) else np.nan
+                       for pattern, count in patterns],
+    })
+    result.insert(0, 'pattern', result['sequence'].map(_format_sequence))
+    result.insert(5, 'support', result['households'] / len(sequences))
+    result = result.sort_values(['households', 'length'], ascending=[False, True], ignore_index=True)
+    result.attrs['partial'] = None
+    if budget.partial:
+        if budget.stopped == 'time_limit':
+            reporting.warning(
+                f"⏱️ Batas waktu {budget.seconds:g} detik tercapai: hasil **PARSIAL** berisi {len(result):,} "
+                "pola, diawali item yang paling sering lebih dulu."
+            )
+        result.attrs['partial'] = {'reason': budget.stopped, 'time_limit_s': budget.seconds,
+                                   'elapsed_s': round(budget.elapsed, 1), 'patterns': len(result)}
+    progress_bar.empty()
+    return result
+
+def save_sequences(patterns, path=SEQUENCES_PATH):
+    """Simpan hasil `run_sequential_patterns` sebagai artifact."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    joblib.dump(patterns, path)
+    return path
+
+def load_sequences(path=SEQUENCES_PATH):
+    """Muat pola sekuensial yang disimpan `save_sequences`, atau None jika belum ada."""
+    path = Path(path)
+    return joblib.load(path) if path.exists() else None
+
+# =============================================================================
+# SLIDING-WINDOW ASSOCIATION RULES (DRIFT PER MINGGU)
+# =============================================================================
+
+def _weekly_baskets(keys, weeks, items, labels):
+    """Keranjang CSR terurut per minggu (WEEK_NO, BASKET_ID) + WEEK_NO setiap keranjang."""
+    order = np.lexsort((items, keys, weeks))
+    keys, weeks, items = keys[order], weeks[order], items[order]
+    first = np.r_[True, (keys[1:] != keys[:-1]) | (items[1:] != items[:-1])]
+    keys, weeks, items = keys[first], weeks[first], items[first]
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    baskets = EncodedBaskets(np.append(starts, len(keys)), items, labels, index=pd.Index(keys[starts]))
+    return baskets, weeks[starts]
+
+def run_association_rules_windowed(product_level='COMMODITY_DESC', window_weeks=4, step_weeks=1, min_support=0.02,
+                                   min_confidence=0.3, min_lift=1.1, drift_threshold=0.25, max_len=None,
+                                   time_limit_s=None, chunk_size=250_000):
+    """
+    Association rules per jendela WEEK_NO yang bergeser (sliding window) beserta
+    laporan drift: rules yang lift-nya berubah melebihi `drift_threshold`
+    dibanding jendela sebelumnya.
+    
+    FP-Growth tidak dijalankan ulang per jendela. Support itemset dipelihara
+    secara inkremental (`mining.WindowSupports`): saat jendela bergeser, hanya
+    keranjang minggu yang masuk ditambahkan dan minggu yang keluar dikurangkan
+    (delta counting pada matrix CSR); itemset baru dihitung atas seluruh
+    jendela hanya saat negative border berubah.
+    
+    Parameters:
+    -----------
+    product_level : str - Level produk item
+    window_weeks : int - Lebar jendela (jumlah minggu)
+    step_weeks : int - Pergeseran jendela (minggu)
+    min_support, min_confidence, min_lift : float - Sama dengan `run_association_rules`, per jendela
+    drift_threshold : float - Perubahan relatif lift minimum yang dilaporkan (0.25 = ±25%)
+    max_len : int - Panjang itemset maksimum (None = tanpa batas)
+    time_limit_s : float - Batas waktu (detik); jendela yang sudah selesai tetap dikembalikan
+    
+    Returns:
+    --------
+    (window_rules, drift, windows):
+    - window_rules : rules setiap jendela (kolom window, week_start, week_end + kolom rules)
+    - drift : rules dengan |perubahan lift| >= drift_threshold antar jendela berurutan
+    - windows : ringkasan per jendela (keranjang, itemset, rules, rules baru/hilang,
+      itemset yang dihitung ulang atas seluruh jendela, waktu)
+    """
+    empty = pd.DataFrame(), pd.DataFrame(), pd.DataFrame()
+    budget = _mining_budget(time_limit_s)
+    progress_bar = reporting.progress(0, text="🗓️ Memuat keranjang per minggu...")
+    
+    try:
+        keys, weeks, items, labels, err = mining.load_weekly_baskets(
+            product_level, chunk_size,
+            lambda rows: progress_bar.progress(5, text=f"🗓️ {rows:,} baris transaksi di-stream")
+        )
+    except Exception as e:
+        err = str(e)
+    if err:
+        progress_bar.empty()
+        reporting.error(f"❌ Gagal memuat transaksi per minggu: {err}")
+        return empty
+    if not len(keys):
+        progress_bar.empty()
+        reporting.warning("⚠️ Tidak ada data transaksi yang valid untuk diproses.")
+        return empty
+    
+    with tracing.span("windows.baskets"):
+        baskets, basket_weeks = _weekly_baskets(keys, weeks, items, labels)
+    first_week, last_week = int(basket_weeks[0]), int(basket_weeks[-1])
+    window_starts = list(range(first_week, max(first_week, last_week - window_weeks + 1) + 1, step_weeks))
+    reporting.caption(
+        f"📊 Statistik: {baskets.n_baskets:,} transaksi, minggu {first_week}–{last_week}, "
+        f"{len(window_starts):,} jendela × {window_weeks} minggu"
+    )
+    
+    def rows(start_week, end_week):
+        lo, hi = np.searchsorted(basket_weeks, [start_week, end_week])
+        return baskets.take(np.arange(lo, hi))
+    
+    supports = mining.WindowSupports(baskets.n_items, min_support, max_len)
+    window_rules, drift, windows = [], [], []
+    previous_start, previous_lift, previous_confidence = None, None, None
+    for n, start in enumerate(window_starts):
+        if budget.exhausted():
+            break
+        end = start + window_weeks
+        label = f"W{start}–{end - 1}"
+        progress_bar.progress(10 + 85 * n // len(window_starts), text=f"🗓️ Jendela {label}...")
+        
+        started = time.perf_counter()
+        with tracing.span("window.slide", window=label) as span:
+            if previous_start is None:
+                entering, leaving = rows(start, end), None
+            else:
+                previous_end = previous_start + window_weeks
+                entering = rows(max(previous_end, start), end)
+                leaving = rows(previous_start, min(start, previous_end))
+            recounted = supports.slide(entering, leaving, lambda: rows(start, end))
+            found = supports.frequent_itemsets()
+            span.set(itemsets=len(found), recounted=recounted)
+        previous_start = start
+        
+        itemsets = [itemset for itemset, _ in found]
+        support = np.array([count for _, count in found], dtype=float) / max(supports.n_baskets, 1)
+        # Lift semua rules (tanpa filter lift) agar rules yang turun di bawah min_lift tetap terlacak
+        rules = mining.generate_rules(itemsets, support, min_confidence, 0.0)
+        rule_keys = pd.MultiIndex.from_arrays([rules['antecedent_ids'], rules['consequent_ids']])
+        lift = pd.Series(rules['lift'].to_numpy(), index=rule_keys)
+        confidence = pd.Series(rules['confidence'].to_numpy(), index=rule_keys)
+        strong = rules[rules['lift'] >= min_lift]
+        window_rules.append(strong.assign(window=label, week_start=start, week_end=end - 1))
+        
+        new_rules = dropped_rules = drifted = 0
+        if previous_lift is not None:
+            strong_keys = set(rule_keys[(lift >= min_lift).to_numpy()])
+            before_keys = set(previous_lift.index[(previous_lift >= min_lift).to_numpy()])
+            new_rules, dropped_rules = len(strong_keys - before_keys), len(before_keys - strong_keys)
+            common = lift.index.intersection(previous_lift.index)
+            change = (lift[common] - previous_lift[common]) / previous_lift[common]
+            moved = change[(change.abs() >= drift_threshold) &
+                           ((lift[common] >= min_lift) | (previous_lift[common] >= min_lift))]
+            drifted = len(moved)
+            if drifted:
+                drift.append(pd.DataFrame({
+                    'window': label, 'week_start': start, 'week_end': end - 1,
+                    'antecedent_ids': moved.index.get_level_values(0),
+                    'consequent_ids': moved.index.get_level_values(1),
+                    'lift_before': previous_lift[moved.index].to_numpy(),
+                    'lift': lift[moved.index].to_numpy(),
+                    'lift_change': moved.to_numpy(),
+                    'confidence_before': previous_confidence[moved.index].to_numpy(),
+                    'confidence': confidence[moved.index].to_numpy(),
+                }))
+        previous_lift, previous_confidence = lift, confidence
+        windows.append({'window': label, 'week_start': start, 'week_end': end - 1,
+                        'baskets': supports.n_baskets, 'itemsets': len(found), 'rules': len(strong),
+                        'new_rules': new_rules, 'dropped_rules': dropped_rules, 'drifted': drifted,
+                        'recounted': recounted, 'seconds': round(time.perf_counter() - started, 3)})
+    
+    if not windows:
+        progress_bar.empty()
+        _warn_no_itemsets(min_support, budget)
+        return empty
+    
+    progress_bar.progress(95, text="✨ Memformat hasil akhir...")
+    windows = pd.DataFrame(windows)
+    window_rules = pd.concat(window_rules, ignore_index=True)
+    window_rules = pd.concat([window_rules[['window', 'week_start', 'week_end']],
+                              format_rule_labels(window_rules, baskets.items)], axis=1)
+    drift = pd.concat(drift, ignore_index=True) if drift else pd.DataFrame(
+        columns=['window', 'week_start', 'week_end', 'antecedent_ids', 'consequent_ids', 'lift_before', 'lift',
+                 'lift_change', 'confidence_before', 'confidence'])
+    drift['antecedents_str'] = [', '.join(sorted(baskets.items[list(ids)])) for ids in drift['antecedent_ids']]
+    drift['consequents_str'] = [', '.join(sorted(baskets.items[list(ids)])) for ids in drift['consequent_ids']]
+    drift = drift[['window', 'week_start', 'week_end', 'antecedents_str', 'consequents_str', 'lift_before', 'lift',
+                   'lift_change', 'confidence_before', 'confidence', 'antecedent_ids', 'consequent_ids']]
+    
+    windows.attrs['partial'] = None
+    if budget.partial:
+        if budget.stopped == 'time_limit':
+            reporting.warning(f"⏱️ Batas waktu {budget.seconds:g} detik tercapai: hasil **PARSIAL**, "
+                              f"{len(windows):,} dari {len(window_starts):,} jendela.")
+        windows.attrs['partial'] = {'reason': budget.stopped, 'time_limit_s': budget.seconds,
+                                    'elapsed_s': round(budget.elapsed, 1), 'windows': len(windows)}
+    reporting.caption(
+        f"🔁 Support dipelihara inkremental: {int(windows['recounted'].sum()):,} itemset dihitung ulang atas "
+        f"seluruh jendela, sisanya delta minggu masuk/keluar"
+    )
+    progress_bar.empty()
+    return window_rules, drift, windows
+
+# =============================================================================
+# ANALISIS TERPARTISI (PER TOKO / SEGMEN, PARALEL)
+# =============================================================================
+
+PARTITION_ANALYSES = ('rules', 'rfm')
+PARTITION_RFM_COLUMNS = ['household_key', 'Recency', 'Frequency', 'Monetary', 'R_Score', 'F_Score', 'M_Score',
+                         'Segment']
+
+def _partition_baskets(rows, labels):
+    """
+    Keranjang CSR terurut per partisi (partisi, BASKET_ID) dengan item unik per
+    keranjang, beserta kode partisi, household_key, DAY & total SALES_VALUE setiap keranjang.
+
+    Returns:
+    --------
+    (baskets, kode partisi per keranjang, nilai partisi, household, DAY, nilai belanja per keranjang)
+    """
+    codes, values = pd.factorize(rows['partition_key'], sort=True)
+    keys, items = rows['basket_key'].to_numpy(), rows['item'].to_numpy()
+    order = np.lexsort((items, keys, codes))
+    codes, keys, items = codes[order], keys[order], items[order]
+    households, days = rows['household_key'].to_numpy()[order], rows['DAY'].to_numpy()[order]
+    new_basket = np.r_[True, (codes[1:] != codes[:-1]) | (keys[1:] != keys[:-1])]
+    # Nilai belanja dijumlahkan per keranjang sebelum baris item duplikat dibuang
+    sales = np.add.reduceat(rows['SALES_VALUE'].fillna(0).to_numpy(dtype=np.float64)[order],
+                            np.flatnonzero(new_basket))
+    first = new_basket | np.r_[True, items[1:] != items[:-1]]
+    codes, keys, items, households, days = codes[first], keys[first], items[first], households[first], days[first]
+    starts = np.flatnonzero(new_basket[first])
+    baskets = EncodedBaskets(np.append(starts, len(items)), items, labels, index=pd.Index(keys[starts]))
+    return baskets, codes[starts], values, households[starts], days[starts], sales
+
+_partition_worker = {}
+
+def _init_partition_worker(items, params, deadline, stop):
+    """Kamus item bersama & parameter dikirim sekali per proses worker, bukan per partisi."""
+    _partition_worker.update(items=np.asarray(items, dtype=object), params=params, deadline=deadline, stop=stop)
+
+def _analyze_partition(task, budget=None):
+    """
+    Rules + RFM satu partisi (di proses worker atau langsung jika `budget` diberikan).
+
+    task = (posisi partisi, indptr, indices, household, DAY & nilai belanja per keranjang);
+    rules dikembalikan dengan ID item kamus bersama (label diterjemahkan di proses utama).
+    """
+    position, indptr, indices, households, days, sales = task
+    params = _partition_worker['params']
+    if budget is None:
+        deadline, stop = _partition_worker['deadline'], _partition_worker['stop']
+        budget = mining.MiningBudget(None if deadline is None else deadline - time.time(), cancelled=stop.is_set)
+    started = time.perf_counter()
+    baskets = EncodedBaskets(indptr, indices, _partition_worker['items'])
+    result = {'position': position, 'baskets': len(baskets), 'households': len(np.unique(households)),
+              'items': int(np.count_nonzero(baskets.item_counts())), 'itemsets': 0,
+              'rules': pd.DataFrame(columns=mining.RULE_COLUMNS), 'rfm': None}
+
+    if 'rules' in params['analyses']:
+        frequent = _mine_itemsets(baskets, params['min_support'], budget, params['max_len'])
+        result['itemsets'] = len(frequent)
+        if len(frequent):
+            result['rules'] = mining.generate_rules(frequent['itemsets'].tolist(), frequent['support'].to_numpy(),
+                                                    params['min_confidence'], params['min_lift'])
+    if 'rfm' in params['analyses']:
+        # Agregat yang sama dengan `calculate_rfm` (Monetary = SALES_VALUE), dari array keranjang partisi
+        rfm = pd.DataFrame({'household_key': households, 'DAY': days, 'sales': sales})
+        rfm = rfm.groupby('household_key').agg(
+            LastPurchaseDay=('DAY', 'max'), Monetary=('sales', 'sum'), Frequency=('DAY', 'size')
+        ).reset_index()
+        result['rfm'] = score_rfm(rfm, days.max())[PARTITION_RFM_COLUMNS]
+
+    result['status'] = 'partial' if budget.partial else 'ok'
+    result['seconds'] = round(time.perf_counter() - started, 3)
+    return result
+
+def _map_partitions(tasks, items, params, n_jobs, budget, on_result):
+    """
+    Jalankan `_analyze_partition` untuk setiap task: langsung jika `n_jobs` <= 1,
+    selain itu di `n_jobs` proses (spawn). Saat `budget` habis, partisi yang
+    belum dimulai dibatalkan dan yang sedang berjalan berhenti di ekspansi berikutnya.
+    """
+    if n_jobs <= 1 or len(tasks) < 2:
+        _init_partition_worker(items, params, None, None)
+        for task in tasks:
+            if budget.exhausted():
+                break
+            on_result(_analyze_partition(task, budget))
+        return
+
+    mining.run_in_spawn_pool(_analyze_partition, tasks, _init_partition_worker, (items, params), n_jobs, budget,
+                             on_result)
+
+def run_partitioned_analysis(partition_by='STORE_ID', product_level='COMMODITY_DESC', analyses=PARTITION_ANALYSES,
+                             min_baskets=200, min_support=0.02, min_confidence=0.3, min_lift=1.1, max_len=3,
+                             n_jobs=None, time_limit_s=None, save=True, chunk_size=250_000):
+    """
+    Association rules dan/atau RFM per partisi (per toko `STORE_ID` atau per
+    nilai kolom demografi), dijalankan paralel di beberapa proses.
+
+    Transaksi di-stream sekali dari SQLite dan produk dipetakan ke satu kamus
+    item bersama (`mining.load_partitioned_baskets`), sehingga ID item rules
+    sama di semua partisi. Keranjang dibagi per partisi (CSR), lalu setiap
+    partisi dianalisis dengan FP-Growth & skor RFM yang sama seperti analisis
+    seluruh jaringan. Partisi terbesar dikerjakan lebih dulu.
+
+    Parameters:
+    -----------
+    partition_by : str - Kolom partisi (lihat `db.PARTITION_COLUMNS`)
+    product_level : str - Level produk item
+    analyses : tuple - Analisis yang dijalankan: 'rules', 'rfm'
+    min_baskets : int - Partisi dengan keranjang lebih sedikit dilewati (status 'too_small')
+    min_support, min_confidence, min_lift : float - Sama dengan `run_association_rules`, per partisi
+    max_len : int - Panjang itemset maksimum (None = tanpa batas)
+    n_jobs : int - Jumlah proses (None = semua CPU)
+    time_limit_s : float - Batas waktu (detik); partisi yang sudah selesai tetap disimpan
+    save : bool - Simpan hasil ke SQLite (`db.save_partition_run`)
+
+    Returns:
+    --------
+    (summary, rules, rfm):
+    - summary : per partisi [partition_key, baskets, households, items, itemsets, rules, seconds, status];
+      attrs 'run_id' (jika disimpan) dan 'partial'
+    - rules : rules semua partisi (kolom tabel `partition_rules`)
+    - rfm : skor RFM per household per partisi (kolom tabel `partition_rfm`)
+    """
+    empty = pd.DataFrame(), pd.DataFrame(), pd.DataFrame()
+    analyses = tuple(analysis for analysis in PARTITION_ANALYSES if analysis in analyses)
+    budget = _mining_budget(time_limit_s)
+    progress_bar = reporting.progress(0, text=f"🏬 Memuat transaksi per {partition_by}...")
+
+    try:
+        rows, labels, err = mining.load_partitioned_baskets(
+            partition_by, product_level, chunk_size,
+            lambda n: progress_bar.progress(5, text=f"🏬 {n:,} baris transaksi di-stream")
+        )
+    except Exception as e:
+        err = str(e)
+    if err:
+        progress_bar.empty()
+        reporting.error(f"❌ Gagal memuat transaksi per partisi: {err}")
+        return empty
+    if rows.empty:
+        progress_bar.empty()
+        reporting.warning("⚠️ Tidak ada data transaksi yang valid untuk diproses.")
+        return empty
+
+    with tracing.span("partitions.baskets", rows=len(rows)):
+        baskets, basket_partition, values, households, days, sales = _partition_baskets(rows, labels)
+    del rows
+    bounds = np.searchsorted(basket_partition, np.arange(len(values) + 1))
+    sizes = np.diff(bounds)
+    eligible = np.flatnonzero(sizes >= min_baskets)
+    reporting.caption(
+        f"📊 Statistik: {baskets.n_baskets:,} transaksi di {len(values):,} partisi {partition_by}, "
+        f"{len(eligible):,} partisi dengan ≥ {min_baskets:,} keranjang, kamus bersama {len(labels):,} item "
+        f"{product_level}"
+    )
+
+    tasks = []
+    for position in eligible[np.argsort(-sizes[eligible], kind='stable')]:
+        lo, hi = bounds[position], bounds[position + 1]
+        start, end = baskets.indptr[lo], baskets.indptr[hi]
+        tasks.append((int(position), baskets.indptr[lo:hi + 1] - start, baskets.indices[start:end],
+                      households[lo:hi], days[lo:hi], sales[lo:hi]))
+    params = dict(analyses=analyses, min_support=min_support, min_confidence=min_confidence, min_lift=min_lift,
+                  max_len=max_len)
+    n_jobs = min(n_jobs or os.cpu_count() or 1, max(len(tasks), 1))
+
+    results = []
+
+    def collect(result):
+        results.append(result)
+        progress_bar.progress(10 + 80 * len(results) // max(len(tasks), 1),
+                              text=f"🏬 {len(results):,}/{len(tasks):,} partisi selesai ({n_jobs} proses)...")
+
+    progress_bar.progress(10, text=f"🏬 Menganalisis {len(tasks):,} partisi ({n_jobs} proses)...")
+    with tracing.span("partitions.analyze", partitions=len(tasks), n_jobs=n_jobs) as span:
+        _map_partitions(tasks, labels, params, n_jobs, budget, collect)
+        span.set(done=len(results))
+
+    progress_bar.progress(92, text="📋 Menyusun hasil per partisi...")
+    done = {result['position']: result for result in results}
+    summary = pd.DataFrame({
+        'partition_key': values,
+        'baskets': sizes,
+        'households': [done[p]['households'] if p in done else None for p in range(len(values))],
+        'items': [done[p]['items'] if p in done else None for p in range(len(values))],
+        'itemsets': [done[p]['itemsets'] if p in done else None for p in range(len(values))],
+        'rules': [len(done[p]['rules']) if p in done else None for p in range(len(values))],
+        'seconds': [done[p]['seconds'] if p in done else None for p in range(len(values))],
+        'status': [done[p]['status'] if p in done else 'skipped' if sizes[p] >= min_baskets else 'too_small'
+                   for p in range(len(values))],
+    }).astype({'households': 'Int64', 'items': 'Int64', 'itemsets': 'Int64', 'rules': 'Int64'})
+    summary = summary.sort_values('baskets', ascending=False, ignore_index=True)
+
+    rule_frames = [result['rules'].assign(partition_key=values[result['position']])
+                   for result in results if len(result['rules'])]
+    if rule_frames:
+        rules = format_rule_labels(pd.concat(rule_frames, ignore_index=True), labels)
+        rules = pd.DataFrame({
+            'partition_key': np.concatenate([frame['partition_key'].to_numpy() for frame in rule_frames]),
+            'antecedents': rules['antecedents_str'], 'consequents': rules['consequents_str'],
+            'antecedent_ids': [",".join(map(str, ids)) for ids in rules['antecedent_ids']],
+            'consequent_ids': [",".join(map(str, ids)) for ids in rules['consequent_ids']],
+            **{col: rules[col] for col in ['support', 'confidence', 'lift', 'leverage', 'conviction']},
+        })
+    else:
+        rules = pd.DataFrame(columns=['partition_key', 'antecedents', 'consequents', 'antecedent_ids',
+                                      'consequent_ids', 'support', 'confidence', 'lift', 'leverage', 'conviction'])
+    rfm_frames = [result['rfm'].assign(partition_key=values[result['position']])
+                  for result in results if result['rfm'] is not None]
+    rfm = (pd.concat(rfm_frames, ignore_index=True) if rfm_frames
+           else pd.DataFrame(columns=PARTITION_RFM_COLUMNS + ['partition_key']))
+    rfm = rfm[['partition_key'] + PARTITION_RFM_COLUMNS]
+
+    summary.attrs['partial'] = None
+    if budget.partial:
+        if budget.stopped == 'time_limit':
+            reporting.warning(f"⏱️ Batas waktu {budget.seconds:g} detik tercapai: hasil **PARSIAL**, "
+                              f"{len(results):,} dari {len(tasks):,} partisi dianalisis.")
+        summary.attrs['partial'] = {'reason': budget.stopped, 'time_limit_s': budget.seconds,
+                                    'elapsed_s': round(budget.elapsed, 1), 'partitions': len(results)}
+    summary.attrs['run_id'] = None
+    if save and results:
+        progress_bar.progress(95, text="💾 Menyimpan hasil per partisi ke SQLite...")
+        run = dict(partition_by=partition_by, product_level=product_level, params=dict(params, min_baskets=min_baskets),
+                   seconds=round(budget.elapsed, 1), partial=summary.attrs['partial'])
+        with tracing.span("partitions.save", rules=len(rules), rfm=len(rfm)):
+            summary.attrs['run_id'] = db.save_partition_run(run, labels, summary, rules, rfm)
+        reporting.caption(f"💾 Hasil disimpan sebagai run `{summary.attrs['run_id']}` ({db.PARTITION_RESULTS_PATH.name})")
+    progress_bar.empty()
+    return summary, rules, rfm
+
+# =============================================================================
+# PLANNER FP-GROWTH (ANGGARAN MEMORI & WAKTU)
+# =============================================================================
+
+PLAN_STRATEGIES = {
+    'dense': '🧱 Dense (matrix one-hot + mlxtend fpgrowth)',
+    'sparse': '🌲 Sparse (FP-tree langsung dari keranjang CSR)',
+    'sampled': '🎲 Sampling (FP-tree pada sampel keranjang)',
+    'out_of_core': '💽 Out-of-core (stream keranjang dari SQLite)',
+}
+
+def plan_association_rules(_df, product_list_col, min_support=0.01, memory_budget_mb=FP_MEMORY_BUDGET_MB,
+                           time_budget_s=FP_TIME_BUDGET_S, max_itemsets=FP_MAX_ITEMSETS, allow_out_of_core=True,
+                           data_key=None):
+    """
+    Menyusun rencana FP-Growth sebelum mining: memperkirakan ukuran matrix
+    encoded dan ledakan jumlah itemset dari statistik frekuensi item + pilot
+    mining pada sampel kecil (lihat `mining.estimate_mining_costs`), lalu memilih
+    strategi yang muat dalam anggaran memori & waktu.
+    
+    Urutan keputusan:
+    1. Jika itemset frequent > `max_itemsets`, Min Support dinaikkan ke support
+       terendah yang aman (hasil pilot).
+    2. Dari dense / sparse / out-of-core yang muat dalam kedua anggaran, dipilih
+       yang estimasi waktunya tercepat.
+    3. Jika tidak ada yang muat, keranjang di-sampling: ukuran sampel untuk
+       batas error ε = Min Support / 4 (δ = 0.05), diperkecil bila perlu agar muat
+       anggaran.
+    
+    Parameters:
+    -----------
+    _df : DataFrame - Data dengan kolom product_list
+    min_support : float - Min Support yang diminta
+    memory_budget_mb : float - Anggaran memori mining (MB)
+    time_budget_s : float - Anggaran waktu mining (detik)
+    max_itemsets : int - Batas jumlah frequent itemset (pencegah ledakan kandidat)
+    allow_out_of_core : bool - Strategi out-of-core boleh dipilih (data berasal dari database)
+    data_key : str - Fingerprint `_df` sebagai kunci cache; None = dihitung dari isi `_df`
+    
+    Returns:
+    --------
+    dict: strategy, min_support, requested_support, support_raised, sample_size,
+    estimates (per strategi: memory_mb, seconds, fits), stats & reasons
+    """
+    if data_key is None:
+        data_key = caching.frame_fingerprint(_df[[product_list_col]])
+    return _plan_association_rules(_df, product_list_col, min_support, memory_budget_mb, time_budget_s,
+                                   max_itemsets, allow_out_of_core, data_key)
+
+@caching.cache_data(show_spinner="🧮 Menyusun rencana FP-Growth...")
+def _plan_association_rules(_df, product_list_col, min_support, memory_budget_mb, time_budget_s,
+                            max_itemsets, allow_out_of_core, data_key):
+    baskets = parse_product_lists(_df[product_list_col]).non_empty()
+    plan = {
+        'strategy': None, 'requested_support': min_support, 'min_support': min_support,
+        'support_raised': False, 'sample_size': None, 'estimates': {}, 'reasons': [],
+        'memory_budget_mb': memory_budget_mb, 'time_budget_s': time_budget_s, 'max_itemsets': max_itemsets,
+        'n_baskets': baskets.n_baskets, 'n_items': baskets.n_items,
+    }
+    if baskets.n_baskets == 0:
+        plan['reasons'].append("Tidak ada keranjang yang valid.")
+        return plan
+    
+    # 1. Ledakan kandidat -> naikkan Min Support
+    with tracing.span("plan.estimate"):
+        costs = mining.estimate_mining_costs(baskets, min_support, max_itemsets)
+    if costs['explosion']:
+        raised = float(np.ceil(costs['capped_support'] * 10_000) / 10_000)
+        plan.update(min_support=raised, support_raised=True)
+        plan['reasons'].append(
+            f"Lebih dari {max_itemsets:,} itemset frequent pada Min Support {min_support}: "
+            f"dinaikkan ke {raised} agar jumlah kandidat tetap terkendali."
+        )
+        with tracing.span("plan.estimate"):
+            costs = mining.estimate_mining_costs(baskets, raised, max_itemsets)
+    plan.update({key: costs[key] for key in ('n_frequent_items', 'estimated_itemsets', 'estimated_rules',
+                                             'tree_nodes', 'pilot')})
+    
+    # 2. Strategi yang muat dalam anggaran (tercepat)
+    budget_bytes = memory_budget_mb * 2**20
+    candidates = ['dense', 'sparse'] + (['out_of_core'] if allow_out_of_core else [])
+    for name in candidates:
+        estimate = costs[name]
+        plan['estimates'][name] = {
+            'memory_mb': estimate['memory_bytes'] / 2**20,
+            'seconds': estimate['seconds'],
+            'fits': estimate['memory_bytes'] <= budget_bytes and estimate['seconds'] <= time_budget_s,
+        }
+    
+    # 3. Sampling: ukuran sampel statistik, dibatasi anggaran
+    n = baskets.n_baskets
+    stat_size = mining.required_sample_size(plan['min_support'] / 4, 0.05, baskets.basket_sizes())
+    budget_size = min((budget_bytes - costs['output_bytes']) / costs['sampled_bytes_per_basket'],
+                      time_budget_s / costs['sampled_seconds_per_basket'])
+    sample_size = int(max(0, min(n, stat_size, budget_size)))
+    plan['estimates']['sampled'] = {
+        'memory_mb': (sample_size * costs['sampled_bytes_per_basket'] + costs['output_bytes']) / 2**20,
+        'seconds': sample_size * costs['sampled_seconds_per_basket'],
+        'fits': 0 < sample_size < n,
+        'sample_size': sample_size,
+    }
+    
+    fitting = [name for name in candidates if plan['estimates'][name]['fits']]
+    if fitting:
+        plan['strategy'] = min(fitting, key=lambda name: plan['estimates'][name]['seconds'])
+        plan['reasons'].append(
+            f"{PLAN_STRATEGIES[plan['strategy']]} muat dalam anggaran dan estimasi waktunya tercepat."
+        )
+    elif sample_size >= min(n, 1000):
+        plan.update(strategy='sampled', sample_size=sample_size)
+        eps = np.sqrt(0.5 * (mining.d_index(baskets.basket_sizes()) + np.log(1 / 0.05)) / sample_size)
+        plan['reasons'].append(
+            f"Mining seluruh {n:,} keranjang melebihi anggaran: memakai sampel {sample_size:,} keranjang "
+            f"(estimasi support akurat ±{eps:.4f} dengan keyakinan 95%)."
+        )
+    else:
+        fallback = 'out_of_core' if allow_out_of_core else 'sparse'
+        plan['strategy'] = fallback
+        plan['reasons'].append(
+            f"⚠️ Tidak ada strategi yang muat dalam anggaran; memakai {PLAN_STRATEGIES[fallback]} "
+            "(memori terkecil). Pertimbangkan menaikkan Min Support atau memakai level produk lebih tinggi."
+        )
+    return plan
+
+def run_association_rules_planned(_df, product_list_col, plan, min_confidence=0.3, min_lift=1.1,
+                                  group_by='BASKET_ID', product_level='COMMODITY_DESC', random_state=42,
+                                  time_limit_s=None):
+    """
+    Menjalankan FP-Growth sesuai rencana dari `plan_association_rules`.
+    
+    Parameters:
+    -----------
+    plan : dict - Hasil `plan_association_rules` (strategy, min_support, sample_size)
+    group_by, product_level : str - Konfigurasi basket `_df` (untuk strategi out-of-core)
+    time_limit_s : float - Batas waktu mining (detik), lihat `run_association_rules`
+    """
+    strategy, min_support = plan['strategy'], plan['min_support']
+    reporting.caption(f"🧮 Rencana: {PLAN_STRATEGIES.get(strategy, strategy)} | Min Support {min_support}")
+    if strategy == 'dense':
+        return run_association_rules(_df, product_list_col, min_support, min_confidence, min_lift,
+                                     memory_budget_mb=None, time_limit_s=time_limit_s)
+    if strategy == 'out_of_core':
+        return run_association_rules_out_of_core(group_by, product_level, min_support, min_confidence, min_lift,
+                                                 time_limit_s=time_limit_s)
+    
+    budget = _mining_budget(time_limit_s)
+    progress_bar = reporting.progress(0, text="🔄 Memulai FP-Growth...")
+    baskets = parse_product_lists(_df[product_list_col]).non_empty()
+    if baskets.n_baskets == 0:
+        progress_bar.empty()
+        reporting.warning("⚠️ Tidak ada data transaksi yang valid untuk diproses.")
+        return pd.DataFrame(), []
+    if strategy == 'sampled' and plan['sample_size'] < baskets.n_baskets:
+        rng = np.random.default_rng(random_state)
+        baskets = baskets.take(np.sort(rng.choice(baskets.n_baskets, plan['sample_size'], replace=False)))
+        reporting.info(f"📊 Menggunakan {baskets.n_baskets:,} sampel keranjang sesuai rencana")
+    return _run_association_rules_sparse(baskets, min_support, min_confidence, min_lift, progress_bar, budget)
+
+# =============================================================================
+# RULE INDEX (LOOKUP REKOMENDASI CHECKOUT)
+# =============================================================================
+
+class RuleIndex:
+    """
+    Indeks rules untuk lookup "pelanggan yang membeli X juga membeli ...".
+    
+    Antecedent setiap rule disimpan sebagai path di trie atas ID item terurut.
+    Untuk basket aktif, hanya node yang seluruh itemnya ada di basket yang
+    dikunjungi (subset lookup), sehingga biaya query bergantung pada ukuran
+    basket dan jumlah node yang cocok, bukan jumlah seluruh rules. Setiap node
+    juga menyimpan item consequent-nya yang sudah diurutkan per metrik, jadi
+    `recommend` cukup membaca maksimal k entri per node.
+    
+    Posisi rule mengacu ke baris frame `rules` saat indeks dibangun.
+    """
+    
+    METRICS = ('lift', 'confidence')
+    
+    def __init__(self, rules):
+        self.items = sorted({label for col in ('antecedents', 'consequents')
+                             for itemset in rules[col] for label in itemset})
+        self._code = {label: code for code, label in enumerate(self.items)}
+        self._children = [{}]
+        self._node_rules = [[]]
+        
+        for position, antecedent in enumerate(rules['antecedents']):
+            node = 0
+            for code in sorted(self._code[label] for label in antecedent):
+                child = self._children[node].get(code)
+                if child is None:
+                    child = len(self._children)
+                    self._children.append({})
+                    self._node_rules.append([])
+                    self._children[node][code] = child
+                node = child
+            self._node_rules[node].append(position)
+        
+        # Per node & metrik: [(item, skor terbaik)] terurut menurun
+        consequents = [[self._code[label] for label in itemset] for itemset in rules['consequents']]
+        self._ranked = {}
+        for metric in self.METRICS:
+            values = rules[metric].tolist()
+            ranked = []
+            for positions in self._node_rules:
+                best = {}
+                for position in positions:
+                    for code in consequents[position]:
+                        best[code] = max(best.get(code, values[position]), values[position])
+                ranked.append(sorted(best.items(), key=lambda pair: pair[1], reverse=True))
+            self._ranked[metric] = ranked
+    
+    def __len__(self):
+        return sum(len(positions) for positions in self._node_rules)
+    
+    def basket_codes(self, basket):
+        """ID item terurut untuk basket (label dinormalisasi, item yang tidak dikenal diabaikan)."""
+        code = self._code
+        return sorted({code[label] for label in (str(item).strip().upper() for item in basket) if label in code})
+    
+    def _matching_nodes(self, codes):
+        """Node trie yang path-nya merupakan subset dari `codes` (terurut)."""
+        children = self._children
+        nodes = []
+        stack = [(0, 0)]  # (node, posisi item berikutnya di basket)
+        while stack:
+            node, start = stack.pop()
+            nodes.append(node)
+            node_children = children[node]
+            if not node_children:
+                continue
+            for i in range(start, len(codes)):
+                child = node_children.get(codes[i])
+                if child is not None:
+                    stack.append((child, i + 1))
+        return nodes
+    
+    def matching_rules(self, basket):
+        """Posisi rules yang antecedent-nya merupakan subset dari basket."""
+        node_rules = self._node_rules
+        return [position for node in self._matching_nodes(self.basket_codes(basket)) for position in node_rules[node]]
+    
+    def recommend(self, basket, k=5, metric='lift'):
+        """
+        Top-k item rekomendasi untuk basket aktif.
+        
+        Setiap item consequent yang belum ada di basket diberi skor `metric`
+        ('lift' atau 'confidence') tertinggi dari rules yang cocok.
+        
+        Returns:
+        --------
+        list of (item, skor) terurut menurun
+        """
+        codes = self.basket_codes(basket)
+        owned = set(codes)
+        ranked = self._ranked[metric]
+        scores = {}
+        for node in self._matching_nodes(codes):
+            taken = 0
+            for code, score in ranked[node]:
+                if code in owned:
+                    continue
+                if score > scores.get(code, float('-inf')):
+                    scores[code] = score
+                taken += 1
+                if taken == k:  # entri berikutnya di node ini tidak mungkin masuk top-k
+                    break
+        best = sorted(scores.items(), key=lambda pair: pair[1], reverse=True)[:k]
+        return [(self.items[code], score) for code, score in best]
+
+def save_rules(rules, index=None, path=RULES_PATH):
+    """Simpan rules beserta RuleIndex-nya (dibangun jika belum ada) ke satu file artifact."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    joblib.dump({'rules': rules, 'index': index if index is not None else RuleIndex(rules)}, path)
+    return path
+
+def load_rules(path=RULES_PATH):
+    """Muat rules & RuleIndex yang disimpan `save_rules`. Returns (rules, index), atau (None, None) jika belum ada."""
+    path = Path(path)
+    if not path.exists():
+        return None, None
+    artifact = joblib.load(path)
+    return artifact['rules'], artifact['index']
+
 # =============================================================================
 # RFM ANALYSIS FUNCTIONS
 # =============================================================================
 
-@st.cache_data(show_spinner="📊 Menghitung RFM...")
-def calculate_rfm(_df, key_col, day_col, product_list_col):
+# Kolom numerik per transaksi dari `db.get_analysis_data` (dijumlahkan di SQL; diskon bernilai <= 0)
+MONETARY_COL = 'total_sales'
+DISCOUNT_COLS = ['total_retail_disc', 'total_coupon_disc', 'total_coupon_match_disc']
+COUPON_COLS = ['total_coupon_disc', 'total_coupon_match_disc']
+
+@tracing.traced("rfm")
+def calculate_rfm(_df, key_col, day_col, product_list_col, data_key=None, monetary_col=MONETARY_COL):
     """
     Menghitung RFM (Recency, Frequency, Monetary) per pelanggan.
     
@@ -222,62 +1666,88 @@ def calculate_rfm(_df, key_col, day_col, product_list_col):
     key_col : str - Nama kolom ID pelanggan
     day_col : str - Nama kolom hari/tanggal transaksi (atau ID Transaksi sebagai proxy)
     product_list_col : str - Nama kolom daftar produk
+    data_key : str - Fingerprint `_df` (mis. `database.analysis_fingerprint`) sebagai
+               kunci cache; None = dihitung dari isi `_df`
+    monetary_col : str - Kolom nilai belanja per transaksi (default total_sales =
+                   SUM(SALES_VALUE) dari SQL); None atau kolom tidak ada = jumlah
+                   item di `product_list_col` sebagai proxy
     
     Returns:
     --------
     DataFrame dengan kolom: customer_id, Recency, Frequency, Monetary, R_Score, F_Score, M_Score, RFM_Score, Segment
+    (+ Discount, Discount_Share, Coupon_Share jika kolom diskon DISCOUNT_COLS tersedia)
     """
-    df = _df.copy()
-    
-    # Pastikan product_list sudah dalam format list
-    if df[product_list_col].dtype == 'object':
-        try:
-            df[product_list_col] = df[product_list_col].apply(ast.literal_eval)
-        except:
-            pass
-    
-    # Hitung jumlah item per transaksi (Monetary proxy)
-    def count_items(x):
-        if isinstance(x, list):
-            return len(x)
-        return 0
-    
-    df['item_count'] = df[product_list_col].apply(count_items)
-    
+    if data_key is None:
+        data_key = caching.frame_fingerprint(_df)
+    return _calculate_rfm(_df, key_col, day_col, product_list_col, data_key, monetary_col)
+
+@caching.cache_data(show_spinner="📊 Menghitung RFM...")
+def _calculate_rfm(_df, key_col, day_col, product_list_col, data_key, monetary_col=MONETARY_COL):
     # Jika day_col tidak ada atau sama dengan ID Transaksi, gunakan ID Transaksi sebagai proxy
     # (Asumsi: BASKET_ID yang lebih tinggi = transaksi lebih baru)
-    if day_col not in df.columns or day_col == key_col:
+    if day_col not in _df.columns or day_col == key_col:
         # Cari kolom yang bisa digunakan sebagai proxy waktu
         possible_time_cols = ['ID Transaksi', 'BASKET_ID', 'transaction_id', 'order_id']
         time_col = None
         for col in possible_time_cols:
-            if col in df.columns:
+            if col in _df.columns:
                 time_col = col
                 break
-        
-        if time_col is None:
-            # Jika tidak ada, buat index sebagai proxy
-            df['_transaction_order'] = range(len(df))
-            time_col = '_transaction_order'
     else:
         time_col = day_col
     
+    # Hanya kolom yang dibutuhkan (tanpa menyalin seluruh DataFrame)
+    df = pd.DataFrame({
+        key_col: _df[key_col].to_numpy(),
+        # Jika tidak ada kolom waktu, urutan baris sebagai proxy
+        'LastPurchaseDay': _df[time_col].to_numpy() if time_col is not None else np.arange(len(_df)),
+    })
+    with_sales = monetary_col is not None and monetary_col in _df.columns
+    if with_sales:
+        # Monetary = nilai belanja yang sudah dijumlahkan di SQL, tanpa parsing list produk
+        df['Monetary'] = _df[monetary_col].fillna(0).to_numpy()
+    else:
+        # Proxy: jumlah item per transaksi langsung dari parser vektor
+        df['Monetary'] = parse_product_lists(_df[product_list_col]).basket_sizes()
+    with_discounts = with_sales and all(col in _df.columns for col in DISCOUNT_COLS)
+    if with_discounts:
+        df['Discount'] = -_df[DISCOUNT_COLS].fillna(0).sum(axis=1).to_numpy()
+        df['Coupon'] = -_df[COUPON_COLS].fillna(0).sum(axis=1).to_numpy()
+    
     # Tentukan "hari terakhir" dalam dataset (untuk menghitung Recency)
-    max_day = df[time_col].max()
+    max_day = df['LastPurchaseDay'].max()
     
-    # Agregasi per pelanggan
-    rfm = df.groupby(key_col).agg({
-        time_col: 'max',           # Transaksi terakhir (untuk Recency)
-        'item_count': 'sum',       # Total item dibeli (Monetary proxy)
-    }).reset_index()
+    # Agregasi per pelanggan: transaksi terakhir, total belanja & jumlah transaksi
+    aggregations = dict(LastPurchaseDay=('LastPurchaseDay', 'max'), Monetary=('Monetary', 'sum'),
+                        Frequency=('LastPurchaseDay', 'size'))
+    if with_discounts:
+        aggregations.update(Discount=('Discount', 'sum'), Coupon=('Coupon', 'sum'))
+    rfm = df.groupby(key_col).agg(**aggregations).reset_index()
     
-    # Hitung Frequency terpisah (jumlah transaksi unik)
-    freq = df.groupby(key_col).size().reset_index(name='Frequency')
-    rfm = rfm.merge(freq, on=key_col)
+    if with_discounts:
+        # Sensitivitas diskon: porsi nilai belanja sebelum diskon yang ditutup diskon / kupon
+        gross = rfm['Monetary'] + rfm['Discount']
+        rfm['Discount_Share'] = (rfm['Discount'] / gross).where(gross > 0, 0.0).round(4)
+        rfm['Coupon_Share'] = (rfm.pop('Coupon') / gross).where(gross > 0, 0.0).round(4)
+    rfm = score_rfm(rfm, max_day)
+    # Satuan Monetary untuk tampilan: kolom nilai belanja atau 'items' (proxy)
+    rfm.attrs['monetary'] = monetary_col if with_sales else 'items'
+    return rfm
+
+def score_rfm(rfm, max_day):
+    """
+    Skor R/F/M (quintile 1-5), RFM_Score, Total_Score dan Segment dari agregat
+    per pelanggan.
     
-    # Rename kolom
-    rfm.columns = [key_col, 'LastPurchaseDay', 'Monetary', 'Frequency']
+    Parameters:
+    -----------
+    rfm : DataFrame - Kolom ID pelanggan, LastPurchaseDay, Monetary, Frequency
+    max_day : int - Hari terakhir dalam data (acuan Recency)
     
+    Returns:
+    --------
+    DataFrame yang sama dengan kolom skor & segmen (LastPurchaseDay diganti Recency)
+    """
     # Hitung Recency (semakin kecil = semakin baru = semakin baik)
     # Normalize ke skala yang lebih masuk akal
     rfm['Recency'] = max_day - rfm['LastPurchaseDay']
@@ -320,7 +1790,7 @@ def calculate_rfm(_df, key_col, day_col, product_list_col):
     rfm['Total_Score'] = rfm['R_Score'] + rfm['F_Score'] + rfm['M_Score']
     
     # --- SEGMENTASI PELANGGAN ---
-    rfm['Segment'] = rfm.apply(assign_rfm_segment, axis=1)
+    rfm['Segment'] = segment_rfm_scores(rfm['R_Score'], rfm['F_Score'], rfm['M_Score'])
     
     # Gunakan Recency_Normalized untuk tampilan
     rfm['Recency'] = rfm['Recency_Normalized']
@@ -328,55 +1798,58 @@ def calculate_rfm(_df, key_col, day_col, product_list_col):
     
     return rfm
 
-def assign_rfm_segment(row):
-    """
-    Menetapkan segmen pelanggan berdasarkan skor RFM.
-    Menggunakan logika bisnis standar retail.
-    """
-    r, f, m = row['R_Score'], row['F_Score'], row['M_Score']
-    
+def save_rfm(rfm, path=RFM_PATH):
+    """Simpan hasil `calculate_rfm` (skor & segmen per pelanggan) sebagai artifact."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    joblib.dump(rfm, path)
+    return path
+
+def load_rfm(path=RFM_PATH):
+    """Muat hasil RFM yang disimpan `save_rfm`, atau None jika belum ada."""
+    path = Path(path)
+    return joblib.load(path) if path.exists() else None
+
+# Aturan segmen RFM (logika bisnis standar retail), dicek berurutan:
+# aturan pertama yang cocok menentukan segmen, selain itu '📊 Others'
+RFM_SEGMENT_RULES = [
     # Champions: Baru belanja, sering, dan banyak
-    if r >= 4 and f >= 4 and m >= 4:
-        return '🏆 Champions'
-    
+    ('🏆 Champions', lambda r, f, m: (r >= 4) & (f >= 4) & (m >= 4)),
     # Loyal Customers: Sering belanja dengan nilai bagus
-    if f >= 4 and m >= 3:
-        return '💎 Loyal Customers'
-    
+    ('💎 Loyal Customers', lambda r, f, m: (f >= 4) & (m >= 3)),
     # Potential Loyalist: Baru dan lumayan sering
-    if r >= 4 and f >= 2 and f <= 4:
-        return '🌟 Potential Loyalist'
-    
+    ('🌟 Potential Loyalist', lambda r, f, m: (r >= 4) & (f >= 2) & (f <= 4)),
     # New Customers: Baru sekali/dua kali belanja
-    if r >= 4 and f <= 2:
-        return '🆕 New Customers'
-    
+    ('🆕 New Customers', lambda r, f, m: (r >= 4) & (f <= 2)),
     # Promising: Baru tapi belanja sedikit
-    if r >= 3 and f <= 2 and m <= 2:
-        return '🔮 Promising'
-    
+    ('🔮 Promising', lambda r, f, m: (r >= 3) & (f <= 2) & (m <= 2)),
     # Need Attention: Dulunya bagus, sekarang menurun
-    if r >= 2 and r <= 3 and f >= 2 and f <= 3 and m >= 2 and m <= 3:
-        return '⚠️ Need Attention'
-    
+    ('⚠️ Need Attention', lambda r, f, m: (r >= 2) & (r <= 3) & (f >= 2) & (f <= 3) & (m >= 2) & (m <= 3)),
     # About to Sleep: Mulai jarang belanja
-    if r <= 2 and f >= 2 and f <= 3:
-        return '😴 About to Sleep'
-    
+    ('😴 About to Sleep', lambda r, f, m: (r <= 2) & (f >= 2) & (f <= 3)),
     # At Risk: Dulunya bagus, sekarang jarang
-    if r <= 2 and f >= 4:
-        return '🚨 At Risk'
-    
+    ('🚨 At Risk', lambda r, f, m: (r <= 2) & (f >= 4)),
     # Hibernating: Sudah lama tidak belanja
-    if r <= 2 and f <= 2:
-        return '❄️ Hibernating'
-    
+    ('❄️ Hibernating', lambda r, f, m: (r <= 2) & (f <= 2)),
     # Can't Lose Them: Pernah jadi pelanggan terbaik
-    if r <= 2 and f >= 4 and m >= 4:
-        return '🔥 Can\'t Lose Them'
-    
-    # Default
-    return '📊 Others'
+    ('🔥 Can\'t Lose Them', lambda r, f, m: (r <= 2) & (f >= 4) & (m >= 4)),
+]
+
+def assign_rfm_segment(row):
+    """
+    Menetapkan segmen pelanggan berdasarkan skor RFM satu baris
+    (aturan di `RFM_SEGMENT_RULES`).
+    """
+    return str(segment_rfm_scores([row['R_Score']], [row['F_Score']], [row['M_Score']])[0])
+
+def segment_rfm_scores(r, f, m):
+    """
+    Versi vektor `assign_rfm_segment` untuk seluruh kolom skor sekaligus
+    (aturan pertama di `RFM_SEGMENT_RULES` yang cocok menentukan segmen).
+    """
+    r, f, m = (np.asarray(score) for score in (r, f, m))
+    return np.select([condition(r, f, m) for _, condition in RFM_SEGMENT_RULES],
+                     [segment for segment, _ in RFM_SEGMENT_RULES], default='📊 Others')
 
 def get_segment_recommendations():
     """
@@ -0,0 +1,133 @@
+"""reporting.py
+
+Pluggable progress/logging interface for the compute modules.
+
+Compute code (preprocessing, model_utils, ...) reports through the
+module-level helpers below instead of calling Streamlit:
+
+    bar = reporting.progress(0, text="Mining...")
+    bar.progress(50, text="Half way")
+    bar.empty()
+    reporting.caption("Found 42 itemsets")
+    reporting.warning("Support is very low")
+
+The active Reporter decides where messages go:
+
+- Reporter            -> default; writes to the `logging` module (CLI, workers)
+- set_default_reporter -> process-wide reporter (the dashboard installs a
+                          Streamlit one, see streamlit_adapter.py)
+- use_reporter        -> reporter for the current context only (a thread or
+                          job can capture its own progress)
+"""
+
+import contextvars
+import logging
+from contextlib import contextmanager
+
+logger = logging.getLogger("retail_dss")
+
+
+class ProgressHandle:
+    """Progress bar returned by `Reporter.progress` (same shape as `st.progress`)."""
+
+    def __init__(self, reporter):
+        self.reporter = reporter
+
+    def progress(self, pct, text=""):
+        self.reporter.on_progress(pct, text)
+
+    def empty(self):
+        pass
+
+
+class Reporter:
+    """Base reporter: sends everything to `logging`. Subclass to redirect."""
+
+    def progress(self, pct=0, text=""):
+        handle = ProgressHandle(self)
+        handle.progress(pct, text)
+        return handle
+
+    def on_progress(self, pct, text):
+        logger.info("[%3d%%] %s", pct, text)
+
+    def caption(self, message):
+        logger.info(message)
+
+    def info(self, message):
+        logger.info(message)
+
+    def success(self, message):
+        logger.info(message)
+
+    def warning(self, message):
+        logger.warning(message)
+
+    def error(self, message):
+        logger.error(message)
+
+    def write(self, *objects):
+        logger.info(" ".join(str(obj) for obj in objects))
+
+    def cancel_requested(self):
+        """True once the caller asked the running computation to stop."""
+        return False
+
+
+_default_reporter = Reporter()
+_context_reporter = contextvars.ContextVar("reporter", default=None)
+
+
+def get_reporter():
+    """Reporter of the current context, falling back to the process default."""
+    return _context_reporter.get() or _default_reporter
+
+
+def set_default_reporter(reporter):
+    """Install `reporter` process-wide; returns the previous one."""
+    global _default_reporter
+    previous, _default_reporter = _default_reporter, reporter
+    return previous
+
+
+@contextmanager
+def use_reporter(reporter):
+    """Route reports of the current context (thread/task) to `reporter` inside the block."""
+    token = _context_reporter.set(reporter)
+    try:
+        yield reporter
+    finally:
+        _context_reporter.reset(token)
+
+
+def cancel_requested():
+    """Cooperative cancellation check for long loops (e.g. `mining.MiningBudget`)."""
+    return get_reporter().cancel_requested()
+
+
+def progress(pct=0, text=""):
+    return get_reporter().progress(pct, text)
+
+
+def caption(message):
+    get_reporter().caption(message)
+
+
+def info(message):
+    get_reporter().info(message)
+
+
+def success(message):
+    get_reporter().success(message)
+
+
+def warning(message):
+    get_reporter().warning(message)
+
+
+def error(message):
+    get_reporter().error(message)
+
+
+def write(*objects):
+    get_reporter().write(*objects)
@@ -0,0 +1,227 @@
+"""service.py
+
+Local HTTP scoring service over the artifacts saved by the DSS pages
+(datasets/artifacts/): association rules + RuleIndex, RFM segments and the
+trained ANN model. Lets a POS or other system call the DSS without Streamlit.
+
+Endpoints (JSON in, JSON out; every POST endpoint is batched):
+
+    GET  /health     -> loaded artifacts and their sizes
+    POST /recommend  {"baskets": [["ITEM A", "ITEM B"], ...], "k": 5, "metric": "lift"}
+    POST /segments   {"households": [1, 2, ...]}
+    POST /predict    {"households": [1, 2, ...]}
+                     or {"customers": [{"AGE_DESC": "45-54", ...}, ...]}
+
+The server is a small asyncio HTTP/1.1 implementation (keep-alive, JSON
+bodies with Content-Length) so no web framework is required.
+
+Usage:
+    python service.py [--host 127.0.0.1] [--port 8765]
+"""
+
+import argparse
+import asyncio
+import json
+from http import HTTPStatus
+
+import numpy as np
+import pandas as pd
+
+import database as db
+import model_utils as mu
+import preprocessing as pp
+
+MAX_BODY_BYTES = 8 * 1024 * 1024
+
+
+class ServiceError(Exception):
+    """Request error returned to the client as {"error": ...} with an HTTP status."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+# =============================================================================
+# SCORING
+# =============================================================================
+
+class ScoringService:
+    """Holds the loaded artifacts and answers the (already decoded) requests."""
+
+    def __init__(self, rules_path=pp.RULES_PATH, rfm_path=pp.RFM_PATH, model_path=mu.MODEL_PATH):
+        self.rules, self.rule_index = pp.load_rules(rules_path)
+        self.segment_records = self._segment_records(pp.load_rfm(rfm_path))
+        self.model_artifact = mu.load_model(model_path)
+        self.household_probs = None
+        if self.model_artifact is not None and db.database_exists():
+            self.household_probs = self._household_probabilities()
+
+    @staticmethod
+    def _segment_records(rfm):
+        """{household_key: JSON-ready segment record}; artifacts never change while serving."""
+        if rfm is None:
+            return None
+        key_col = rfm.columns[0]
+        columns = [col for col in ['Segment', 'Recency', 'Frequency', 'Monetary', 'Discount_Share', 'Coupon_Share',
+                                   'RFM_Score'] if col in rfm.columns]
+        return {
+            _to_json(key): {'household_key': _to_json(key), **{col: _to_json(value) for col, value in zip(columns, row)}}
+            for key, *row in rfm[[key_col] + columns].itertuples(index=False)
+        }
+
+    def _encode(self, demographics):
+        """One-hot demographics in the column order the model was trained on."""
+        features = self.model_artifact['demographic_features']
+        encoded = pp.encode_features(db.apply_demographic_dtypes(demographics[features].copy()), features)
+        model = self.model_artifact['model']
+        return encoded.reindex(columns=model.feature_names_in_, fill_value=0).astype(float)
+
+    def _household_probabilities(self):
+        """{household_key: purchase probability}, scored once in a single batch at load time."""
+        features = self.model_artifact['demographic_features']
+        customers, err = db.execute_query(f"SELECT household_key, {', '.join(features)} FROM customers")
+        if err:
+            return None
+        probs = self.model_artifact['model'].predict_proba(self._encode(customers))[:, 1]
+        return dict(zip(customers['household_key'].tolist(), probs.round(6).tolist()))
+
+    # --- endpoints ---
+
+    def health(self, _payload=None):
+        return {
+            'status': 'ok',
+            'rules': len(self.rules) if self.rules is not None else None,
+            'rfm_households': len(self.segment_records) if self.segment_records is not None else None,
+            'model_target': self.model_artifact['target_products'] if self.model_artifact else None,
+        }
+
+    def recommend(self, payload):
+        if self.rule_index is None:
+            raise ServiceError(HTTPStatus.SERVICE_UNAVAILABLE, "no association rules saved yet")
+        baskets = _require_list(payload, 'baskets')
+        k = int(payload.get('k', 5))
+        metric = payload.get('metric', 'lift')
+        if metric not in pp.RuleIndex.METRICS:
+            raise ServiceError(HTTPStatus.BAD_REQUEST, f"metric must be one of {pp.RuleIndex.METRICS}")
+        return {'results': [
+            [{'item': item, metric: score} for item, score in self.rule_index.recommend(basket, k, metric)]
+            for basket in baskets
+        ]}
+
+    def segments(self, payload):
+        if self.segment_records is None:
+            raise ServiceError(HTTPStatus.SERVICE_UNAVAILABLE, "no RFM segments saved yet")
+        records = self.segment_records
+        return {'results': [records.get(key) for key in _require_list(payload, 'households')]}
+
+    def predict(self, payload):
+        if self.model_artifact is None:
+            raise ServiceError(HTTPStatus.SERVICE_UNAVAILABLE, "no ANN model saved yet")
+        target = self.model_artifact['target_products']
+        if 'customers' in payload:
+            X = self._encode(pd.DataFrame(_require_list(payload, 'customers')))
+            probs = self.model_artifact['model'].predict_proba(X)[:, 1]
+            return {'target': target, 'results': probs.round(6).tolist()}
+
+        if self.household_probs is None:
+            raise ServiceError(HTTPStatus.SERVICE_UNAVAILABLE, "database not available for household lookup")
+        probs = self.household_probs
+        return {'target': target, 'results': [probs.get(key) for key in _require_list(payload, 'households')]}
+
+    def dispatch(self, method, path, body):
+        """Route a request. Returns (HTTPStatus, JSON-serializable payload)."""
+        routes = {
+            ('GET', '/health'): self.health,
+            ('POST', '/recommend'): self.recommend,
+            ('POST', '/segments'): self.segments,
+            ('POST', '/predict'): self.predict,
+        }
+        handler = routes.get((method, path.split('?', 1)[0]))
+        if handler is None:
+            return HTTPStatus.NOT_FOUND, {'error': f"no route for {method} {path}"}
+        try:
+            payload = json.loads(body) if body else {}
+            if not isinstance(payload, dict):
+                raise ServiceError(HTTPStatus.BAD_REQUEST, "request body must be a JSON object")
+            return HTTPStatus.OK, handler(payload)
+        except ServiceError as e:
+            return e.status, {'error': str(e)}
+        except (ValueError, KeyError, TypeError) as e:
+            return HTTPStatus.BAD_REQUEST, {'error': str(e)}
+
+
+def _require_list(payload, key):
+    values = payload.get(key)
+    if not isinstance(values, list):
+        raise ServiceError(HTTPStatus.BAD_REQUEST, f"'{key}' must be a JSON list")
+    return values
+
+
+def _to_json(value):
+    return value.item() if isinstance(value, np.generic) else value
+
+# =============================================================================
+# HTTP SERVER
+# =============================================================================
+
+async def handle_connection(service, reader, writer):
+    """Serve HTTP/1.1 requests on one (keep-alive) connection."""
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line.strip():
+                break
+            method, target, _version = request_line.decode('latin-1').split(' ', 2)
+
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+
+            length = int(headers.get('content-length', 0))
+            if length > MAX_BODY_BYTES:
+                status, payload = HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {'error': "request body too large"}
+                body = b''
+            else:
+                body = await reader.readexactly(length)
+                status, payload = service.dispatch(method, target, body)
+
+            data = json.dumps(payload).encode()
+            writer.write(
+                f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                f"Content-Type: application/json\r\n"
+                f"Content-Length: {len(data)}\r\n\r\n".encode('latin-1') + data
+            )
+            await writer.drain()
+            if headers.get('connection', '').lower() == 'close' or status == HTTPStatus.REQUEST_ENTITY_TOO_LARGE:
+                break
+    except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(service, host='127.0.0.1', port=8765):
+    server = await asyncio.start_server(lambda r, w: handle_connection(service, r, w), host, port)
+    print(f"Serving on http://{host}:{port}  {json.dumps(service.health())}")
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[2])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(ScoringService(), args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""streamlit_adapter.py
+
+App-side adapter that wires the Streamlit UI into the Streamlit-free compute
+modules: reports render as Streamlit elements and `caching` decorators use the
+two-tier cache (memory + datasets/cache/, invalidated by the dataset version).
+`app.py` calls `install()` once at startup.
+"""
+
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+import caching
+import database as db
+import reporting
+
+
+class StreamlitReporter(reporting.Reporter):
+    """Renders reports as Streamlit elements in the running script."""
+
+    def progress(self, pct=0, text=""):
+        return st.progress(pct, text=text)
+
+    def caption(self, message):
+        st.caption(message)
+
+    def info(self, message):
+        st.info(message)
+
+    def success(self, message):
+        st.success(message)
+
+    def warning(self, message):
+        st.warning(message)
+
+    def error(self, message):
+        st.error(message)
+
+    def write(self, *objects):
+        st.write(*objects)
+
+
+class StreamlitTieredCache(caching.TieredCache):
+    """Two-tier cache (memory + datasets/cache/) that shows `show_spinner` while computing a miss."""
+
+    def spinner(self, message):
+        # Background jobs (jobs.py) have no script context to draw a spinner in
+        if not message or get_script_run_ctx(suppress_warning=True) is None:
+            return super().spinner(message)
+        return st.spinner(message if isinstance(message, str) else "⏳ Memproses...")
+
+
+def install():
+    """Route compute-module reports to Streamlit and cache results in the two-tier cache."""
+    if not isinstance(reporting.get_reporter(), StreamlitReporter):
+        reporting.set_default_reporter(StreamlitReporter())
+    if not isinstance(caching.get_backend(), StreamlitTieredCache):
+        caching.set_backend(StreamlitTieredCache(version=db.get_dataset_version))
@@ -0,0 +1,197 @@
+"""Equivalence checks of mining.py against mlxtend and brute force on small synthetic data."""
+
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+import pytest
+from mlxtend.frequent_patterns import association_rules, fpgrowth
+
+import mining
+from preprocessing import EncodedBaskets
+
+
+def random_baskets(n_baskets, n_items, seed):
+    """Baskets with a few correlated item groups, so that longer itemsets are frequent."""
+    rng = np.random.default_rng(seed)
+    groups = [(0, 1, 2), (3, 4), (1, 5, 6)]
+    baskets = []
+    for _ in range(n_baskets):
+        basket = set(rng.choice(n_items, size=rng.integers(1, 5), replace=False).tolist())
+        for group in groups:
+            if rng.random() < 0.25:
+                basket.update(group)
+        baskets.append(sorted(basket))
+    return baskets
+
+
+def encode(baskets, n_items):
+    indptr = np.zeros(len(baskets) + 1, dtype=np.int64)
+    np.cumsum([len(basket) for basket in baskets], out=indptr[1:])
+    indices = np.array([item for basket in baskets for item in basket], dtype=np.int64)
+    return EncodedBaskets(indptr, indices, np.array([f"item{i}" for i in range(n_items)], dtype=object))
+
+
+def brute_force_counts(baskets, n_items, min_count, max_len):
+    sets = [set(basket) for basket in baskets]
+    counts = {}
+    for length in range(1, max_len + 1):
+        for itemset in combinations(range(n_items), length):
+            count = sum(1 for basket in sets if basket.issuperset(itemset))
+            if count >= min_count:
+                counts[itemset] = count
+    return counts
+
+
+@pytest.mark.parametrize('seed', [0, 1])
+def test_fp_growth_matches_mlxtend(seed):
+    baskets = encode(random_baskets(200, 10, seed), 10)
+    min_count = 10
+    tree, labels = mining.build_fp_tree(baskets, min_count)
+    found = mining.mine_fp_tree(tree, min_count)
+
+    expected = fpgrowth(baskets.to_frame(), min_support=min_count / len(baskets), use_colnames=True)
+    ours = mining.itemsets_to_frame(found, labels, len(baskets))
+    assert dict(zip(ours['itemsets'], ours['support'])) == pytest.approx(
+        dict(zip(expected['itemsets'], expected['support'])))
+
+    rules = mining.generate_rules([ids for ids, _ in found], [count / len(baskets) for _, count in found],
+                                  min_confidence=0.5123)
+    expected_rules = association_rules(expected, metric='confidence', min_threshold=0.5123)
+    names = np.asarray(labels, dtype=object)
+    ours = {(frozenset(names[list(a)]), frozenset(names[list(c)])): (conf, lift)
+            for a, c, conf, lift in zip(rules['antecedent_ids'], rules['consequent_ids'],
+                                        rules['confidence'], rules['lift'])}
+    theirs = {(a, c): (conf, lift) for a, c, conf, lift in zip(expected_rules['antecedents'],
+                                                              expected_rules['consequents'],
+                                                              expected_rules['confidence'], expected_rules['lift'])}
+    assert ours.keys() == theirs.keys()
+    for rule, scores in ours.items():
+        assert scores == pytest.approx(theirs[rule])
+
+
+def test_count_itemset_support_matches_brute_force():
+    lists = random_baskets(150, 8, seed=2)
+    baskets = encode(lists, 8)
+    expected = brute_force_counts(lists, 8, 0, 3)
+    itemsets = list(expected)
+    assert mining.count_itemset_support(baskets, itemsets).tolist() == [expected[s] for s in itemsets]
+    assert mining.count_supports(baskets, itemsets).tolist() == [expected[s] for s in itemsets]
+
+
+@pytest.mark.parametrize('itemsets, supports', [
+    ([(0, 1)], [0.2]),                              # no 1-itemsets at all
+    ([(0,), (0, 1)], [0.5, 0.2]),                   # (1,) sorts after every stored key
+    ([(1,), (0, 1)], [0.5, 0.2]),                   # (0,) would pick up the support of (1,)
+])
+def test_generate_rules_requires_downward_closed_itemsets(itemsets, supports):
+    with pytest.raises(ValueError, match="downward-closed"):
+        mining.generate_rules(itemsets, supports)
+
+
+def test_top_rules_match_brute_force():
+    baskets = encode(random_baskets(300, 12, seed=3), 12)
+    min_count, k = 5, 15
+    tree, _ = mining.build_fp_tree(baskets, min_count)
+    found = mining.mine_fp_tree(tree, min_count, max_len=3)
+    everything = mining.generate_rules([ids for ids, _ in found], [count / len(baskets) for _, count in found])
+    for metric in mining.TOP_RULE_METRICS:
+        top, info = mining.mine_top_rules(tree, len(baskets), k, metric=metric, min_count=min_count, max_len=3)
+        expected = everything.sort_values([metric, 'support'], ascending=False).head(k)
+        assert len(top) == k
+        assert top[metric].to_numpy() == pytest.approx(expected[metric].to_numpy())
+
+
+def random_sequences(n_households, n_items, seed):
+    """(households, baskets, days, times, items) rows of a few baskets per household."""
+    rng = np.random.default_rng(seed)
+    rows = []
+    basket = 0
+    for household in range(n_households):
+        day = 0
+        for _ in range(rng.integers(1, 7)):
+            day += int(rng.integers(0, 15))
+            for item in rng.choice(n_items, size=rng.integers(1, 4), replace=False):
+                rows.append((household, basket, day, basket % 5, int(item)))
+            basket += 1
+    return tuple(np.array(column, dtype=np.int64) for column in zip(*rows))
+
+
+def contains(events, pattern, max_gap):
+    """True if `pattern` occurs in the (day, itemset) events in order, consecutive elements <= max_gap days apart."""
+    def match(element, after, last_day):
+        if element == len(pattern):
+            return True
+        for e in range(after, len(events)):
+            day, itemset = events[e]
+            if last_day is not None and max_gap is not None and day - last_day > max_gap:
+                break
+            if itemset.issuperset(pattern[element]) and match(element + 1, e + 1, day):
+                return True
+        return False
+    return match(0, 0, None)
+
+
+def brute_force_sequences(sequences, n_items, min_count, max_gap, max_len):
+    histories = []
+    for s in range(len(sequences)):
+        events = []
+        for e in range(sequences.seq_start[s], sequences.seq_start[s + 1]):
+            items = sequences.item[sequences.event_start[e]:sequences.event_start[e + 1]]
+            events.append((int(sequences.day[e]), set(items.tolist())))
+        histories.append(events)
+
+    found = {}
+
+    def grow(pattern, length):
+        count = sum(1 for events in histories if contains(events, pattern, max_gap))
+        if count < min_count:
+            return
+        found[pattern] = count
+        if length == max_len:
+            return
+        for item in range(n_items):
+            if item > pattern[-1][-1]:
+                grow(pattern[:-1] + (pattern[-1] + (item,),), length + 1)
+            grow(pattern + ((item,),), length + 1)
+
+    for item in range(n_items):
+        grow(((item,),), 1)
+    return found
+
+
+@pytest.mark.parametrize('max_gap', [None, 10])
+def test_prefixspan_matches_brute_force(max_gap):
+    n_items = 5
+    households, baskets, days, times, items = random_sequences(40, n_items, seed=4)
+    sequences = mining.SequenceDatabase.from_rows(households, baskets, days, times, items, list(range(n_items)))
+    patterns, labels = mining.mine_sequences(sequences, min_count=4, max_gap=max_gap, max_len=3)
+    ours = {tuple(tuple(sorted(labels[i] for i in element)) for element in pattern): count
+            for pattern, count in patterns}
+    assert ours == brute_force_sequences(sequences, n_items, 4, max_gap, 3)
+
+
+def test_prefixspan_worker_processes_match_inline():
+    households, baskets, days, times, items = random_sequences(60, 6, seed=5)
+    sequences = mining.SequenceDatabase.from_rows(households, baskets, days, times, items, list(range(6)))
+    inline, _ = mining.mine_sequences(sequences, min_count=3, max_gap=20, max_len=3, n_jobs=1)
+    pooled, _ = mining.mine_sequences(sequences, min_count=3, max_gap=20, max_len=3, n_jobs=2)
+    assert sorted(inline) == sorted(pooled)
+
+
+def test_window_supports_match_brute_force():
+    n_items, width, step, min_support, max_len = 8, 60, 20, 0.1, 3
+    lists = random_baskets(200, n_items, seed=6)
+    window = mining.WindowSupports(n_items, min_support, max_len)
+    start = 0
+    window.slide(entering=encode(lists[:width], n_items), window=lambda: encode(lists[:width], n_items))
+    while True:
+        current = lists[start:start + width]
+        expected = brute_force_counts(current, n_items, window.min_count, max_len)
+        assert dict(window.frequent_itemsets()) == expected
+        if start + width + step > len(lists):
+            break
+        entering = encode(lists[start + width:start + width + step], n_items)
+        leaving = encode(lists[start:start + step], n_items)
+        start += step
+        window.slide(entering, leaving, window=lambda: encode(lists[start:start + width], n_items))
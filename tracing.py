@@ -0,0 +1,298 @@
+"""tracing.py
+
+Hot-path instrumentation: nested spans that record wall time, CPU time and
+memory per pipeline stage, grouped into one trace per run:
+
+    with tracing.trace("Association Rules") as run:
+        with tracing.span("sql:get_analysis_data") as span:
+            df = ...
+            span.set(rows=len(df))
+        with tracing.span("fpgrowth"):
+            ...
+    run.to_frame()        # per-stage breakdown (wall, self, CPU, memory)
+    run.save(path)        # Chrome trace JSON (chrome://tracing, ui.perfetto.dev)
+
+    @tracing.traced("rfm")  # span around every call of a function
+    def calculate_rfm(...): ...
+
+- Spans opened outside a trace are no-ops, so compute modules stay
+  instrumented at the cost of one ContextVar lookup per span.
+- A trace belongs to the context (thread/job) that opened it; spans opened by
+  other threads (e.g. a thread pool inside a stage) are not recorded. A trace
+  opened inside another one becomes a span of it.
+- CPU time and RSS are process-wide, so they include other threads and
+  sessions. With `memory=True` each span also records its Python heap peak
+  via tracemalloc, which slows allocation-heavy code noticeably.
+- Finished traces are kept in memory (`recent_traces()`) for the dashboard.
+"""
+
+import contextvars
+import functools
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import deque
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+MAX_TRACES = 20
+_MB = 2 ** 20
+
+try:
+    _PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+except (AttributeError, ValueError, OSError):
+    _PAGE_SIZE = 4096
+
+_current = contextvars.ContextVar("span", default=None)
+_traces = deque(maxlen=MAX_TRACES)
+_lock = threading.Lock()
+_memory_users = 0
+
+
+def _rss():
+    """Current resident set size in bytes (None where /proc is not available)."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _peak_rss():
+    """High-water resident set size of the process in bytes (None without `resource`)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _mb(value):
+    return None if value is None else round(value / _MB, 1)
+
+
+class _NullSpan:
+    """Stand-in returned by `span()` when no trace is active."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **attrs):
+        return self
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Span:
+    """One timed stage of a trace. `set(**attrs)` attaches details (rows, items, ...)."""
+
+    def __init__(self, trace, name, parent=None, attrs=None):
+        self.trace = trace
+        self.name = name
+        self.parent = parent
+        self.depth = 0 if parent is None else parent.depth + 1
+        self.attrs = dict(attrs or {})
+        self.children = []
+        self.error = None
+        self.start = None       # seconds since the trace started
+        self.wall = None
+        self.cpu = None
+        self.rss = None         # bytes at the end of the span
+        self.rss_delta = None
+        self.peak_rss = None    # process high-water mark at the end of the span
+        self.py_peak = None     # tracemalloc peak above the span's starting heap
+        if parent is not None:
+            parent.children.append(self)
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+        return self
+
+    def __enter__(self):
+        self._rss_start = _rss()
+        if self.trace.memory:
+            current, peak = tracemalloc.get_traced_memory()
+            if self.parent is not None:
+                self.parent._py_seen = max(self.parent._py_seen, peak)
+            tracemalloc.reset_peak()
+            self._py_start = self._py_seen = current
+        self.trace.spans.append(self)
+        self._token = _current.set(self)
+        self._cpu_start = time.process_time()
+        self._wall_start = time.perf_counter()
+        self.start = 0.0 if self.parent is None else self._wall_start - self.trace.root._wall_start
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.wall = time.perf_counter() - self._wall_start
+        self.cpu = time.process_time() - self._cpu_start
+        _current.reset(self._token)
+        self.rss = _rss()
+        if self.rss is not None and self._rss_start is not None:
+            self.rss_delta = self.rss - self._rss_start
+        self.peak_rss = _peak_rss()
+        if self.trace.memory:
+            self.py_peak = max(self._py_seen, tracemalloc.get_traced_memory()[1]) - self._py_start
+        if exc_type is not None:
+            self.error = exc_type.__name__
+        return False
+
+    @property
+    def self_time(self):
+        """Wall time not covered by child spans."""
+        return self.wall - sum(child.wall or 0.0 for child in self.children)
+
+    def record(self):
+        return {
+            'stage': self.name,
+            'depth': self.depth,
+            'start_s': round(self.start, 4),
+            'wall_s': round(self.wall, 4),
+            'self_s': round(self.self_time, 4),
+            'cpu_s': round(self.cpu, 4),
+            'rss_mb': _mb(self.rss),
+            'rss_delta_mb': _mb(self.rss_delta),
+            'peak_rss_mb': _mb(self.peak_rss),
+            'py_peak_mb': _mb(self.py_peak),
+            'error': self.error,
+            'attrs': self.attrs,
+        }
+
+
+class Trace:
+    """One instrumented run: a root span plus every span opened inside it (in start order)."""
+
+    def __init__(self, name, memory=False, attrs=None):
+        self.name = name
+        self.memory = memory
+        self.started = time.time()
+        self.thread = threading.get_ident()
+        self.spans = []
+        self.root = Span(self, name, attrs=attrs)
+
+    def __enter__(self):
+        global _memory_users
+        if self.memory:
+            with _lock:
+                if _memory_users == 0 and not tracemalloc.is_tracing():
+                    tracemalloc.start()
+                    _memory_users = 1
+                elif _memory_users:
+                    _memory_users += 1
+                # else: tracemalloc was started by someone else; leave it alone
+        self.root.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        global _memory_users
+        self.root.__exit__(exc_type, exc, tb)
+        if self.memory:
+            with _lock:
+                if _memory_users:
+                    _memory_users -= 1
+                    if _memory_users == 0:
+                        tracemalloc.stop()
+        with _lock:
+            _traces.append(self)
+        return False
+
+    @property
+    def wall(self):
+        return self.root.wall
+
+    @property
+    def error(self):
+        return self.root.error
+
+    def records(self):
+        """One dict per finished span, root first."""
+        return [span.record() for span in self.spans if span.wall is not None]
+
+    def to_frame(self):
+        """Per-stage breakdown as a DataFrame (`attrs` flattened to text)."""
+        import pandas as pd
+
+        df = pd.DataFrame(self.records())
+        if not df.empty:
+            df['attrs'] = df['attrs'].map(lambda attrs: ", ".join(f"{k}={v}" for k, v in attrs.items()))
+        return df
+
+    def to_chrome_trace(self):
+        """Trace Event Format dict: one complete ('X') event per span, times in microseconds."""
+        events = []
+        for record in self.records():
+            args = {key: value for key, value in record.items()
+                    if key not in ('stage', 'depth', 'start_s', 'wall_s', 'attrs') and value is not None}
+            args.update({key: value if isinstance(value, (int, float, bool)) else str(value)
+                         for key, value in record['attrs'].items()})
+            events.append({
+                'name': record['stage'], 'ph': 'X', 'pid': os.getpid(), 'tid': self.thread,
+                'ts': round(record['start_s'] * 1e6), 'dur': round(record['wall_s'] * 1e6), 'args': args,
+            })
+        return {
+            'traceEvents': events,
+            'displayTimeUnit': 'ms',
+            'otherData': {'name': self.name, 'started': time.strftime('%Y-%m-%d %H:%M:%S',
+                                                                      time.localtime(self.started))},
+        }
+
+    def to_json(self, indent=None):
+        return json.dumps(self.to_chrome_trace(), indent=indent, ensure_ascii=False, default=str)
+
+    def save(self, path):
+        """Write the Chrome trace JSON to `path`; returns the path."""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(self.to_json(indent=1), encoding='utf-8')
+        return path
+
+    def __repr__(self):
+        return f"Trace({self.name!r}, spans={len(self.spans)}, wall={self.wall})"
+
+
+def trace(name, memory=False, **attrs):
+    """Start a trace (one run). Inside an active trace this is just a span."""
+    parent = _current.get()
+    if parent is not None:
+        return Span(parent.trace, name, parent, attrs)
+    return Trace(name, memory=memory, attrs=attrs)
+
+
+def span(name, **attrs):
+    """Time a stage of the active trace; a no-op when no trace is active."""
+    parent = _current.get()
+    if parent is None:
+        return _NULL_SPAN
+    return Span(parent.trace, name, parent, attrs)
+
+
+def traced(name=None):
+    """Decorator: run every call of the function inside `span(name or function name)`."""
+    def decorator(func):
+        span_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def recent_traces():
+    """Finished traces of this process, newest first."""
+    with _lock:
+        return list(reversed(_traces))
+
+
+def clear_traces():
+    with _lock:
+        _traces.clear()